@@ -0,0 +1,257 @@
+"""
+Async (ASGI) variants of the task and comment endpoints.
+
+`AsyncTaskViewSet` and `AsyncCommentViewSet` answer the same requests with the
+same responses as `TaskViewSet` and `CommentViewSet` (except the bulk
+endpoint), including `include_archived` reads, the restore action and the
+shared response cache, and are routed side by side with them under
+`/api/async/`. Django REST framework views are
+synchronous, so `AsyncViewSet` provides the small part of `APIView` these
+endpoints need (authentication, permissions, exception handling, JSON
+rendering) with coroutine handlers:
+
+- lookups use the async ORM (`afirst()`, `aexists()`, `aaggregate()`) and
+  the async cache API, and encode rows with the compiled `RowSerializer`;
+- authentication runs the configured DRF authenticators, and the cursor
+  paginator, serializer validation and saves (whose signal handlers are
+  synchronous) run in a single `sync_to_async` call each;
+- cached reads go through `acache_response`, which shares the entries of
+  the sync views through the async cache API and collapses concurrent
+  misses among coroutines.
+
+On SQLite, Django's async ORM itself runs every query through
+`sync_to_async`; see `manage.py benchmark_asgi` for how the two variants
+compare under concurrent load.
+"""
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max, OuterRef, Subquery
+from rest_framework import exceptions, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+
+from app.api.filters import parse_include_archived, parse_task_list_params
+from app.api.pagination import CreatedAtCursorPagination
+from app.api.permissions import IsProjectMember
+from app.api.rows import row_serializer
+from app.api.response_cache import acache_response
+from app.api.serializers import ArchivedCommentSerializer, CommentSerializer, TaskSerializer, TaskWithArchivedSerializer
+from app.api.utils import collection_etag, not_modified, row_etag, set_validators
+from app.archive import restore_tasks
+from app.deletion import soft_delete_tasks
+from app.models import ArchivedComment, ArchivedTask, Comment, Project, Task, TaskWithArchived
+from app.stats import TASKS, counter_subquery
+
+
+class AsyncViewSet:
+    """
+    Minimal async counterpart of `viewsets.ViewSet`: `as_view({'get':
+    'list', ...})` maps HTTP methods to coroutine handlers, which return DRF
+    `Response` objects rendered as JSON.
+    """
+    serializer_class = None
+    permission_classes = [IsAuthenticated]
+    project_lookups = {}
+    pagination_class = CreatedAtCursorPagination
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, actions):
+        async def view(request, *args, **kwargs):
+            self = cls()
+            self.args, self.kwargs = args, kwargs
+            return await self.dispatch(request, actions, *args, **kwargs)
+        # CSRF is enforced by SessionAuthentication, as for APIView.
+        view.csrf_exempt = True
+        view.cls, view.actions = cls, actions
+        return view
+
+    async def dispatch(self, request, actions, *args, **kwargs):
+        request = Request(
+            request,
+            parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+            authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+        )
+        request.accepted_renderer, request.accepted_media_type = self.renderer, self.renderer.media_type
+        self.request = request
+        try:
+            handler = getattr(self, actions.get(request.method.lower(), ''), None)
+            if handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            await self.check_permissions(request)
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        return self.finalize_response(request, response)
+
+    async def check_permissions(self, request):
+        # Reading request.user runs the authenticators, which may query the database.
+        await sync_to_async(lambda: request.user)()
+        for permission in [permission() for permission in self.permission_classes]:
+            check = getattr(permission, 'ahas_permission', None)
+            allowed = await check(request, self) if check else permission.has_permission(request, self)
+            if not allowed:
+                if request.authenticators and not request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+
+    def handle_exception(self, exc):
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            header = self.request.authenticators[0].authenticate_header(self.request) if self.request.authenticators else None
+            if header:
+                exc.auth_header = header
+            else:
+                exc.status_code = status.HTTP_403_FORBIDDEN
+        response = exception_handler(exc, {'view': self, 'request': self.request})
+        if response is None:
+            raise exc
+        return response
+
+    def finalize_response(self, request, response):
+        if isinstance(response, Response):
+            response.accepted_renderer = self.renderer
+            response.accepted_media_type = self.renderer.media_type
+            response.renderer_context = {'view': self, 'request': request, 'response': response}
+            response.render()
+        response['Vary'] = 'Accept'
+        return response
+
+    async def get_paginated_list(self, request, queryset, ordering=None, serializer_class=None):
+        """Async counterpart of `PaginatedListMixin.get_paginated_list`."""
+        paginator = self.pagination_class()
+        if ordering is not None:
+            paginator.ordering = ordering
+        rows = row_serializer(serializer_class or self.serializer_class)
+        page = await sync_to_async(paginator.paginate_queryset)(rows.values(queryset), request, view=self)
+        return paginator.get_paginated_response(rows.to_representation(page))
+
+    async def get_detail(self, request, queryset, not_found, serializer_class=None):
+        """Serialize one object with its validators, or answer 304/404."""
+        instance = await queryset.afirst()
+        if instance is None:
+            return Response({"error": not_found}, status=status.HTTP_404_NOT_FOUND)
+        etag = row_etag(request, instance)
+        return not_modified(request, etag, instance.updated_at) or set_validators(
+            Response((serializer_class or self.serializer_class)(instance).data), etag, instance.updated_at,
+        )
+
+    async def save(self, serializer, success_status=status.HTTP_200_OK):
+        """Validate and save in one hop to a worker thread; the save's signal handlers are synchronous."""
+        def run():
+            if serializer.is_valid():
+                serializer.save()
+                return Response(serializer.data, status=success_status)
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return await sync_to_async(run)()
+
+
+class AsyncTaskViewSet(AsyncViewSet):
+    """Async variant of `TaskViewSet` (without the bulk endpoint)."""
+    serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    project_lookups = {'project_id': 'project', 'pk': 'task'}
+
+    @acache_response
+    async def list(self, request, project_id=None):
+        project = await Project.objects.annotate(
+            task_count=counter_subquery(TASKS),
+            last_task_update=Subquery(
+                Task.objects.filter(project=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+            ),
+        ).filter(id=project_id).afirst()
+        if project is None:
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        filters, ordering = parse_task_list_params(request)
+        etag = collection_etag(request, project.task_count, project.last_task_update, *filters.values())
+        if parse_include_archived(request):
+            tasks = TaskWithArchived.objects.filter(project=project, **filters)
+            return not_modified(request, etag) or set_validators(
+                await self.get_paginated_list(request, tasks, ordering, TaskWithArchivedSerializer), etag,
+            )
+        tasks = Task.objects.filter(project=project, **filters)
+        return not_modified(request, etag) or set_validators(
+            await self.get_paginated_list(request, tasks, ordering), etag,
+        )
+
+    async def create(self, request, project_id=None):
+        if not await Project.objects.filter(id=project_id).aexists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        data = request.data.copy()
+        data['project'] = int(project_id)
+        return await self.save(self.serializer_class(data=data), status.HTTP_201_CREATED)
+
+    @acache_response
+    async def retrieve(self, request, pk=None):
+        if parse_include_archived(request):
+            return await self.get_detail(
+                request, TaskWithArchived.objects.filter(id=pk), "Task not found.", TaskWithArchivedSerializer,
+            )
+        return await self.get_detail(request, Task.objects.filter(id=pk), "Task not found.")
+
+    async def update(self, request, pk=None):
+        task = await Task.objects.filter(id=pk).afirst()
+        if task is None:
+            return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+        return await self.save(self.serializer_class(task, data=request.data, partial=True))
+
+    async def destroy(self, request, pk=None):
+        task = await Task.objects.filter(id=pk).afirst()
+        if task is None:
+            return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+        await sync_to_async(soft_delete_tasks)([task])
+        return Response({"message": "Task deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
+
+    async def restore(self, request, pk=None):
+        if not await sync_to_async(restore_tasks)([pk]):
+            return Response({"error": "Archived task not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.serializer_class(await Task.objects.aget(id=pk)).data)
+
+
+class AsyncCommentViewSet(AsyncViewSet):
+    """Async variant of `CommentViewSet`."""
+    serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    project_lookups = {'task_id': 'task', 'pk': 'comment'}
+
+    @acache_response
+    async def list(self, request, task_id=None):
+        serializer_class = None
+        comments = Comment.objects.filter(task_id=task_id)
+        if not await Task.objects.filter(id=task_id).aexists():
+            if not (parse_include_archived(request) and await ArchivedTask.objects.filter(id=task_id).aexists()):
+                return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+            comments, serializer_class = ArchivedComment.objects.filter(task_id=task_id), ArchivedCommentSerializer
+        summary = await comments.aaggregate(count=Count('id'), last=Max('updated_at'))
+        etag = collection_etag(request, summary['count'], summary['last'])
+        return not_modified(request, etag) or set_validators(
+            await self.get_paginated_list(request, comments, serializer_class=serializer_class), etag,
+        )
+
+    async def create(self, request, task_id=None):
+        if not await Task.objects.filter(id=task_id).aexists():
+            return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+        data = request.data.copy()
+        data['task'] = int(task_id)
+        data['user'] = request.user.id
+        return await self.save(self.serializer_class(data=data), status.HTTP_201_CREATED)
+
+    @acache_response
+    async def retrieve(self, request, pk=None):
+        return await self.get_detail(request, Comment.objects.filter(id=pk), "Comment not found.")
+
+    async def update(self, request, pk=None):
+        # The task is needed afterwards to invalidate its project's cached responses.
+        comment = await Comment.objects.select_related('task').filter(id=pk).afirst()
+        if comment is None:
+            return Response({"error": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
+        return await self.save(self.serializer_class(comment, data=request.data, partial=True))
+
+    async def destroy(self, request, pk=None):
+        comment = await Comment.objects.filter(id=pk).afirst()
+        if comment is None:
+            return Response({"error": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
+        await comment.adelete()
+        return Response({"message": "Comment deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
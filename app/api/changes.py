@@ -0,0 +1,63 @@
+"""
+Response of the project change feed (`GET /api/projects/<id>/changes/`).
+
+A page holds the feed entries after the client's cursor, reduced to the
+latest entry per object, each with the object's current representation, or
+as a tombstone when it was deleted (or has since left the project):
+
+    {"cursor": 42, "has_more": false, "changes": [
+        {"seq": 40, "type": "task", "id": 7, "deleted": false, "data": {...}},
+        {"seq": 42, "type": "comment", "id": 9, "deleted": true, "data": null}
+    ]}
+
+Each kind of object is read with one query, through the compiled
+`RowSerializer` of its serializer.
+"""
+from django.conf import settings
+
+from app.api.rows import row_serializer
+from app.api.serializers import CommentSerializer, ProjectMemberSerializer, TaskSerializer
+from app.changes import COMMENT, MEMBER, TASK, changes_since
+from app.models import Comment, ProjectMember, Task
+
+# kind -> (serializer, queryset of the kind's objects in a project)
+FEED_SOURCES = {
+    TASK: (TaskSerializer, lambda project_id: Task.objects.filter(project_id=project_id)),
+    COMMENT: (CommentSerializer, lambda project_id: Comment.objects.filter(task__project_id=project_id)),
+    MEMBER: (ProjectMemberSerializer, lambda project_id: ProjectMember.objects.filter(project_id=project_id)),
+}
+
+
+def _current_rows(kind, project_id, ids):
+    serializer_class, queryset = FEED_SOURCES[kind]
+    queryset = queryset(project_id).filter(id__in=ids)
+    rows = row_serializer(serializer_class) if settings.API_FAST_LISTS else None
+    data = rows.to_representation(rows.values(queryset)) if rows is not None else serializer_class(queryset, many=True).data
+    return {row['id']: row for row in data}
+
+
+def change_feed_page(project_id, since, limit):
+    """Build the feed page of a project after sequence number `since`."""
+    entries = changes_since(project_id, since, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for seq, kind, object_id, deleted in entries:
+        latest.pop((kind, object_id), None)  # re-insert so the dict stays in sequence order
+        latest[(kind, object_id)] = (seq, deleted)
+
+    current = {}
+    for kind in FEED_SOURCES:
+        ids = [object_id for (entry_kind, object_id), (_, deleted) in latest.items() if entry_kind == kind and not deleted]
+        current[kind] = _current_rows(kind, project_id, ids) if ids else {}
+
+    changes = []
+    for (kind, object_id), (seq, deleted) in latest.items():
+        data = None if deleted else current[kind].get(object_id)
+        changes.append({'seq': seq, 'type': kind, 'id': object_id, 'deleted': data is None, 'data': data})
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'changes': changes,
+    }
@@ -0,0 +1,97 @@
+"""
+Server-sent events stream of a project's changes (`GET /api/projects/<id>/events/`).
+
+Each change feed entry of the project is sent as an event once committed:
+
+    id: 42
+    event: task
+    data: {"seq": 42, "type": "task", "id": 7, "deleted": false}
+
+Events carry no object data; fetch the object, or the change feed from the
+previous cursor, to act on them. The event id is the change feed cursor, so
+a reconnecting client (which sends `Last-Event-ID`) or one passing
+`?since=<cursor>` first receives the events it missed, replayed from the
+feed. The same replay catches up a stream whose subscription overflowed.
+
+The endpoint needs an ASGI server: each open stream is a coroutine waiting
+on its subscription, not a worker thread.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from app.api.async_views import AsyncViewSet
+from app.api.permissions import IsProjectMember
+from app.changes import changes_since, latest_sequence
+from app.events import TooManySubscribers, event_backend
+from app.models import Project
+
+REPLAY_BATCH = 500
+
+
+def format_event(seq, kind, object_id, deleted):
+    data = json.dumps({'seq': seq, 'type': kind, 'id': object_id, 'deleted': deleted})
+    return f'id: {seq}\nevent: {kind}\ndata: {data}\n\n'
+
+
+async def event_stream(project_id, last):
+    """Yield the events of a project after sequence number `last`, then live ones, until the client leaves."""
+    try:
+        subscription = event_backend().subscribe(project_id)
+    except TooManySubscribers:
+        return
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        while True:
+            # Replay from the feed: at the start, since the subscription only
+            # sees events committed after it, and after an overflow.
+            while True:
+                entries = await sync_to_async(changes_since)(project_id, last, REPLAY_BATCH)
+                for entry in entries:
+                    yield format_event(*entry)
+                if entries:
+                    last = entries[-1][0]
+                if len(entries) < REPLAY_BATCH:
+                    break
+            while True:
+                try:
+                    event = await subscription.get(settings.EVENTS_KEEPALIVE)
+                except TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event is None:
+                    subscription.reset()
+                    break
+                if event['seq'] > last:
+                    last = event['seq']
+                    yield format_event(event['seq'], event['type'], event['id'], event['deleted'])
+    finally:
+        subscription.close()
+
+
+class ProjectEventViewSet(AsyncViewSet):
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    project_lookups = {'project_id': 'project'}
+
+    async def stream(self, request, project_id=None):
+        since = request.headers.get('Last-Event-ID') or request.query_params.get('since')
+        if since is not None and not since.isdigit():
+            return Response({"since": ["Expected an event id."]}, status=status.HTTP_400_BAD_REQUEST)
+        if not await Project.objects.filter(id=project_id).aexists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        if event_backend().broker.stats()['subscribers'] >= settings.EVENTS_MAX_SUBSCRIBERS:
+            return Response(
+                {"error": "Too many event streams are open, try again later."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+        last = int(since) if since is not None else await sync_to_async(latest_sequence)(int(project_id))
+        response = StreamingHttpResponse(event_stream(int(project_id), last), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep reverse proxies from buffering the stream.
+        response['X-Accel-Buffering'] = 'no'
+        return response
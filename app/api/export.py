@@ -0,0 +1,126 @@
+"""
+Streaming export of a project's tasks with their nested comments.
+
+Tasks are read in keyset-paginated chunks of `EXPORT_CHUNK_SIZE` rows and the
+comments of each chunk with one more query, so an export holds at most one
+chunk in memory and starts sending as soon as the first chunk is read.
+
+NDJSON writes one task per line with its comments in a `comments` list. CSV
+writes one row per comment, repeating the task columns, and a single row with
+empty `comment_*` columns for tasks without comments.
+"""
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from app.api.rows import row_serializer
+from app.api.serializers import CommentSerializer, TaskSerializer
+from app.models import Comment, Task
+
+TASK_COLUMNS = list(TaskSerializer.Meta.fields)
+COMMENT_COLUMNS = [name for name in CommentSerializer.Meta.fields if name != 'task']
+CSV_COLUMNS = TASK_COLUMNS + [f'comment_{name}' for name in COMMENT_COLUMNS]
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON; a dict (e.g. an error) becomes a single line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return ndjson_line(data).encode() if data is not None else b''
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV; a dict (e.g. an error) becomes a header row and one value row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not data:
+            return b''
+        buffer = _LineBuffer()
+        writer = csv.writer(buffer)
+        writer.writerow(data.keys())
+        writer.writerow(data.values())
+        return buffer.pop().encode()
+
+
+class _LineBuffer:
+    """File-like object `csv.writer` writes to; `pop()` hands back what was written."""
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value):
+        self.parts.append(value)
+
+    def pop(self):
+        value = ''.join(self.parts)
+        self.parts.clear()
+        return value
+
+
+def ndjson_line(record):
+    return json.dumps(record, cls=JSONEncoder, ensure_ascii=False) + '\n'
+
+
+def iter_task_chunks(project_id, chunk_size=None):
+    """
+    Yield the tasks of a project as lists of serialized tasks, each carrying
+    its serialized comments under `comments`. Two queries per chunk.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    task_rows, comment_rows = row_serializer(TaskSerializer), row_serializer(CommentSerializer)
+    last_id = 0
+    while True:
+        # Keyset pagination on the (project_id, id) foreign key index: every
+        # chunk is an index range scan, however deep into the project it is
+        # (asserted by QueryPlanTests).
+        tasks = task_rows.values(Task.objects.filter(project_id=project_id, id__gt=last_id).order_by('id'))
+        chunk = task_rows.to_representation(tasks[:chunk_size])
+        if not chunk:
+            return
+        comments = {}
+        rows = Comment.objects.filter(task_id__in=[task['id'] for task in chunk]).order_by('task_id', 'created_at', 'id')
+        for comment in comment_rows.to_representation(comment_rows.values(rows)):
+            comments.setdefault(comment['task'], []).append(comment)
+        for task in chunk:
+            task['comments'] = comments.get(task['id'], [])
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_id = chunk[-1]['id']
+
+
+def stream_ndjson(project_id, chunk_size=None):
+    """Yield the export as NDJSON, one chunk of lines at a time."""
+    for chunk in iter_task_chunks(project_id, chunk_size):
+        yield ''.join(ndjson_line(task) for task in chunk)
+
+
+def stream_csv(project_id, chunk_size=None):
+    """Yield the export as CSV, starting with the header row."""
+    buffer = _LineBuffer()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.pop()
+    for chunk in iter_task_chunks(project_id, chunk_size):
+        for task in chunk:
+            values = [task[name] for name in TASK_COLUMNS]
+            for comment in task['comments'] or [None]:
+                if comment is None:
+                    writer.writerow(values + [''] * len(COMMENT_COLUMNS))
+                else:
+                    writer.writerow(values + [comment[name] for name in COMMENT_COLUMNS])
+        yield buffer.pop()
+
+
+EXPORT_STREAMS = {
+    NDJSONRenderer.format: stream_ndjson,
+    CSVRenderer.format: stream_csv,
+}
@@ -0,0 +1,145 @@
+"""
+Filtering and ordering of the task lists.
+
+Only filter/ordering combinations that an index of `Task` serves without a
+sort are accepted, so a filtered page costs the same whatever the size of
+the project. `TASK_LIST_INDEXES` (a project's tasks) and `MY_TASK_INDEXES`
+(the caller's tasks across projects) name the index behind each
+combination; the query plan tests check every one of them.
+"""
+import datetime
+
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from app.models import Task
+
+TASK_FILTERS = ('assigned_to', 'status', 'priority')
+
+# `assigned_to=me` stands for the caller: the same URL lists different tasks
+# for different users.
+ME = 'me'
+TASK_ORDERINGS = ('created_at', 'updated_at')
+
+# (equality filters, ordering column) -> index; `updated_since` is a range on
+# `updated_at` and therefore needs an `updated_at` ordering.
+TASK_LIST_INDEXES = {
+    ((), 'created_at'): 'task_project_created_idx',
+    ((), 'updated_at'): 'task_project_updated_idx',
+    (('status',), 'created_at'): 'task_status_created_idx',
+    (('status',), 'updated_at'): 'task_status_updated_idx',
+    (('status', 'priority'), 'created_at'): 'task_status_prio_created_idx',
+    (('status', 'priority'), 'updated_at'): 'task_status_prio_updated_idx',
+    (('assigned_to',), 'created_at'): 'task_asg_created_idx',
+    (('assigned_to',), 'updated_at'): 'task_asg_updated_idx',
+    (('assigned_to', 'status'), 'created_at'): 'task_asg_status_created_idx',
+    (('assigned_to', 'status'), 'updated_at'): 'task_asg_status_updated_idx',
+    (('assigned_to', 'status', 'priority'), 'created_at'): 'task_asg_stat_prio_created_idx',
+    (('assigned_to', 'status', 'priority'), 'updated_at'): 'task_asg_stat_prio_updated_idx',
+}
+
+# The same for `/api/users/me/tasks/`, where the assignee takes the place of
+# the project and `assigned_to` is implied.
+MY_TASK_INDEXES = {
+    ((), 'created_at'): 'asg_task_created_idx',
+    ((), 'updated_at'): 'asg_task_updated_idx',
+    (('status',), 'created_at'): 'asg_task_status_created_idx',
+    (('status',), 'updated_at'): 'asg_task_status_updated_idx',
+    (('status', 'priority'), 'created_at'): 'asg_task_stat_prio_created_idx',
+    (('status', 'priority'), 'updated_at'): 'asg_task_stat_prio_updated_idx',
+}
+
+_CHOICES = {
+    'status': {value for value, _ in Task.status_choice},
+    'priority': {value for value, _ in Task.priority_choice},
+}
+
+
+def supported_combinations(indexes=TASK_LIST_INDEXES):
+    """Human-readable list of the filter combinations `indexes` accepts."""
+    combinations = sorted({filters for filters, _ in indexes}, key=len)
+    return [' + '.join(filters) or '(none)' for filters in combinations]
+
+
+def refers_to_caller(request):
+    """Whether the query string names the caller as `me`, so the response differs per user."""
+    return request.query_params.get('assigned_to') == ME
+
+
+def parse_task_list_params(request, indexes=TASK_LIST_INDEXES):
+    """
+    Read `status`, `priority`, `assigned_to` (a user id or `me`),
+    `updated_since` (ISO 8601) and `ordering` from the query string. Filters
+    that no combination of `indexes` uses are ignored.
+
+    Returns `(filters, ordering)`: keyword arguments for `Task.objects.filter()`
+    and the cursor pagination ordering. Raises `ValidationError` for invalid
+    values and for combinations no index serves.
+    """
+    params = request.query_params
+    accepted = {name for combination, _ in indexes for name in combination}
+    errors = {}
+    filters = {}
+    for name in TASK_FILTERS:
+        value = params.get(name)
+        if name not in accepted:
+            continue
+        if value in (None, ''):
+            continue
+        if name == 'assigned_to':
+            if value == ME:
+                value = request.user.pk
+            elif value.isdigit():
+                value = int(value)
+            else:
+                errors[name] = ['Expected a user id or "me".']
+                continue
+        elif value not in _CHOICES[name]:
+            errors[name] = [f'"{value}" is not a valid choice.']
+            continue
+        filters[name] = value
+
+    updated_since = params.get('updated_since')
+    if updated_since:
+        moment = parse_datetime(updated_since)
+        if moment is None:
+            errors['updated_since'] = ['Expected an ISO 8601 date and time.']
+        else:
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment, datetime.timezone.utc)
+            filters['updated_at__gt'] = moment
+
+    ordering = params.get('ordering') or ('updated_at' if updated_since else 'created_at')
+    field = ordering[1:] if ordering.startswith('-') else ordering
+    if field not in TASK_ORDERINGS:
+        errors['ordering'] = [f'Expected one of {", ".join(TASK_ORDERINGS)}, optionally prefixed with "-".']
+    elif updated_since and field != 'updated_at':
+        errors['ordering'] = ['updated_since requires ordering by updated_at or -updated_at.']
+    if errors:
+        raise ValidationError(errors)
+
+    equality = tuple(name for name in TASK_FILTERS if name in filters)
+    if (equality, field) not in indexes:
+        raise ValidationError({
+            'non_field_errors': [
+                f'Filtering on {" + ".join(equality)} together is not supported. '
+                f'Supported combinations: {"; ".join(supported_combinations(indexes))}.'
+            ],
+        })
+    descending = '-' if ordering.startswith('-') else ''
+    return filters, (ordering, f'{descending}id')
+
+
+def parse_include_archived(request):
+    """
+    Read `include_archived` (`true`/`1` or `false`/`0`, default false).
+    Archived tasks are only read when asked for, so the default path never
+    touches the archive tables.
+    """
+    value = request.query_params.get('include_archived', '').lower()
+    if value in ('', 'false', '0'):
+        return False
+    if value in ('true', '1'):
+        return True
+    raise ValidationError({'include_archived': ['Expected true or false.']})
@@ -0,0 +1,166 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from app.api.rows import row_serializer
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination ordered by (created_at, id).
+
+    The cursor is opaque to clients and seeks straight past the last row of
+    the previous page, so fetching a deep page costs the same as the first one.
+
+    DRF's `CursorPagination` encodes only the first ordering field and skips
+    rows that share it with an offset; here the cursor carries both fields of
+    the ordering, which identify a row, and the page seeks on the pair, so
+    rows created in the same instant never turn into an offset scan.
+    `ordering` is always a field followed by `id`, both in the same direction.
+    """
+    ordering = ('created_at', 'id')
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        current_position = self.cursor and self.cursor.position
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [order[1:] if order.startswith('-') else f'-{order}' for order in ordering]
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._seek(queryset, current_position, reverse))
+
+        # Positions are unique, so cursors never need an offset. One extra row
+        # tells whether a following page exists.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if len(results) > len(self.page) else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.next_position = current_position is not None, current_position
+            self.has_previous, self.previous_position = following_position is not None, following_position
+        else:
+            self.has_next, self.next_position = following_position is not None, following_position
+            self.has_previous, self.previous_position = current_position is not None, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _seek(self, queryset, position, reverse):
+        """
+        Condition selecting the rows after `position` in the direction of the
+        page, written as `field >= v AND (field > v OR id > i)` so the index
+        range starts at `v` instead of at the start of the scope.
+        """
+        field, key = (order.lstrip('-') for order in self.ordering)
+        value, _, pk = position.rpartition('|')
+        try:
+            value = queryset.model._meta.get_field(field).to_python(value)
+            pk = int(pk)
+        except (DjangoValidationError, ValueError):
+            value = None
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'lt' if reverse != self.ordering[0].startswith('-') else 'gt'
+        return (
+            Q(**{f'{field}__{lookup}e': value})
+            & (Q(**{f'{field}__{lookup}': value}) | Q(**{f'{key}__{lookup}': pk}))
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        field, key = (order.lstrip('-') for order in ordering)
+        if isinstance(instance, dict):
+            return f'{instance[field].isoformat()}|{instance[key]}'
+        return f'{getattr(instance, field).isoformat()}|{getattr(instance, key)}'
+
+
+class PaginatedListMixin:
+    """
+    Cursor pagination for plain `viewsets.ViewSet` classes, which do not get
+    the `GenericAPIView` pagination hooks.
+
+    Pages are serialized through the compiled `RowSerializer` of
+    `serializer_class` when it has one and `API_FAST_LISTS` is on.
+    """
+    pagination_class = CreatedAtCursorPagination
+
+    def get_paginated_list(self, request, queryset, ordering=None, serializer_class=None):
+        """
+        Serialize one page of `queryset` and wrap it with next/previous links.
+        `ordering` overrides the paginator's default ordering, and
+        `serializer_class` the view's.
+        """
+        serializer_class = serializer_class or self.serializer_class
+        paginator = self.pagination_class()
+        if ordering is not None:
+            paginator.ordering = ordering
+        rows = row_serializer(serializer_class) if settings.API_FAST_LISTS else None
+        if rows is not None:
+            page = paginator.paginate_queryset(rows.values(queryset), request, view=self)
+            return paginator.get_paginated_response(rows.to_representation(page))
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class RankedPagination:
+    """
+    Page-number pagination for results ordered by relevance, which have no
+    stable key to seek on. Responses use the same `next`/`previous`/`results`
+    envelope as the cursor-paginated lists, without a total count.
+    """
+    page_size = settings.API_PAGE_SIZE
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def get_paginated_response(self, request, fetch):
+        """
+        `fetch(limit, offset)` returns result rows; one extra row is fetched
+        to tell whether a next page exists.
+        """
+        page = self.get_page_number(request)
+        size = self.get_page_size(request)
+        rows = fetch(size + 1, (page - 1) * size)
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, self.page_query_param, page + 1) if len(rows) > size else None,
+            'previous': (
+                None if page == 1 else
+                remove_query_param(url, self.page_query_param) if page == 2 else
+                replace_query_param(url, self.page_query_param, page - 1)
+            ),
+            'results': rows[:size],
+        })
+
+    def get_page_number(self, request):
+        value = request.query_params.get(self.page_query_param, '1')
+        if not value.isdigit() or int(value) < 1:
+            raise NotFound("Invalid page.")
+        return int(value)
+
+    def get_page_size(self, request):
+        # Like the cursor pagination, fall back to the default on bad input.
+        value = request.query_params.get(self.page_size_query_param, '')
+        if not value.isdigit() or int(value) < 1:
+            return self.page_size
+        return min(int(value), self.max_page_size)
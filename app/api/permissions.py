@@ -0,0 +1,216 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+from app.db import reads_from_replica
+from app.models import ArchivedTask, Project, ProjectMember, Task, Comment
+
+ROLE_ADMIN = 'Admin'
+ROLE_MEMBER = 'Member'
+
+# How each kind of object the API addresses leads back to its project and
+# that project's owner, and the `deleted_at` stamps that hide it when set.
+PROJECT_PATHS = {
+    'project': (Project, 'pk', 'owner_id', ('deleted_at',)),
+    'task': (Task, 'project_id', 'project__owner_id', ('deleted_at', 'project__deleted_at')),
+    'comment': (Comment, 'task__project_id', 'task__project__owner_id', ('task__deleted_at', 'task__project__deleted_at')),
+    'member': (ProjectMember, 'project_id', 'project__owner_id', ('project__deleted_at',)),
+}
+
+# Where a task id missing from the task table is looked up next: tasks moved
+# to the archive (see `app.archive`) keep their id and their project.
+ARCHIVE_PATHS = {
+    'task': (ArchivedTask, 'project_id', 'project__owner_id', ('project__deleted_at',)),
+}
+
+# Cached "not a member" marker; a missing key means "not cached".
+NO_ROLE = ''
+
+# Resolution of an object that is soft-deleted or belongs to a soft-deleted
+# project (see `app.deletion`). Never cached.
+GONE = 'gone'
+
+
+def _project_key(kind, pk):
+    return f'project-of:{kind}:{pk}'
+
+
+def _owner_key(project_id):
+    return f'project-owner:{project_id}'
+
+
+def _role_key(project_id, user_id):
+    return f'project-role:{project_id}:{user_id}'
+
+
+def forget_project_of(kind, pk):
+    """Drop the cached project id of a task, comment or member."""
+    cache.delete(_project_key(kind, pk))
+
+
+def forget_project_owner(project_id):
+    cache.delete(_owner_key(project_id))
+
+
+def forget_project_role(project_id, user_id):
+    cache.delete(_role_key(project_id, user_id))
+
+
+def _row_query(paths, pk, user_id):
+    model, project_path, owner_path, deleted_paths = paths
+    role = ProjectMember.objects.filter(project=OuterRef(project_path), user_id=user_id).values('role')[:1]
+    return model._base_manager.filter(pk=pk).values_list(project_path, owner_path, Subquery(role), *deleted_paths)
+
+
+def _resolved(kind, pk, user_id, row):
+    """Turn a lookup row into `(project_id, owner_id, role)`, or GONE, and the cache entries to set."""
+    project_id, owner_id, role, *deleted = row
+    if any(deleted):
+        return GONE, {}
+    values = {_owner_key(project_id): owner_id, _role_key(project_id, user_id): role or NO_ROLE}
+    if kind != 'project':
+        values[_project_key(kind, pk)] = project_id
+    return (project_id, owner_id, role or NO_ROLE), values
+
+
+def _lookup(kind, pk, user_id):
+    """
+    Resolve the project, its owner and the user's role in it with a single
+    query (two for an archived task). Returns None when the object does not
+    exist and GONE when it is soft-deleted. Only answers read from the
+    primary are cached.
+    """
+    row = _row_query(PROJECT_PATHS[kind], pk, user_id).first()
+    if row is None and kind in ARCHIVE_PATHS:
+        row = _row_query(ARCHIVE_PATHS[kind], pk, user_id).first()
+    if row is None:
+        return None
+    resolved, values = _resolved(kind, pk, user_id, row)
+    if values and not reads_from_replica():
+        cache.set_many(values, settings.PROJECT_ROLE_CACHE_TIMEOUT)
+    return resolved
+
+
+def resolve_project_role(request, kind, pk):
+    """
+    Return `(project_id, role)` for the requesting user and the object
+    `kind`/`pk`, None when the object does not exist, or GONE when it or its
+    project is soft-deleted.
+
+    The project owner counts as an Admin. Answers are memoized on the request
+    and kept in the cache across requests, so a warm lookup runs no query and
+    a cold one runs exactly one. `ProjectMember`, `Project`, `Task` and
+    `Comment` signals invalidate the cached entries.
+    """
+    memo = request.__dict__.setdefault('_project_roles', {})
+    if (kind, pk) in memo:
+        return memo[(kind, pk)]
+
+    user_id = request.user.pk
+    project_id = pk if kind == 'project' else cache.get(_project_key(kind, pk))
+    cached = None
+    if project_id is not None:
+        cached = cache.get_many([_owner_key(project_id), _role_key(project_id, user_id)])
+    if cached is not None and len(cached) == 2:
+        owner_id, role = cached[_owner_key(project_id)], cached[_role_key(project_id, user_id)]
+    else:
+        row = _lookup(kind, pk, user_id)
+        if row is None or row is GONE:
+            memo[(kind, pk)] = row
+            return row
+        project_id, owner_id, role = row
+
+    if owner_id == user_id:
+        role = ROLE_ADMIN
+    memo[(kind, pk)] = (project_id, role)
+    return memo[(kind, pk)]
+
+
+async def _alookup(kind, pk, user_id):
+    """Async counterpart of `_lookup`."""
+    row = await _row_query(PROJECT_PATHS[kind], pk, user_id).afirst()
+    if row is None and kind in ARCHIVE_PATHS:
+        row = await _row_query(ARCHIVE_PATHS[kind], pk, user_id).afirst()
+    if row is None:
+        return None
+    resolved, values = _resolved(kind, pk, user_id, row)
+    if values and not reads_from_replica():
+        await cache.aset_many(values, settings.PROJECT_ROLE_CACHE_TIMEOUT)
+    return resolved
+
+
+async def aresolve_project_role(request, kind, pk):
+    """Async counterpart of `resolve_project_role`, sharing its cache and request memo."""
+    memo = request.__dict__.setdefault('_project_roles', {})
+    if (kind, pk) in memo:
+        return memo[(kind, pk)]
+
+    user_id = request.user.pk
+    project_id = pk if kind == 'project' else await cache.aget(_project_key(kind, pk))
+    cached = None
+    if project_id is not None:
+        cached = await cache.aget_many([_owner_key(project_id), _role_key(project_id, user_id)])
+    if cached is not None and len(cached) == 2:
+        owner_id, role = cached[_owner_key(project_id)], cached[_role_key(project_id, user_id)]
+    else:
+        row = await _alookup(kind, pk, user_id)
+        if row is None or row is GONE:
+            memo[(kind, pk)] = row
+            return row
+        project_id, owner_id, role = row
+
+    if owner_id == user_id:
+        role = ROLE_ADMIN
+    memo[(kind, pk)] = (project_id, role)
+    return memo[(kind, pk)]
+
+
+class IsProjectMember(BasePermission):
+    """
+    Allows access to members of the project the request addresses.
+
+    Views declare `project_lookups`, a mapping of URL kwarg to object kind
+    (see `PROJECT_PATHS`), e.g. `{'project_id': 'project', 'pk': 'task'}`.
+    Superusers are allowed into every project. Requests for objects that do
+    not exist are let through so the view can answer with its own 404;
+    objects that are soft-deleted or in a soft-deleted project are not found
+    for anyone.
+    """
+    message = "You are not a member of this project."
+
+    def required_roles(self, request):
+        return (ROLE_ADMIN, ROLE_MEMBER)
+
+    def allows(self, request, resolved):
+        if resolved is GONE:
+            raise NotFound()
+        return request.user.is_superuser or resolved is None or resolved[1] in self.required_roles(request)
+
+    def has_permission(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return False
+        for kwarg, kind in view.project_lookups.items():
+            if kwarg in view.kwargs:
+                return self.allows(request, resolve_project_role(request, kind, view.kwargs[kwarg]))
+        return request.user.is_superuser
+
+    async def ahas_permission(self, request, view):
+        """Async counterpart of `has_permission`, for the views in `app.api.async_views`."""
+        if not request.user or not request.user.is_authenticated:
+            return False
+        for kwarg, kind in view.project_lookups.items():
+            if kwarg in view.kwargs:
+                return self.allows(request, await aresolve_project_role(request, kind, view.kwargs[kwarg]))
+        return request.user.is_superuser
+
+
+class IsProjectAdminOrReadOnly(IsProjectMember):
+    """Members may read; only project admins and the owner may write."""
+    message = "Only project admins can manage members."
+
+    def required_roles(self, request):
+        if request.method in SAFE_METHODS:
+            return (ROLE_ADMIN, ROLE_MEMBER)
+        return (ROLE_ADMIN,)
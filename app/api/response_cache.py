@@ -0,0 +1,259 @@
+"""
+Server-side cache for task, comment and member read endpoints.
+
+Cached responses are keyed by a per-project version number. Any write to a
+project's tasks, comments or members bumps the version (see `app.signals`),
+which orphans every cached response of that project at once; orphaned entries
+simply expire. Concurrent misses for the same key are collapsed so only one
+request per process computes the response while the others wait for it.
+"""
+import asyncio
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from app.api.filters import refers_to_caller
+from app.api.permissions import aresolve_project_role, resolve_project_role
+from app.api.utils import not_modified
+from app.db import reads_from_replica
+
+_lock = threading.Lock()
+_inflight = {}
+# Misses being computed by coroutines, per (event loop, key).
+_ainflight = {}
+_counters = {'hits': 0, 'misses': 0, 'coalesced': 0}
+
+
+def _version_key(project_id):
+    return f'project-version:{project_id}'
+
+
+def project_version(project_id):
+    """Return the current version of a project's cached responses."""
+    version = cache.get(_version_key(project_id))
+    if version is None:
+        # Start from the clock rather than 0 so that a version lost to
+        # eviction can never line up with responses cached before it.
+        cache.add(_version_key(project_id), time.time_ns(), None)
+        version = cache.get(_version_key(project_id))
+    return version
+
+
+async def aproject_version(project_id):
+    """Async counterpart of `project_version`."""
+    version = await cache.aget(_version_key(project_id))
+    if version is None:
+        await cache.aadd(_version_key(project_id), time.time_ns(), None)
+        version = await cache.aget(_version_key(project_id))
+    return version
+
+
+def bump_project_version(project_id):
+    """
+    Invalidate every cached response of a project. The version is bumped now,
+    for reads later in the same transaction, and again on commit, so that a
+    response computed from pre-commit data in the meantime is never served.
+    """
+    def bump():
+        try:
+            cache.incr(_version_key(project_id))
+        except ValueError:
+            cache.set(_version_key(project_id), time.time_ns(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+
+
+def response_cache_stats():
+    """Hit, miss and coalesced-miss counts of this process since it started."""
+    with _lock:
+        return dict(_counters)
+
+
+def get_or_compute(key, compute, timeout, fill=True):
+    """
+    Return the cached value for `key`, computing and storing it on a miss.
+    Returns `(value, hit)`. Only one caller per process computes a missing
+    key; concurrent callers wait for it and reuse the result. With `fill`
+    false a miss is computed for this caller alone and not stored.
+    """
+    store = caches[settings.RESPONSE_CACHE_ALIAS]
+    value = store.get(key)
+    if value is not None:
+        _count('hits')
+        return value, True
+    if not fill:
+        _count('misses')
+        return compute(), False
+
+    with _lock:
+        event = _inflight.get(key)
+        leader = event is None
+        if leader:
+            event = _inflight[key] = threading.Event()
+    if not leader:
+        event.wait(settings.RESPONSE_CACHE_WAIT)
+        value = store.get(key)
+        if value is not None:
+            _count('coalesced')
+            return value, True
+
+    _count('misses')
+    try:
+        value = compute()
+        if value is not None:
+            store.set(key, value, timeout)
+        return value, False
+    finally:
+        if leader:
+            with _lock:
+                del _inflight[key]
+            event.set()
+
+
+async def aget_or_compute(key, compute, timeout, fill=True):
+    """
+    Async counterpart of `get_or_compute`, where `compute` is a coroutine
+    function. Concurrent misses are collapsed per event loop, not with those
+    of `get_or_compute`.
+    """
+    store = caches[settings.RESPONSE_CACHE_ALIAS]
+    value = await store.aget(key)
+    if value is not None:
+        _count('hits')
+        return value, True
+    if not fill:
+        _count('misses')
+        return await compute(), False
+
+    inflight = (asyncio.get_running_loop(), key)
+    event = _ainflight.get(inflight)
+    leader = event is None
+    if leader:
+        event = _ainflight[inflight] = asyncio.Event()
+    else:
+        try:
+            await asyncio.wait_for(event.wait(), settings.RESPONSE_CACHE_WAIT)
+        except asyncio.TimeoutError:
+            pass
+        value = await store.aget(key)
+        if value is not None:
+            _count('coalesced')
+            return value, True
+
+    _count('misses')
+    try:
+        value = await compute()
+        if value is not None:
+            await store.aset(key, value, timeout)
+        return value, False
+    finally:
+        if leader:
+            del _ainflight[inflight]
+            event.set()
+
+
+def _response_key(request, project_id, version):
+    return 'response:{}:{}:{}:{}:{}'.format(
+        project_id, version, request.build_absolute_uri(), request.accepted_renderer.format,
+        request.user.pk if refers_to_caller(request) else '',
+    )
+
+
+def _entry(response):
+    """What is cached of a handler's response, or None when it is not cacheable."""
+    if response.status_code != 200 or not isinstance(response, Response):
+        return None
+    return response.data, response.get('ETag'), response.get('Last-Modified')
+
+
+def _response(request, entry, computed, hit):
+    """The response for a cache `entry`, reusing the handler's when it `computed` one."""
+    if computed:
+        response = computed[0]
+    else:
+        data, etag, last_modified = entry
+        response = not_modified(request, etag) if etag else None
+        if response is None:
+            response = Response(data)
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = last_modified
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def cache_response(handler):
+    """
+    Cache successful responses of a ViewSet `list`/`retrieve` handler under
+    the version of the project the URL addresses, as declared by the view's
+    `project_lookups`. Runs after permission checks, so cached data is shared
+    between all members of the project, except for URLs that name the caller
+    as `me`, which are cached per user. Requests reading from a replica are
+    served cached responses but do not store theirs.
+    """
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return handler(self, request, *args, **kwargs)
+        kwarg, kind = next((k, v) for k, v in self.project_lookups.items() if k in kwargs)
+        resolved = resolve_project_role(request, kind, kwargs[kwarg])
+        if resolved is None:
+            return handler(self, request, *args, **kwargs)
+
+        key = _response_key(request, resolved[0], project_version(resolved[0]))
+        computed = []
+
+        def compute():
+            computed.append(handler(self, request, *args, **kwargs))
+            return _entry(computed[0])
+
+        entry, hit = get_or_compute(key, compute, settings.RESPONSE_CACHE_TIMEOUT, fill=not reads_from_replica())
+        if entry is None:
+            # Not cacheable (an error or a 304): return what the handler produced.
+            return computed[0] if computed else handler(self, request, *args, **kwargs)
+        return _response(request, entry, computed, hit)
+    return wrapper
+
+
+
+def acache_response(handler):
+    """
+    Async counterpart of `cache_response`, for the coroutine handlers of
+    `app.api.async_views`. Entries are shared with the sync views; concurrent
+    misses are collapsed among coroutines only.
+    """
+    @wraps(handler)
+    async def wrapper(self, request, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return await handler(self, request, *args, **kwargs)
+        kwarg, kind = next((k, v) for k, v in self.project_lookups.items() if k in kwargs)
+        resolved = await aresolve_project_role(request, kind, kwargs[kwarg])
+        if resolved is None:
+            return await handler(self, request, *args, **kwargs)
+
+        key = _response_key(request, resolved[0], await aproject_version(resolved[0]))
+        computed = []
+
+        async def compute():
+            computed.append(await handler(self, request, *args, **kwargs))
+            return _entry(computed[0])
+
+        entry, hit = await aget_or_compute(
+            key, compute, settings.RESPONSE_CACHE_TIMEOUT, fill=not reads_from_replica(),
+        )
+        if entry is None:
+            return computed[0] if computed else await handler(self, request, *args, **kwargs)
+        return _response(request, entry, computed, hit)
+    return wrapper
@@ -1,7 +1,10 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
 from authentication.models import MyUser
 from authentication.api.serializers import MyUserSerializer
-from app.models import Project, ProjectMember, Task, Comment
+from app.models import ArchivedComment, Project, ProjectMember, Task, TaskWithArchived, Comment
+from app.signals import bulk_saved
 
 class ProjectSerializer(serializers.ModelSerializer):
     owner = serializers.StringRelatedField(read_only=True)  # Use a related field or keep read_only
@@ -10,6 +13,8 @@ class ProjectSerializer(serializers.ModelSerializer):
         model = Project
         fields = ['id', 'name', 'description', 'owner', 'created_at', 'updated_at']
         read_only_fields = ['owner']
+        # Joined in SQL by the list fast path (app/api/rows.py); MyUser.__str__ is the username.
+        row_sources = {'owner': 'owner__username'}
         
     def update(self, instance, validated_data):
         # Allow only superusers to change the owner field
@@ -24,19 +29,160 @@ class ProjectSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class CreateOnlyFieldsMixin:
+    """
+    Makes the fields named in `Meta.create_only_fields` read-only when the
+    serializer updates an instance. They tie the object to its project, and
+    the permission check only covers the project the URL names; moving an
+    object to another project through an update would bypass it.
+    """
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        if self.instance is not None:
+            for name in getattr(self.Meta, 'create_only_fields', ()):
+                extra_kwargs[name] = dict(extra_kwargs.get(name, {}), read_only=True)
+        return extra_kwargs
+
+
+class LookupTableRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that resolves against a lookup table preloaded by the
+    parent list serializer, so validating N items costs one query per related
+    model instead of one per item. Falls back to a normal lookup otherwise.
+    """
+    def to_internal_value(self, data):
+        lookup = getattr(self.root, 'related_lookup', {}).get(self.field_name)
+        if lookup is not None:
+            try:
+                return lookup[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        return super().to_internal_value(data)
+
+
+class TaskListSerializer(serializers.ListSerializer):
+    """
+    Validates many tasks at once and writes them with `bulk_create` /
+    `bulk_update`. For updates, pass the instances being changed and give
+    every item an `id`.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.related_lookup = {}
+            for name, field in self.child.fields.items():
+                if isinstance(field, LookupTableRelatedField) and not field.read_only:
+                    pks = {item[name] for item in data if isinstance(item, dict) and isinstance(item.get(name), int)}
+                    self.related_lookup[name] = field.get_queryset().in_bulk(pks)
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            if not hasattr(self, '_instance_map'):
+                self._instance_map = {task.pk: task for task in self.instance}
+            task = self._instance_map.get(data.get('id')) if isinstance(data, dict) else None
+            if task is None:
+                raise serializers.ValidationError({'id': ['Task not found in this project.']})
+            self.child.instance = task
+        return super().run_child_validation(data)
+
+    def create(self, validated_data):
+        tasks = Task.objects.bulk_create([Task(**attrs) for attrs in validated_data])
+        bulk_saved.send(sender=Task, instances=tasks, created=True)
+        return tasks
+
+    def update(self, instances, validated_data):
+        tasks = {task.pk: task for task in instances}
+        now = timezone.now()
+        changed, fields = [], {'updated_at'}
+        for item, attrs in zip(self.initial_data, validated_data):
+            task = tasks[item['id']]
+            for attr, value in attrs.items():
+                setattr(task, attr, value)
+            # bulk_update() skips auto_now, so stamp the rows ourselves.
+            task.updated_at = now
+            fields.update(attrs)
+            changed.append(task)
+        Task.objects.bulk_update(changed, sorted(fields))
+        bulk_saved.send(sender=Task, instances=changed, created=False)
+        for task in changed:
+            task.remember_loaded_values()
+        return changed
+
+
+class TaskSerializer(CreateOnlyFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = LookupTableRelatedField
+
     class Meta:
         model = Task
         fields = ['id', 'title', 'description', 'status', 'priority', 'assigned_to', 'project', 'created_at', 'updated_at']
+        create_only_fields = ['project']
+        list_serializer_class = TaskListSerializer
+
+class TaskWithArchivedSerializer(serializers.ModelSerializer):
+    """Read-only: active and archived tasks alike, for `?include_archived=true`."""
+    class Meta:
+        model = TaskWithArchived
+        fields = TaskSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
 
-class CommentSerializer(serializers.ModelSerializer):
+
+class MyTaskSerializer(serializers.ModelSerializer):
+    """
+    Read-only: a task of `/api/users/me/tasks/`, with the name of its project
+    and its number of comments, both annotated by the list query.
+    """
+    project_name = serializers.CharField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Task
+        fields = TaskSerializer.Meta.fields + ['project_name', 'comment_count']
+        read_only_fields = fields
+        row_sources = {'project_name': 'project_name', 'comment_count': 'comment_count'}
+
+
+class TaskBulkSerializer(serializers.Serializer):
+    """Envelope for `projects/<id>/tasks/bulk/`; the items themselves are validated by `TaskSerializer`."""
+    create = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    update = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        total = len(attrs['create']) + len(attrs['update']) + len(attrs['delete'])
+        if total > settings.TASK_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {settings.TASK_BULK_MAX_ITEMS} items per request.")
+        update_ids = [item.get('id') for item in attrs['update']]
+        # bool is an int subclass, but True is not a task id.
+        if any(not isinstance(pk, int) or isinstance(pk, bool) for pk in update_ids):
+            raise serializers.ValidationError({"update": "Every item needs an integer id."})
+        if len(set(update_ids)) != len(update_ids):
+            raise serializers.ValidationError({"update": "Each task may only be updated once per request."})
+        if len(set(attrs['delete'])) != len(attrs['delete']):
+            raise serializers.ValidationError({"delete": "Each task may only be deleted once per request."})
+        if set(update_ids) & set(attrs['delete']):
+            raise serializers.ValidationError("A task cannot be both updated and deleted.")
+        return attrs
+
+
+class CommentSerializer(CreateOnlyFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = ['id', 'content', 'user', 'task', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # The author is set from the request on create and stays.
+        create_only_fields = ['user', 'task']
+
+
+class ArchivedCommentSerializer(serializers.ModelSerializer):
+    """Read-only: a comment of an archived task."""
+    class Meta:
+        model = ArchivedComment
+        fields = CommentSerializer.Meta.fields
+        read_only_fields = fields
         
         
-class ProjectMemberSerializer(serializers.ModelSerializer):
+class ProjectMemberSerializer(CreateOnlyFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ProjectMember
         fields = ['id', 'project', 'user', 'role', 'created_at', 'updated_at']
+        create_only_fields = ['project']
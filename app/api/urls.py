@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from app.api.views import ProjectViewSet, TaskViewSet, CommentViewSet, ProjectMemberViewSet
+from app.api.async_views import AsyncCommentViewSet, AsyncTaskViewSet
+from app.api.events import ProjectEventViewSet
+from app.api.views import (
+    ProjectViewSet, TaskViewSet, MyTaskViewSet, CommentViewSet, ProjectMemberViewSet, ResponseCacheStatsView, SlowQueryView,
+)
 
 # Create a router and register the ProjectViewSet
 router = DefaultRouter()
@@ -9,11 +13,22 @@ router.register(r'projects', ProjectViewSet)
 urlpatterns = [
     path('', include(router.urls)),
     path('projects/<int:project_id>/tasks/', TaskViewSet.as_view({'get': 'list', 'post': 'create'}), name='task-list'),
+    path('projects/<int:project_id>/tasks/bulk/', TaskViewSet.as_view({'post': 'bulk'}), name='task-bulk'),
     path('tasks/<int:pk>/', TaskViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'}), name='task-detail'),
+    path('tasks/<int:pk>/restore/', TaskViewSet.as_view({'post': 'restore'}), name='task-restore'),
+    path('users/me/tasks/', MyTaskViewSet.as_view({'get': 'list'}), name='my-task-list'),
     path('tasks/<int:task_id>/comments/', CommentViewSet.as_view({'get': 'list', 'post': 'create'}), name='comment-list'),
     path('comments/<int:pk>/', CommentViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'}), name='comment-detail'),
-    path('projects/<int:project_id>/members/', ProjectMemberViewSet.as_view({'get': 'list', 'post': 'create'})),
-    path('members/<int:pk>/', ProjectMemberViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'})),
+    path('projects/<int:project_id>/members/', ProjectMemberViewSet.as_view({'get': 'list', 'post': 'create'}), name='member-list'),
+    path('members/<int:pk>/', ProjectMemberViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'}), name='member-detail'),
+    path('projects/<int:project_id>/events/', ProjectEventViewSet.as_view({'get': 'stream'}), name='project-events'),
+    path('async/projects/<int:project_id>/tasks/', AsyncTaskViewSet.as_view({'get': 'list', 'post': 'create'}), name='async-task-list'),
+    path('async/tasks/<int:pk>/', AsyncTaskViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'}), name='async-task-detail'),
+    path('async/tasks/<int:pk>/restore/', AsyncTaskViewSet.as_view({'post': 'restore'}), name='async-task-restore'),
+    path('async/tasks/<int:task_id>/comments/', AsyncCommentViewSet.as_view({'get': 'list', 'post': 'create'}), name='async-comment-list'),
+    path('async/comments/<int:pk>/', AsyncCommentViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'update', 'delete': 'destroy'}), name='async-comment-detail'),
+    path('cache/stats/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+    path('slow-queries/', SlowQueryView.as_view(), name='slow-queries'),
 ]
 
 
@@ -0,0 +1,66 @@
+import hashlib
+import re
+
+from django.db import connections
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+# "SCAN app_task" (SQLite >= 3.36) or "SCAN TABLE app_task" (older releases).
+# Index-backed scans carry a "USING ... INDEX" suffix and do not match.
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def explain_query_plan(sql, params=(), using='default'):
+    """Return the `EXPLAIN QUERY PLAN` detail lines SQLite chose for `sql`."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_table_scans(sql, params=(), using='default'):
+    """Return the tables that `sql` reads with a full scan instead of an index."""
+    scans = []
+    for detail in explain_query_plan(sql, params, using=using):
+        match = FULL_SCAN_RE.match(detail)
+        if match:
+            scans.append(match.group(1))
+    return scans
+
+
+def collection_etag(request, *validators):
+    """
+    Weak ETag for a list response. `validators` should change whenever a row
+    of the collection is added, removed or updated, e.g. the row count and
+    the latest `updated_at`; the URL (page, filters) and the negotiated format
+    are mixed in so every distinct response gets its own tag.
+    """
+    parts = [request.build_absolute_uri(), request.accepted_renderer.format]
+    parts += [value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in validators]
+    digest = hashlib.md5('|'.join(parts).encode(), usedforsecurity=False).hexdigest()
+    return 'W/' + quote_etag(digest)
+
+
+def row_etag(request, instance):
+    """Weak ETag for a detail response, derived from the row's id and `updated_at`."""
+    return collection_etag(request, instance.pk, instance.updated_at)
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Return a 304 (or 412) response when the request's If-None-Match /
+    If-Modified-Since headers show the client already has this version,
+    otherwise None.
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified=None):
+    """Attach `ETag` and, when known, `Last-Modified` to a response and return it."""
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
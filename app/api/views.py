@@ -1,22 +1,127 @@
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from app.models import Project, ProjectMember, Task, Comment
-from app.api.serializers import ProjectSerializer, ProjectMemberSerializer, TaskSerializer, CommentSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from app.models import ArchivedComment, ArchivedTask, Project, ProjectMember, Task, TaskWithArchived, Comment
+from app.api.serializers import (
+    ArchivedCommentSerializer, MyTaskSerializer, ProjectSerializer, ProjectMemberSerializer, TaskSerializer,
+    TaskBulkSerializer, TaskWithArchivedSerializer, CommentSerializer,
+)
+from app.api.changes import change_feed_page
+from app.api.export import EXPORT_STREAMS, CSVRenderer, NDJSONRenderer
+from app.api.filters import MY_TASK_INDEXES, parse_include_archived, parse_task_list_params
+from app.api.pagination import CreatedAtCursorPagination, PaginatedListMixin, RankedPagination
+from app.api.permissions import IsProjectMember, IsProjectAdminOrReadOnly
+from app.api.response_cache import cache_response, response_cache_stats
+from app.api.utils import collection_etag, not_modified, row_etag, set_validators
+from app.archive import restore_tasks
+from app.deletion import soft_delete_project, soft_delete_tasks
+from app.search import search_available, search_project
+from app.slow_queries import aggregate_slow_queries, slow_queries
+from app.stats import TASKS, counter_subquery, get_project_stats
 from rest_framework.exceptions import PermissionDenied
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import no_body, swagger_auto_schema
 from drf_yasg import openapi
 
-class ProjectViewSet(viewsets.ModelViewSet):
-    queryset = Project.objects.all()
+class ProjectViewSet(PaginatedListMixin, viewsets.ModelViewSet):
+    queryset = Project.objects.select_related('owner')
     serializer_class = ProjectSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
+    project_lookups = {'pk': 'project'}
+
+    def list(self, request, *args, **kwargs):
+        summary = self.get_queryset().aggregate(count=Count('id'), last=Max('updated_at'))
+        etag = collection_etag(request, summary['count'], summary['last'])
+        return not_modified(request, etag) or set_validators(
+            self.get_paginated_list(request, self.filter_queryset(self.get_queryset())), etag,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        project = self.get_object()
+        etag = row_etag(request, project)
+        cached = not_modified(request, etag, project.updated_at)
+        if cached:
+            return cached
+        return set_validators(Response(self.get_serializer(project).data), etag, project.updated_at)
 
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
+    @swagger_auto_schema(responses={200: 'Task counts by status and priority, and the comment total'})
+    @action(detail=True, permission_classes=[IsAuthenticated, IsProjectMember])
+    def stats(self, request, pk=None):
+        """Task counts by status and priority, and the comment total, of a project."""
+        if not Project.objects.filter(pk=pk).exists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(get_project_stats(int(pk)))
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, description="Words to search for; end a word with * for a prefix match", type=openapi.TYPE_STRING, required=True),
+            openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'Ranked matching tasks and comments'},
+    )
+    @action(detail=True, permission_classes=[IsAuthenticated, IsProjectMember])
+    def search(self, request, pk=None):
+        """Full-text search over the titles, descriptions and comments of a project's tasks, best matches first."""
+        if not search_available():
+            return Response({"error": "Search is not available."}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"q": ["This parameter is required."]}, status=status.HTTP_400_BAD_REQUEST)
+        if not Project.objects.filter(pk=pk).exists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        return RankedPagination().get_paginated_response(
+            request, lambda limit, offset: search_project(int(pk), query, limit, offset),
+        )
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('format', openapi.IN_QUERY, description="ndjson (default) or csv", type=openapi.TYPE_STRING)
+        ],
+        responses={200: 'The project\'s tasks with their comments, streamed'},
+    )
+    @action(
+        detail=True, permission_classes=[IsAuthenticated, IsProjectMember],
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request, pk=None):
+        """Stream every task of a project with its comments as NDJSON or CSV."""
+        if not Project.objects.filter(pk=pk).exists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            EXPORT_STREAMS[renderer.format](int(pk)), content_type=f'{renderer.media_type}; charset=utf-8',
+        )
+        response['Content-Disposition'] = f'attachment; filename="project-{pk}.{renderer.format}"'
+        return response
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, description="Cursor returned by the previous call; 0 (default) for everything", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Maximum number of feed entries to read", type=openapi.TYPE_INTEGER),
+        ],
+        responses={200: 'Tasks, comments and members changed since the cursor, and tombstones of deleted ones'},
+    )
+    @action(detail=True, permission_classes=[IsAuthenticated, IsProjectMember])
+    def changes(self, request, pk=None):
+        """Tasks, comments and memberships of a project created, updated or deleted since a cursor."""
+        since = request.query_params.get('since', '0')
+        if not since.isdigit():
+            return Response({"since": ["Expected a cursor returned by this endpoint."]}, status=status.HTTP_400_BAD_REQUEST)
+        if not Project.objects.filter(pk=pk).exists():
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+        limit = RankedPagination().get_page_size(request)
+        return Response(change_feed_page(int(pk), int(since), limit))
+
         
     def destroy(self, request, *args, **kwargs):
         # Retrieve the project instance being deleted
@@ -26,74 +131,53 @@ class ProjectViewSet(viewsets.ModelViewSet):
         if project.owner != request.user and not request.user.is_superuser:
             raise PermissionDenied("You do not have permission to delete this project.")
 
-        # Perform the delete operation if the user is authorized
-        return super().destroy(request, *args, **kwargs)
-    
-class ProjectMemberViewSet(viewsets.ModelViewSet):
-    queryset = ProjectMember.objects.all()
-    serializer_class = ProjectMemberSerializer
-    permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        """
-        Filter the members by the projects the authenticated user is part of.
-        """
-        user = self.request.user
-        return ProjectMember.objects.filter(project__projectmember__user=user)
+        # Hide the project at once; `manage.py purge_deleted` removes its rows later
+        soft_delete_project(project)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def perform_create(self, serializer):
-        """
-        Ensure only project admins can add members.
-        """
-        project = serializer.validated_data['project']
-        user_role = ProjectMember.objects.filter(project=project, user=self.request.user).first()
-
-        if not user_role or user_role.role != 'Admin':
-            raise PermissionDenied("Only project admins can add members.")
-
-        serializer.save()
-
-    def perform_update(self, serializer):
-        """
-        Allow only project admins to update roles.
-        """
-        project = serializer.instance.project
-        user_role = ProjectMember.objects.filter(project=project, user=self.request.user).first()
-
-        if not user_role or user_role.role != 'Admin':
-            raise PermissionDenied("Only project admins can update members.")
-        
-        serializer.save()
 
-    def perform_destroy(self, instance):
-        """
-        Allow only project admins to remove members.
-        """
-        project = instance.project
-        user_role = ProjectMember.objects.filter(project=project, user=self.request.user).first()
-
-        if not user_role or user_role.role != 'Admin':
-            raise PermissionDenied("Only project admins can remove members.")
-
-        instance.delete()
-
-
-
-class TaskViewSet(viewsets.ViewSet):
+class TaskViewSet(PaginatedListMixin, viewsets.ViewSet):
     serializer_class = TaskSerializer
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    project_lookups = {'project_id': 'project', 'pk': 'task'}
+
     @swagger_auto_schema(
         manual_parameters=[
-            openapi.Parameter('project_id', openapi.IN_PATH, description="ID of the project", type=openapi.TYPE_INTEGER)
+            openapi.Parameter('project_id', openapi.IN_PATH, description="ID of the project", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('priority', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('assigned_to', openapi.IN_QUERY, description='User id or "me"', type=openapi.TYPE_STRING),
+            openapi.Parameter('updated_since', openapi.IN_QUERY, description="ISO 8601 date and time", type=openapi.TYPE_STRING),
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="created_at (default), updated_at, -created_at or -updated_at", type=openapi.TYPE_STRING),
+            openapi.Parameter('include_archived', openapi.IN_QUERY, description="true to list archived tasks too", type=openapi.TYPE_BOOLEAN),
         ],
         responses={200: TaskSerializer(many=True)}
     )
+    @cache_response
     def list(self, request, project_id=None):
         """Retrieve a list of all tasks in a project."""
         try:
-            project = Project.objects.get(id=project_id)
-            tasks = Task.objects.filter(project=project)
-            serializer = self.serializer_class(tasks, many=True)
-            return Response(serializer.data)
+            # The maintained task counter and the (project, updated_at) index
+            # keep this validator O(1) in project size.
+            project = Project.objects.annotate(
+                task_count=counter_subquery(TASKS),
+                last_task_update=Subquery(
+                    Task.objects.filter(project=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+                ),
+            ).get(id=project_id)
+            filters, ordering = parse_task_list_params(request)
+            # Archived tasks never change; archiving and restoring change the task counter.
+            # The resolved filters tell apart the lists `assigned_to=me` gives different callers.
+            etag = collection_etag(request, project.task_count, project.last_task_update, *filters.values())
+            if parse_include_archived(request):
+                tasks = TaskWithArchived.objects.filter(project=project, **filters)
+                return not_modified(request, etag) or set_validators(
+                    self.get_paginated_list(request, tasks, ordering, TaskWithArchivedSerializer), etag,
+                )
+            tasks = Task.objects.filter(project=project, **filters)
+            return not_modified(request, etag) or set_validators(
+                self.get_paginated_list(request, tasks, ordering), etag,
+            )
         except Project.DoesNotExist:
             return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
     @swagger_auto_schema(request_body=TaskSerializer, responses={201: TaskSerializer})
@@ -110,14 +194,26 @@ class TaskViewSet(viewsets.ViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Project.DoesNotExist:
             return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
-    @swagger_auto_schema(responses={200: TaskSerializer})
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('include_archived', openapi.IN_QUERY, description="true to find an archived task too", type=openapi.TYPE_BOOLEAN),
+        ],
+        responses={200: TaskSerializer},
+    )
+    @cache_response
     def retrieve(self, request, pk=None):
         """Retrieve details of a specific task."""
+        archived = parse_include_archived(request)
+        model, serializer_class = (TaskWithArchived, TaskWithArchivedSerializer) if archived else (Task, self.serializer_class)
         try:
-            task = Task.objects.get(id=pk)
-            serializer = self.serializer_class(task)
-            return Response(serializer.data)
-        except Task.DoesNotExist:
+            task = model.objects.get(id=pk)
+            etag = row_etag(request, task)
+            cached = not_modified(request, etag, task.updated_at)
+            if cached:
+                return cached
+            serializer = serializer_class(task)
+            return set_validators(Response(serializer.data), etag, task.updated_at)
+        except model.DoesNotExist:
             return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
     @swagger_auto_schema(request_body=TaskSerializer, responses={200: TaskSerializer})
     def update(self, request, pk=None):
@@ -136,29 +232,120 @@ class TaskViewSet(viewsets.ViewSet):
         """Delete a task."""
         try:
             task = Task.objects.get(id=pk)
-            task.delete()
+            soft_delete_tasks([task])
             return Response({"message": "Task deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
         except Task.DoesNotExist:
             return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+    @swagger_auto_schema(request_body=no_body, responses={200: TaskSerializer})
+    def restore(self, request, pk=None):
+        """Move an archived task and its comments back among the active tasks."""
+        if not restore_tasks([pk]):
+            return Response({"error": "Archived task not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.serializer_class(Task.objects.get(id=pk)).data)
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('project_id', openapi.IN_PATH, description="ID of the project", type=openapi.TYPE_INTEGER)
+        ],
+        request_body=TaskBulkSerializer,
+        responses={200: 'Per-item results for created, updated and deleted tasks'},
+    )
+    def bulk(self, request, project_id=None):
+        """Create, partially update and delete many tasks of a project in one transaction."""
+        try:
+            project = Project.objects.get(id=project_id)
+        except Project.DoesNotExist:
+            return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        envelope = TaskBulkSerializer(data=request.data)
+        if not envelope.is_valid():
+            return Response(envelope.errors, status=status.HTTP_400_BAD_REQUEST)
+        creates = [dict(item, project=project.id) for item in envelope.validated_data['create']]
+        updates = [dict(item, project=project.id) for item in envelope.validated_data['update']]
+        deletes = envelope.validated_data['delete']
+
+        with transaction.atomic():
+            targets = Task.objects.filter(project=project, id__in=[item.get('id') for item in updates] + deletes)
+            existing = {task.pk: task for task in targets}
+            create_serializer = self.serializer_class(data=creates, many=True)
+            update_serializer = self.serializer_class(
+                [existing[pk] for pk in existing if pk not in deletes], data=updates, many=True, partial=True,
+            )
+            errors = {}
+            if not create_serializer.is_valid():
+                errors['create'] = create_serializer.errors
+            if not update_serializer.is_valid():
+                errors['update'] = update_serializer.errors
+            missing = [pk for pk in deletes if pk not in existing]
+            if missing:
+                errors['delete'] = [{"id": pk, "error": "Task not found in this project."} for pk in missing]
+            if errors:
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            create_serializer.save()
+            update_serializer.save()
+            soft_delete_tasks([existing[pk] for pk in deletes])
+
+        return Response({
+            "created": create_serializer.data,
+            "updated": update_serializer.data,
+            "deleted": deletes,
+        })
+
+
+class MyTaskViewSet(PaginatedListMixin, viewsets.ViewSet):
+    serializer_class = MyTaskSerializer
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('priority', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('updated_since', openapi.IN_QUERY, description="ISO 8601 date and time", type=openapi.TYPE_STRING),
+            openapi.Parameter('ordering', openapi.IN_QUERY, description="created_at (default), updated_at, -created_at or -updated_at", type=openapi.TYPE_STRING),
+        ],
+        responses={200: MyTaskSerializer(many=True)}
+    )
+    def list(self, request):
+        """Retrieve the tasks assigned to the caller across all their projects."""
+        filters, ordering = parse_task_list_params(request, MY_TASK_INDEXES)
+        user = request.user
+        # One query per page: the (assigned_to, ...) index yields the rows in
+        # order, and each row looks up its project, membership and comment
+        # count by key. Projects the caller has since left are skipped.
+        membership = ProjectMember.objects.filter(project=OuterRef('project_id'), user=user)
+        comments = Comment.all_objects.filter(task=OuterRef('pk')).values('task').annotate(count=Count('id')).values('count')
+        tasks = Task.objects.filter(
+            Q(project__owner=user) | Exists(membership), assigned_to=user, project__deleted_at__isnull=True, **filters,
+        ).annotate(project_name=F('project__name'), comment_count=Coalesce(Subquery(comments), 0))
+        return self.get_paginated_list(request, tasks, ordering)
 
 
-class CommentViewSet(viewsets.ViewSet):
+class CommentViewSet(PaginatedListMixin, viewsets.ViewSet):
     serializer_class = CommentSerializer
+    permission_classes = [IsAuthenticated, IsProjectMember]
+    project_lookups = {'task_id': 'task', 'pk': 'comment'}
+
     @swagger_auto_schema(
         manual_parameters=[
-            openapi.Parameter('task_id', openapi.IN_PATH, description="ID of the task", type=openapi.TYPE_INTEGER)
+            openapi.Parameter('task_id', openapi.IN_PATH, description="ID of the task", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('include_archived', openapi.IN_QUERY, description="true to list the comments of an archived task", type=openapi.TYPE_BOOLEAN),
         ],
         responses={200: CommentSerializer(many=True)},
     )
+    @cache_response
     def list(self, request, task_id=None):
         """Retrieve a list of all comments on a task."""
-        try:
-            task = Task.objects.get(id=task_id)
-            comments = Comment.objects.filter(task=task)
-            serializer = self.serializer_class(comments, many=True)
-            return Response(serializer.data)
-        except Task.DoesNotExist:
-            return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer_class = None
+        comments = Comment.objects.filter(task_id=task_id)
+        if not Task.objects.filter(id=task_id).exists():
+            if not (parse_include_archived(request) and ArchivedTask.objects.filter(id=task_id).exists()):
+                return Response({"error": "Task not found."}, status=status.HTTP_404_NOT_FOUND)
+            comments, serializer_class = ArchivedComment.objects.filter(task_id=task_id), ArchivedCommentSerializer
+        summary = comments.aggregate(count=Count('id'), last=Max('updated_at'))
+        etag = collection_etag(request, summary['count'], summary['last'])
+        return not_modified(request, etag) or set_validators(
+            self.get_paginated_list(request, comments, serializer_class=serializer_class), etag,
+        )
     @swagger_auto_schema(
         request_body=CommentSerializer,
         responses={201: CommentSerializer},
@@ -180,12 +367,17 @@ class CommentViewSet(viewsets.ViewSet):
     @swagger_auto_schema(
         responses={200: CommentSerializer},
     )
+    @cache_response
     def retrieve(self, request, pk=None):
         """Retrieve details of a specific comment."""
         try:
             comment = Comment.objects.get(id=pk)
+            etag = row_etag(request, comment)
+            cached = not_modified(request, etag, comment.updated_at)
+            if cached:
+                return cached
             serializer = self.serializer_class(comment)
-            return Response(serializer.data)
+            return set_validators(Response(serializer.data), etag, comment.updated_at)
         except Comment.DoesNotExist:
             return Response({"error": "Comment not found."}, status=status.HTTP_404_NOT_FOUND)
     @swagger_auto_schema(
@@ -195,7 +387,8 @@ class CommentViewSet(viewsets.ViewSet):
     def update(self, request, pk=None):
         """Update comment details."""
         try:
-            comment = Comment.objects.get(id=pk)
+            # The task is needed afterwards to invalidate its project's cached responses.
+            comment = Comment.objects.select_related('task').get(id=pk)
             serializer = self.serializer_class(comment, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
@@ -217,8 +410,10 @@ class CommentViewSet(viewsets.ViewSet):
         
 
 
-class ProjectMemberViewSet(viewsets.ViewSet):
+class ProjectMemberViewSet(PaginatedListMixin, viewsets.ViewSet):
     serializer_class = ProjectMemberSerializer
+    permission_classes = [IsAuthenticated, IsProjectAdminOrReadOnly]
+    project_lookups = {'project_id': 'project', 'pk': 'member'}
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -226,13 +421,15 @@ class ProjectMemberViewSet(viewsets.ViewSet):
         ],
         responses={200: ProjectMemberSerializer(many=True)},
     )
+    @cache_response
     def list(self, request, project_id=None):
         """Retrieve a list of all members in a project."""
         try:
             project = Project.objects.get(id=project_id)
             members = ProjectMember.objects.filter(project=project)
-            serializer = self.serializer_class(members, many=True)
-            return Response(serializer.data)
+            summary = members.aggregate(count=Count('id'), last=Max('updated_at'))
+            etag = collection_etag(request, summary['count'], summary['last'])
+            return not_modified(request, etag) or set_validators(self.get_paginated_list(request, members), etag)
         except Project.DoesNotExist:
             return Response({"error": "Project not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -257,12 +454,17 @@ class ProjectMemberViewSet(viewsets.ViewSet):
     @swagger_auto_schema(
         responses={200: ProjectMemberSerializer},
     )
+    @cache_response
     def retrieve(self, request, pk=None):
         """Retrieve details of a specific project member."""
         try:
             member = ProjectMember.objects.get(id=pk)
+            etag = row_etag(request, member)
+            cached = not_modified(request, etag, member.updated_at)
+            if cached:
+                return cached
             serializer = self.serializer_class(member)
-            return Response(serializer.data)
+            return set_validators(Response(serializer.data), etag, member.updated_at)
         except ProjectMember.DoesNotExist:
             return Response({"error": "Project member not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -293,3 +495,19 @@ class ProjectMemberViewSet(viewsets.ViewSet):
             return Response({"message": "Member removed successfully."}, status=status.HTTP_204_NO_CONTENT)
         except ProjectMember.DoesNotExist:
             return Response({"error": "Project member not found."}, status=status.HTTP_404_NOT_FOUND)
+
+
+class ResponseCacheStatsView(APIView):
+    """Hit and miss counters of the response cache in this process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(response_cache_stats())
+
+
+class SlowQueryView(APIView):
+    """The slow queries recorded by this process, aggregated by statement and call site."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(aggregate_slow_queries(slow_queries()))
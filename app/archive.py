@@ -0,0 +1,124 @@
+"""
+Archival of finished work.
+
+`archive_tasks()` (`manage.py archive_tasks`) moves Done tasks that have not
+been updated for `ARCHIVE_AFTER_DAYS` days, with their comments, from the
+task and comment tables into `ArchivedTask` and `ArchivedComment`: a batch
+of one project's tasks per transaction, found through the
+(project, status, updated_at) index. The hot tables, their indexes and the
+search index then only hold active work, and every query that does not ask
+for archived tasks only ever reads those.
+
+Archived tasks keep their ids (task ids are AUTOINCREMENT, so they are never
+handed out again) and are read with `?include_archived=true`. They leave the
+project counters and get a change feed tombstone like a deleted task.
+`restore_tasks()` (`POST /api/tasks/<id>/restore/`) moves them back.
+"""
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from app import changes, stats
+from app.api.response_cache import bump_project_version
+from app.models import ArchivedComment, ArchivedTask, Comment, Project, Task
+
+DONE = 'Done'
+TASK_COLUMNS = ['id', 'title', 'description', 'status', 'priority', 'assigned_to_id', 'project_id', 'created_at', 'updated_at']
+COMMENT_COLUMNS = ['id', 'content', 'user_id', 'task_id', 'created_at', 'updated_at']
+
+
+def _counter_deltas(tasks, comments, sign):
+    """Counter changes of moving `tasks` ((id, status, priority) rows) with `comments` comments in or out."""
+    deltas = {stats.COMMENTS: sign * comments}
+    for _, status, priority in tasks:
+        for name, amount in stats.task_deltas(status, priority, sign).items():
+            deltas[name] = deltas.get(name, 0) + amount
+    return deltas
+
+
+def _move(cursor, source, target, columns, key, ids, values=None):
+    """
+    Copy `columns` of the rows of `source` whose `key` is in `ids` into
+    `target`, then delete them from `source`. `values` maps columns to a
+    value written to every row instead. Returns the number of rows moved.
+    """
+    values = values or {}
+    target_columns = columns + [column for column in values if column not in columns]
+    selected = ['%s' if column in values else column for column in target_columns]
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(
+        f'INSERT INTO {target} ({", ".join(target_columns)}) '
+        f'SELECT {", ".join(selected)} FROM {source} WHERE {key} IN ({placeholders})',
+        [*(values[column] for column in target_columns if column in values), *ids],
+    )
+    moved = cursor.rowcount
+    cursor.execute(f'DELETE FROM {source} WHERE {key} IN ({placeholders})', ids)
+    return moved
+
+
+def archive_tasks(before, batch_size=500, project_ids=None, progress=None):
+    """
+    Archive the Done tasks last updated before `before`, in every project or
+    only `project_ids`, at most `batch_size` tasks per transaction.
+    `progress(project_id, tasks)` is called after each batch. Returns the
+    number of tasks archived.
+    """
+    using = router.db_for_write(Task)
+    projects = Project.objects.order_by('id')
+    if project_ids is not None:
+        projects = projects.filter(id__in=project_ids)
+    archived = 0
+    for project_id in projects.values_list('id', flat=True):
+        while True:
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                tasks = list(
+                    Task.objects.filter(project_id=project_id, status=DONE, updated_at__lt=before)
+                    .order_by('updated_at').values_list('id', 'status', 'priority')[:batch_size]
+                )
+                if not tasks:
+                    break
+                ids = [task_id for task_id, _, _ in tasks]
+                # Comments go first so no comment is left pointing at a task that moved.
+                comments = _move(cursor, Comment._meta.db_table, ArchivedComment._meta.db_table, COMMENT_COLUMNS,
+                                 'task_id', ids)
+                _move(cursor, Task._meta.db_table, ArchivedTask._meta.db_table, TASK_COLUMNS, 'id', ids,
+                      {'archived_at': connections[using].ops.adapt_datetimefield_value(timezone.now())})
+                stats.apply_deltas(project_id, _counter_deltas(tasks, comments, -1))
+                changes.record_changes([(project_id, changes.TASK, task_id, True) for task_id in ids])
+                bump_project_version(project_id)
+            archived += len(tasks)
+            if progress is not None:
+                progress(project_id, len(tasks))
+    return archived
+
+
+def restore_tasks(task_ids):
+    """
+    Move archived tasks back with their comments, in one transaction. Their
+    `updated_at` becomes now, so they are not archived again straight away.
+    Returns the ids restored; ids that are not archived are skipped.
+    """
+    using = router.db_for_write(Task)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        tasks = list(ArchivedTask.objects.filter(id__in=task_ids).values_list('id', 'project_id', 'status', 'priority'))
+        if not tasks:
+            return []
+        ids = [task_id for task_id, *_ in tasks]
+        comments = list(ArchivedComment.objects.filter(task_id__in=ids).values_list('id', 'task__project_id'))
+        now = connections[using].ops.adapt_datetimefield_value(timezone.now())
+        # Tasks go first: the search index triggers of comments read their task.
+        _move(cursor, ArchivedTask._meta.db_table, Task._meta.db_table, TASK_COLUMNS, 'id', ids, {'updated_at': now})
+        _move(cursor, ArchivedComment._meta.db_table, Comment._meta.db_table, COMMENT_COLUMNS, 'task_id', ids)
+
+        by_project = {}
+        for task_id, project_id, status, priority in tasks:
+            by_project.setdefault(project_id, ([], []))[0].append((task_id, status, priority))
+        for comment_id, project_id in comments:
+            by_project[project_id][1].append(comment_id)
+        for project_id, (project_tasks, comment_ids) in by_project.items():
+            stats.apply_deltas(project_id, _counter_deltas(project_tasks, len(comment_ids), 1))
+            changes.record_changes(
+                [(project_id, changes.TASK, task_id, False) for task_id, _, _ in project_tasks]
+                + [(project_id, changes.COMMENT, comment_id, False) for comment_id in comment_ids]
+            )
+            bump_project_version(project_id)
+    return ids
@@ -0,0 +1,107 @@
+"""
+Per-project change feed.
+
+Every create, update and delete of a task, comment or membership appends a
+`ProjectChange` row to its project's feed (see `app.signals`); a deleted
+object leaves a tombstone. Clients keep the sequence number of the last
+entry they have seen and ask for the entries after it, so a sync costs in
+proportion to what changed rather than to the size of the project.
+
+Comments deleted together with their task get no tombstones of their own:
+a task tombstone stands for its comments too.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Max
+
+from app.events import event, event_backend
+from app.models import ProjectChange
+
+TASK = ProjectChange.TASK
+COMMENT = ProjectChange.COMMENT
+MEMBER = ProjectChange.MEMBER
+
+
+def record_changes(entries):
+    """
+    Append `entries`, (project id, kind, object id, deleted) tuples, to the
+    feeds of their projects with one insert, and publish them as live events
+    once the transaction commits.
+    """
+    rows = ProjectChange.objects.bulk_create([
+        ProjectChange(project_id=project_id, kind=kind, object_id=object_id, deleted=deleted)
+        for project_id, kind, object_id, deleted in entries
+    ])
+    events = [event(row.id, row.project_id, row.kind, row.object_id, row.deleted) for row in rows]
+    transaction.on_commit(lambda: event_backend().publish(events), using=router.db_for_write(ProjectChange))
+
+
+def record_change(project_id, kind, object_id, deleted=False):
+    record_changes([(project_id, kind, object_id, deleted)])
+
+
+def changes_since(project_id, since, limit):
+    """
+    Return up to `limit` feed entries of a project after sequence number
+    `since`, oldest first, as (seq, kind, object id, deleted) tuples.
+    """
+    return list(
+        ProjectChange.objects.filter(project_id=project_id, id__gt=since)
+        .order_by('id').values_list('id', 'kind', 'object_id', 'deleted')[:limit]
+    )
+
+
+def compact_changes(project_ids=None):
+    """
+    Delete every feed entry that a later entry for the same object
+    supersedes. Clients resuming from any sequence number still receive the
+    latest state of every object changed since. Returns the number of
+    entries deleted.
+    """
+    table = ProjectChange._meta.db_table
+    where, params = '', []
+    if project_ids is not None:
+        if not project_ids:
+            return 0
+        where = f' AND c.project_id IN ({", ".join(["%s"] * len(project_ids))})'
+        params = list(project_ids)
+    with connections[router.db_for_write(ProjectChange)].cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN ('
+            f'SELECT c.id FROM {table} c WHERE EXISTS ('
+            f'SELECT 1 FROM {table} n WHERE n.project_id = c.project_id AND n.kind = c.kind '
+            f'AND n.object_id = c.object_id AND n.id > c.id){where})',
+            params,
+        )
+        return cursor.rowcount
+
+
+def record_contents(project_ids):
+    """
+    Append one entry per task and comment of `project_ids` to their feeds, in
+    the order they were last updated, for rows inserted without signals.
+    Returns the number of entries appended; they are not published as events.
+    """
+    if not project_ids:
+        return 0
+    table = ProjectChange._meta.db_table
+    placeholders = ', '.join(['%s'] * len(project_ids))
+    with connections[router.db_for_write(ProjectChange)].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (project_id, kind, object_id, deleted, created_at) "
+            f"SELECT project_id, %s, id, %s, updated_at FROM app_task "
+            f"WHERE project_id IN ({placeholders}) ORDER BY updated_at, id",
+            [TASK, False, *project_ids],
+        )
+        appended = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {table} (project_id, kind, object_id, deleted, created_at) "
+            f"SELECT t.project_id, %s, c.id, %s, c.updated_at FROM app_comment c JOIN app_task t ON t.id = c.task_id "
+            f"WHERE t.project_id IN ({placeholders}) ORDER BY c.updated_at, c.id",
+            [COMMENT, False, *project_ids],
+        )
+        return appended + cursor.rowcount
+
+
+def latest_sequence(project_id):
+    """The sequence number of a project's newest feed entry, or 0."""
+    return ProjectChange.objects.filter(project_id=project_id).aggregate(seq=Max('id'))['seq'] or 0
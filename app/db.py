@@ -0,0 +1,121 @@
+"""
+Database routing and SQLite connection setup.
+
+`ReplicaRouter` sends the reads of safe (GET/HEAD/OPTIONS) API requests to
+one of `DATABASE_READ_REPLICAS`, chosen once per request, and every write
+to the primary. Only models of `DATABASE_REPLICA_APPS` are read from
+replicas; sessions, for one, are always read from the primary, where a login
+has just written them. The first write of a request pins the rest of it to the
+primary, so it reads its own writes. Requests that are not safe API requests
+read from the primary throughout, and so does code running outside a
+request (management commands, migrations, the shell).
+
+Replicas may lag behind the primary. What a request read from one must not
+fill the shared caches (roles, responses, users): a stale entry would outlive
+the write that superseded it by the cache timeout. Callers check
+`reads_from_replica()` before filling.
+
+`configure_sqlite` runs on every new SQLite connection: it switches the
+primary to WAL, so readers no longer wait for a writer, and applies the
+`SQLITE_*` pragmas; connections to replicas are made read-only and leave the
+journal mode of the replica files alone.
+"""
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from rest_framework.permissions import SAFE_METHODS
+
+
+class _Route:
+    __slots__ = ('replica', 'pinned')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.pinned = replica is None
+
+
+_route = contextvars.ContextVar('db_route', default=None)
+
+
+def _route_for(request):
+    replicas = settings.DATABASE_READ_REPLICAS
+    if replicas and request.method in SAFE_METHODS and request.path.startswith(settings.DATABASE_REPLICA_PATH_PREFIX):
+        return _Route(random.choice(replicas))
+    return _Route(None)
+
+
+def reads_from_replica():
+    """Whether the current request still reads from a replica, which may lag behind the primary."""
+    route = _route.get()
+    return route is not None and not route.pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None:
+            return None
+        if route.pinned or model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            # An explicit primary also overrides the hint of an instance read from a replica.
+            return DEFAULT_DB_ALIAS
+        return route.replica
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_READ_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Sets up the database route of each request for `ReplicaRouter`."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _route.set(_route_for(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _route.reset(token)
+
+    async def __acall__(self, request):
+        token = _route.set(_route_for(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _route.reset(token)
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    replica = connection.alias in settings.DATABASE_READ_REPLICAS
+    with connection.cursor() as cursor:
+        # Switching to WAL writes to the file; replicas are maintained externally.
+        if not replica and not connection.is_in_memory_db():
+            cursor.execute('PRAGMA journal_mode = WAL')
+        cursor.execute(f'PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA cache_size = {-int(settings.SQLITE_CACHE_SIZE_KB)}')
+        cursor.execute(f'PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}')
+        if replica:
+            cursor.execute('PRAGMA query_only = ON')
@@ -0,0 +1,117 @@
+"""
+Soft deletion of projects and tasks, and the purge that removes them.
+
+Deleting a project or task through the API only stamps its `deleted_at`,
+which takes one short UPDATE however many tasks, comments and memberships
+hang off it. From then on the row is hidden: the `objects` managers leave out
+soft-deleted tasks and projects and the comments of soft-deleted tasks, and
+the permission lookups treat everything in a soft-deleted project as gone.
+Counters, cached responses and the change feed are updated at once by the
+`soft_deleted` handlers in `app.signals`.
+
+`purge_deleted()` (`manage.py purge_deleted`) then deletes the rows for good,
+dependents first, a bounded batch per transaction so writers are never held
+up for long. Its progress is the database itself: an interrupted purge picks
+up where it stopped when run again.
+"""
+import time
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from app.models import (
+    ArchivedComment, ArchivedTask, Comment, Project, ProjectChange, ProjectCounter, ProjectMember, Task,
+)
+from app.signals import soft_deleted
+
+
+def _stamp_deleted(model, pks):
+    """
+    Set `deleted_at` on the rows of `pks` that are still live and return
+    their ids. A single UPDATE ... RETURNING, so of two concurrent or
+    repeated deletes only one sees a row, and the handlers run once.
+    """
+    connection = connections[router.db_for_write(model)]
+    placeholders = ', '.join(['%s'] * len(pks))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {model._meta.db_table} SET deleted_at = %s '
+            f'WHERE id IN ({placeholders}) AND deleted_at IS NULL RETURNING id',
+            [connection.ops.adapt_datetimefield_value(timezone.now()), *pks],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def soft_delete_project(project):
+    """Hide `project` and everything in it until the next purge. Returns whether it was still live."""
+    with transaction.atomic():
+        if not _stamp_deleted(Project, [project.pk]):
+            return False
+        soft_deleted.send(sender=Project, instances=[project])
+    return True
+
+
+def soft_delete_tasks(tasks):
+    """Hide `tasks` and their comments until the next purge. Returns the tasks that were still live."""
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    with transaction.atomic():
+        live = _stamp_deleted(Task, [task.pk for task in tasks])
+        tasks = [task for task in tasks if task.pk in live]
+        if tasks:
+            soft_deleted.send(sender=Task, instances=tasks)
+    return tasks
+
+
+def _purge_steps():
+    """
+    (label, table, condition) of each purge step, in dependency order: every
+    step removes rows the later ones would otherwise be blocked by.
+    """
+    task, project = Task._meta.db_table, Project._meta.db_table
+    deleted_tasks = f'SELECT id FROM {task} WHERE deleted_at IS NOT NULL'
+    deleted_projects = f'SELECT id FROM {project} WHERE deleted_at IS NOT NULL'
+    tasks_of_deleted_projects = f'SELECT id FROM {task} WHERE project_id IN ({deleted_projects})'
+    return [
+        ('comments', Comment._meta.db_table, f'task_id IN ({deleted_tasks})'),
+        ('tasks', task, 'deleted_at IS NOT NULL'),
+        ('comments', Comment._meta.db_table, f'task_id IN ({tasks_of_deleted_projects})'),
+        ('tasks', task, f'project_id IN ({deleted_projects})'),
+        ('archived comments', ArchivedComment._meta.db_table,
+         f'task_id IN (SELECT id FROM {ArchivedTask._meta.db_table} WHERE project_id IN ({deleted_projects}))'),
+        ('archived tasks', ArchivedTask._meta.db_table, f'project_id IN ({deleted_projects})'),
+        ('members', ProjectMember._meta.db_table, f'project_id IN ({deleted_projects})'),
+        ('counters', ProjectCounter._meta.db_table, f'project_id IN ({deleted_projects})'),
+        ('changes', ProjectChange._meta.db_table, f'project_id IN ({deleted_projects})'),
+        ('projects', project, 'deleted_at IS NOT NULL'),
+    ]
+
+
+def purge_deleted(batch_size=1000, pause=0, progress=None):
+    """
+    Delete soft-deleted tasks and projects with their comments, memberships,
+    counters and change feed, at most `batch_size` rows per transaction,
+    sleeping `pause` seconds between batches. `progress(label, rows)` is
+    called after each batch. Returns {label: rows deleted}.
+
+    The rows go with plain DELETEs: the soft delete already did the work of
+    the delete signals, so they must not run again.
+    """
+    using = router.db_for_write(Task)
+    purged = {}
+    for label, table, condition in _purge_steps():
+        purged.setdefault(label, 0)
+        sql = f'DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {condition} LIMIT %s)'
+        while True:
+            with transaction.atomic(using=using), connections[using].cursor() as cursor:
+                cursor.execute(sql, [batch_size])
+                deleted = cursor.rowcount
+            if not deleted:
+                break
+            purged[label] += deleted
+            if progress is not None:
+                progress(label, deleted)
+            if pause:
+                time.sleep(pause)
+    return purged
@@ -0,0 +1,233 @@
+"""
+Live project events for the server-sent events endpoint.
+
+Every change feed entry (see `app.changes`) is also an event, published
+once its transaction commits. Subscribers, one per open event stream, live
+on the ASGI event loop and receive the events of one project through a
+bounded queue; `Broker` fans each event out to the subscribers of its
+project in the process.
+
+How events travel between processes depends on `EVENTS_BACKEND`:
+
+- `LocalBackend` (the default) hands committed events straight to the
+  broker of the writing process, so only streams served by that process
+  see them. Right for a single ASGI worker.
+- `ChangeFeedBackend` uses the change feed table as the channel: each
+  process polls it every `EVENTS_POLL_INTERVAL` seconds while it has
+  subscribers, so streams see writes made by any process, at the cost of
+  one indexed query per interval and process.
+
+Another backend (e.g. Redis pub/sub) only has to implement `publish()` and
+`subscribe()`.
+
+A subscriber that falls `EVENTS_QUEUE_SIZE` events behind is marked as
+overflowed instead of slowing down the publisher or growing without bound;
+its stream then replays what it missed from the change feed.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from app.models import ProjectChange
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One stream's view of a project's events, bound to the event loop it was created on."""
+
+    def __init__(self, broker, project_id, loop, maxsize):
+        self.broker = broker
+        self.project_id = project_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def deliver(self, event):
+        """Queue `event`; runs on the subscription's loop."""
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.broker.count('overflows')
+            # Wake up the stream so it notices the overflow even while idle.
+            self.drain()
+            self.queue.put_nowait(None)
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def get(self, timeout):
+        """The next event, None after an overflow; raises `TimeoutError` after `timeout` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def reset(self):
+        """Resume live delivery after the stream has replayed what it missed."""
+        self.drain()
+        self.overflowed = False
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """In-process fan-out of project events to subscriptions."""
+
+    def __init__(self, queue_size, max_subscribers):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        # project id -> loop -> subscriptions
+        self._subscriptions = defaultdict(lambda: defaultdict(set))
+        self._count = 0
+        self._counters = {'published': 0, 'delivered': 0, 'overflows': 0, 'rejected': 0}
+
+    def subscribe(self, project_id):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self._counters['rejected'] += 1
+                raise TooManySubscribers()
+            subscription = Subscription(self, project_id, loop, self.queue_size)
+            self._subscriptions[project_id][loop].add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            loops = self._subscriptions.get(subscription.project_id)
+            if not loops or subscription not in loops.get(subscription.loop, ()):
+                return
+            loops[subscription.loop].discard(subscription)
+            self._count -= 1
+            if not loops[subscription.loop]:
+                del loops[subscription.loop]
+            if not loops:
+                del self._subscriptions[subscription.project_id]
+
+    def projects(self):
+        with self._lock:
+            return set(self._subscriptions)
+
+    def publish(self, events):
+        """Fan `events` ({'project': id, ...} dicts) out to subscribers; callable from any thread."""
+        by_loop = defaultdict(list)
+        with self._lock:
+            self._counters['published'] += len(events)
+            for event in events:
+                for loop in self._subscriptions.get(event['project'], ()):
+                    by_loop[loop].append(event)
+        for loop, loop_events in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._fan_out, loop, loop_events)
+            except RuntimeError:
+                pass  # the loop has been closed
+
+    def _fan_out(self, loop, events):
+        delivered = 0
+        for event in events:
+            with self._lock:
+                subscriptions = list(self._subscriptions.get(event['project'], {}).get(loop, ()))
+            for subscription in subscriptions:
+                subscription.deliver(event)
+            delivered += len(subscriptions)
+        self.count('delivered', delivered)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, subscribers=self._count)
+
+
+class LocalBackend:
+    """Delivers events to the streams of the process that committed them."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, events):
+        self.broker.publish(events)
+
+    def subscribe(self, project_id):
+        return self.broker.subscribe(project_id)
+
+
+class ChangeFeedBackend:
+    """Delivers events from every process by polling the change feed table."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self._pollers = {}
+
+    def publish(self, events):
+        pass  # the committed change feed rows are the message
+
+    def subscribe(self, project_id):
+        subscription = self.broker.subscribe(project_id)
+        loop = subscription.loop
+        if loop not in self._pollers or self._pollers[loop].done():
+            self._pollers[loop] = loop.create_task(self.poll())
+        return subscription
+
+    async def poll(self):
+        last = await sync_to_async(_latest_change_id)()
+        while True:
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+            projects = self.broker.projects()
+            if not projects:
+                return
+            rows = await sync_to_async(_changes_after)(last)
+            if rows:
+                last = rows[-1][0]
+                self.broker.publish([event(*row) for row in rows if row[1] in projects])
+
+
+def _latest_change_id():
+    change = ProjectChange.objects.order_by('-id').values_list('id', flat=True).first()
+    return change or 0
+
+
+def _changes_after(last, limit=1000):
+    return list(
+        ProjectChange.objects.filter(id__gt=last).order_by('id')
+        .values_list('id', 'project_id', 'kind', 'object_id', 'deleted')[:limit]
+    )
+
+
+def event(seq, project_id, kind, object_id, deleted):
+    return {'seq': seq, 'project': project_id, 'type': kind, 'id': object_id, 'deleted': deleted}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def event_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            broker = Broker(settings.EVENTS_QUEUE_SIZE, settings.EVENTS_MAX_SUBSCRIBERS)
+            _backend = import_string(settings.EVENTS_BACKEND)(broker)
+        return _backend
+
+
+@receiver(setting_changed)
+def reset_event_backend(setting, **kwargs):
+    global _backend
+    if setting.startswith('EVENTS_'):
+        with _backend_lock:
+            _backend = None
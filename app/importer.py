@@ -0,0 +1,251 @@
+"""
+Bulk import of tasks and their comments, as read by `manage.py import_project`.
+
+The input is the format written by the project export: NDJSON with one task
+per line and its comments nested under `comments`, or CSV with one row per
+comment and the task columns repeated (consecutive rows with the same task
+`id` belong to one task). Task ids and timestamps of the source are not kept.
+
+Records are validated a batch at a time. User and project references are
+resolved through lookup tables filled with one query per batch for the keys
+not seen before, and each batch is written with `bulk_create` inside its own
+transaction, together with an `ImportCheckpoint` recording how many input
+records are done, so a failed import resumes after the last committed batch.
+"""
+import csv
+import json
+from itertools import groupby, islice
+
+from django.db import transaction
+from django.db.models import Q
+
+from app.models import Comment, ImportCheckpoint, Project, Task
+from app.signals import bulk_saved
+from authentication.models import MyUser
+
+TASK_STATUSES = {status for status, _ in Task.status_choice}
+TASK_PRIORITIES = {priority for priority, _ in Task.priority_choice}
+TITLE_MAX_LENGTH = Task._meta.get_field('title').max_length
+
+
+class ImportDataError(Exception):
+    """Raised for input that cannot be imported; carries (position, message) pairs."""
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__('; '.join(f'record {position}: {message}' for position, message in errors))
+
+
+def read_ndjson(lines):
+    """Yield the task records of NDJSON input, skipping blank lines."""
+    position = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        position += 1
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            raise ImportDataError([(position, f'invalid JSON: {exc}')])
+        yield record
+
+
+def read_csv(lines):
+    """Yield the task records of CSV input, regrouping comment rows under their task."""
+    for _, rows in groupby(csv.DictReader(lines), key=lambda row: row.get('id')):
+        rows = list(rows)
+        record = {name: value for name, value in rows[0].items() if not name.startswith('comment_')}
+        record['comments'] = [
+            {name[len('comment_'):]: value for name, value in row.items() if name.startswith('comment_')}
+            for row in rows if row.get('comment_content') or row.get('comment_id')
+        ]
+        yield record
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def _text(value):
+    return value if isinstance(value, str) else ''
+
+
+class LookupTable:
+    """
+    Maps references (primary keys, or values of `key_fields`) to primary
+    keys. `preload()` fetches the references not seen yet with one query;
+    unknown references are remembered as None.
+    """
+    def __init__(self, queryset, key_fields=()):
+        self.queryset = queryset
+        self.key_fields = key_fields
+        self.table = {}
+
+    @staticmethod
+    def normalize(ref):
+        if isinstance(ref, str):
+            ref = ref.strip()
+            return int(ref) if ref.isdigit() else ref
+        return ref
+
+    def preload(self, refs):
+        missing = {self.normalize(ref) for ref in refs if isinstance(ref, (int, str))} - set(self.table) - {''}
+        if not missing:
+            return
+        ids = {ref for ref in missing if isinstance(ref, int)}
+        names = missing - ids
+        condition = Q(pk__in=ids)
+        for field in self.key_fields:
+            condition |= Q(**{f'{field}__in': names})
+        for row in self.queryset.filter(condition).values_list('pk', *self.key_fields):
+            for key in row:
+                if key in missing:
+                    self.table[key] = row[0]
+        for ref in missing:
+            self.table.setdefault(ref, None)
+
+    def resolve(self, ref):
+        if not isinstance(ref, (int, str)):
+            return None
+        return self.table.get(self.normalize(ref))
+
+
+class Importer:
+    """
+    Imports task records into `project_id`, or into each record's own
+    `project` when None. With `skip_invalid`, invalid tasks and comments are
+    reported through `on_invalid` and left out; otherwise the first invalid
+    batch raises `ImportDataError` and nothing of that batch is written.
+    """
+    def __init__(self, project_id=None, batch_size=1000, skip_invalid=False, on_invalid=None):
+        self.project_id = project_id
+        self.batch_size = batch_size
+        self.skip_invalid = skip_invalid
+        self.on_invalid = on_invalid or (lambda position, message: None)
+        self.users = LookupTable(MyUser.objects.all(), ('username', 'email'))
+        self.projects = LookupTable(Project.objects.all())
+
+    def run(self, records, checkpoint_key=None):
+        """
+        Import `records`, skipping those a previous run with the same
+        `checkpoint_key` already committed. Yields `(position, tasks,
+        comments)` after each committed batch, `position` being the number
+        of input records done so far.
+        """
+        start = 0
+        if checkpoint_key:
+            start = ImportCheckpoint.objects.filter(key=checkpoint_key).values_list('position', flat=True).first() or 0
+        records = enumerate(islice(records, start, None), start + 1)
+        while True:
+            batch = list(islice(records, self.batch_size))
+            if not batch:
+                break
+            tasks, comments = self.write_batch(batch, checkpoint_key)
+            yield batch[-1][0], tasks, comments
+        if checkpoint_key:
+            self.forget_checkpoint(checkpoint_key)
+
+    def forget_checkpoint(self, checkpoint_key):
+        ImportCheckpoint.objects.filter(key=checkpoint_key).delete()
+
+    def write_batch(self, batch, checkpoint_key=None):
+        """Validate and insert one batch of `(position, record)`; returns the row counts written."""
+        rows, errors = self.validate_batch(batch)
+        if errors and not self.skip_invalid:
+            raise ImportDataError(errors)
+        for position, message in errors:
+            self.on_invalid(position, message)
+
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create([task for task, _ in rows])
+            comments = [comment for task, task_comments in rows for comment in task_comments]
+            for task, task_comments in rows:
+                for comment in task_comments:
+                    comment.task = task
+            comments = Comment.objects.bulk_create(comments)
+            # bulk_create() sends no post_save; keep counters and caches in step.
+            bulk_saved.send(sender=Task, instances=tasks, created=True)
+            bulk_saved.send(sender=Comment, instances=comments, created=True)
+            if checkpoint_key:
+                ImportCheckpoint.objects.bulk_create(
+                    [ImportCheckpoint(key=checkpoint_key, position=batch[-1][0])],
+                    update_conflicts=True, unique_fields=['key'], update_fields=['position', 'updated_at'],
+                )
+        return len(tasks), len(comments)
+
+    def validate_batch(self, batch):
+        """
+        Return `([(Task, [Comment, ...]), ...], errors)` for a batch. Errors
+        are `(position, message)`; a task with errors is left out entirely, an
+        invalid comment only drops that comment.
+        """
+        user_refs, project_refs = set(), set()
+        for _, record in batch:
+            if isinstance(record, dict):
+                user_refs.add(record.get('assigned_to'))
+                user_refs.update(comment.get('user') for comment in record.get('comments') or () if isinstance(comment, dict))
+                project_refs.add(record.get('project'))
+        self.users.preload(user_refs)
+        if self.project_id is None:
+            self.projects.preload(project_refs)
+
+        rows, errors = [], []
+        for position, record in batch:
+            task, problems = self.build_task(record)
+            if problems:
+                errors.extend((position, problem) for problem in problems)
+                continue
+            task_comments = []
+            for index, data in enumerate(record.get('comments') or ()):
+                comment, problems = self.build_comment(data)
+                if problems:
+                    errors.extend((position, f'comment {index + 1}: {problem}') for problem in problems)
+                else:
+                    task_comments.append(comment)
+            rows.append((task, task_comments))
+        return rows, errors
+
+    def build_task(self, record):
+        if not isinstance(record, dict):
+            return None, ['expected an object']
+        problems = []
+        title = _text(record.get('title')).strip()
+        if not title:
+            problems.append('title may not be blank')
+        elif len(title) > TITLE_MAX_LENGTH:
+            problems.append(f'title is longer than {TITLE_MAX_LENGTH} characters')
+        description = _text(record.get('description'))
+        if not description.strip():
+            problems.append('description may not be blank')
+        if record.get('status') not in TASK_STATUSES:
+            problems.append(f'unknown status {record.get("status")!r}')
+        if record.get('priority') not in TASK_PRIORITIES:
+            problems.append(f'unknown priority {record.get("priority")!r}')
+        assigned_to = None
+        if record.get('assigned_to') not in (None, ''):
+            assigned_to = self.users.resolve(record['assigned_to'])
+            if assigned_to is None:
+                problems.append(f'unknown user {record["assigned_to"]!r}')
+        project_id = self.project_id
+        if project_id is None:
+            project_id = self.projects.resolve(record.get('project'))
+            if project_id is None:
+                problems.append(f'unknown project {record.get("project")!r}')
+        if problems:
+            return None, problems
+        return Task(
+            title=title, description=description, status=record['status'], priority=record['priority'],
+            assigned_to_id=assigned_to, project_id=project_id,
+        ), []
+
+    def build_comment(self, data):
+        if not isinstance(data, dict):
+            return None, ['expected an object']
+        problems = []
+        content = _text(data.get('content'))
+        if not content.strip():
+            problems.append('content may not be blank')
+        user = self.users.resolve(data.get('user'))
+        if user is None:
+            problems.append(f'unknown user {data.get("user")!r}')
+        if problems:
+            return None, problems
+        return Comment(content=content, user_id=user), []
@@ -0,0 +1,37 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.archive import archive_tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "Move Done tasks not updated for --days days, with their comments, into the archive tables, a batch of one "
+        "project's tasks per transaction. Archived tasks are read with ?include_archived=true and brought back with "
+        "POST /api/tasks/<id>/restore/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help=f"Archive tasks untouched for this many days (default {settings.ARCHIVE_AFTER_DAYS}).")
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help=f"Tasks moved per transaction (default {settings.ARCHIVE_BATCH_SIZE}).")
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help="Only this project (may be repeated). Defaults to every project.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days must not be negative.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        def progress(project_id, tasks):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Archived {tasks} tasks of project {project_id}.")
+
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        archived = archive_tasks(before, options['batch_size'], options['projects'], progress)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} task{'' if archived == 1 else 's'}."))
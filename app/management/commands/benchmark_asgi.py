@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import AsyncClient, override_settings
+
+from app.models import Comment, Task
+from app.testing import seed_dataset
+
+# (name, sync path, async path); `{project}` and `{task}` are filled in from the dataset.
+ROUTES = [
+    ('task-list', '/api/projects/{project}/tasks/', '/api/async/projects/{project}/tasks/'),
+    ('task-detail', '/api/tasks/{task}/', '/api/async/tasks/{task}/'),
+    ('comment-list', '/api/tasks/{task}/comments/', '/api/async/tasks/{task}/comments/'),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync and async variants of the task and comment endpoints under concurrent load, "
+        "through the ASGI handler in-process, and check both return the same bodies. Seeds (and rolls back) "
+        "a dataset when the database has no comments. The response cache is disabled while it runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests per route and variant (default 200).")
+        parser.add_argument('--concurrency', type=int, default=20, help="Requests in flight at once (default 20).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive.")
+        with override_settings(ALLOWED_HOSTS=['*'], RESPONSE_CACHE_ENABLED=False):
+            comment = Comment.objects.select_related('task__project__owner').order_by('id').first()
+            if comment is not None:
+                self.run(comment.task, options['requests'], options['concurrency'])
+                return
+            self.stdout.write("No comments found; benchmarking a temporary seeded dataset.")
+            try:
+                with transaction.atomic():
+                    seed_dataset(projects=5, members=5, tasks=100, comments=3)
+                    task = Task.objects.select_related('project__owner').filter(comment__isnull=False).first()
+                    self.run(task, options['requests'], options['concurrency'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def run(self, task, requests, concurrency):
+        async_to_sync(self.benchmark)(task, requests, concurrency)
+
+    async def benchmark(self, task, requests, concurrency):
+        client = AsyncClient()
+        await client.aforce_login(task.project.owner)
+        self.stdout.write(
+            f"{'route':<14} {'variant':<7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+        )
+        for name, sync_path, async_path in ROUTES:
+            sync_path = sync_path.format(project=task.project_id, task=task.id)
+            async_path = async_path.format(project=task.project_id, task=task.id)
+            sync_response, async_response = await client.get(sync_path), await client.get(async_path)
+            # Pagination links point back at the route that served the page.
+            async_content = async_response.content.replace(b'/api/async/', b'/api/')
+            if sync_response.status_code != 200 or sync_response.content != async_content:
+                raise CommandError(f"{name}: the async variant answers differently from {sync_path}.")
+            for variant, path in (('sync', sync_path), ('async', async_path)):
+                elapsed, timings = await self.load(client, path, requests, concurrency)
+                p50, p95, p99 = (timings[min(int(len(timings) * q), len(timings) - 1)] * 1000 for q in (0.50, 0.95, 0.99))
+                self.stdout.write(
+                    f"{name:<14} {variant:<7} {requests / elapsed:>8.0f} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}"
+                )
+
+    @staticmethod
+    async def load(client, path, requests, concurrency):
+        """Issue `requests` GETs with at most `concurrency` in flight; return the wall time and sorted latencies."""
+        slots = asyncio.Semaphore(concurrency)
+        timings = []
+
+        async def one():
+            async with slots:
+                start = time.perf_counter()
+                response = await client.get(path)
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f"{path} answered {response.status_code}.")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+        return elapsed, sorted(timings)
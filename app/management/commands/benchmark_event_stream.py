@@ -0,0 +1,98 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.events import Broker, event
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many concurrent event stream subscribers one process holds: memory per subscriber, "
+        "and the time to fan events published from another thread out to all of them. Runs the broker "
+        "alone, without the database or HTTP."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--subscribers', default='1000,5000,10000',
+            help="Comma-separated subscriber counts to measure (default 1000,5000,10000).",
+        )
+        parser.add_argument('--projects', type=int, default=1, help="Projects the subscribers are spread over (default 1).")
+        parser.add_argument('--events', type=int, default=100, help="Events published per project (default 100).")
+        parser.add_argument(
+            '--interval', type=float, default=0.001,
+            help="Seconds between two published events; 0 publishes them in one burst (default 0.001).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = [int(count) for count in options['subscribers'].split(',')]
+        except ValueError:
+            raise CommandError("--subscribers must be comma-separated numbers.")
+        if min(counts) < 1 or options['projects'] < 1 or options['events'] < 1 or options['interval'] < 0:
+            raise CommandError("--subscribers, --projects and --events must be positive, --interval not negative.")
+        self.stdout.write(
+            f"{'subscribers':>11} {'KiB/sub':>8} {'events/s':>9} {'deliveries/s':>13} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'overflows':>9}"
+        )
+        for count in counts:
+            asyncio.run(self.benchmark(count, options['projects'], options['events'], options['interval']))
+
+    async def benchmark(self, count, projects, events, interval):
+        broker = Broker(settings.EVENTS_QUEUE_SIZE, count)
+        expected = events * projects
+        received_at = {}
+        done = asyncio.Event()
+        finished = 0
+
+        async def consume(subscription):
+            nonlocal finished
+            seen = 0
+            while seen < events:
+                item = await subscription.get(None)
+                if item is None:
+                    # Overflowed: a stream would replay from the change feed here.
+                    subscription.reset()
+                    break
+                received_at[item['seq']] = time.perf_counter()
+                seen += 1
+            finished += 1
+            if finished == count:
+                done.set()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        subscriptions = [broker.subscribe(index % projects) for index in range(count)]
+        consumers = [asyncio.create_task(consume(subscription)) for subscription in subscriptions]
+        await asyncio.sleep(0)  # let every consumer start waiting on its queue
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / count / 1024
+        tracemalloc.stop()
+
+        sent_at = {}
+
+        def publish():
+            for seq in range(expected):
+                sent_at[seq] = time.perf_counter()
+                broker.publish([event(seq, seq % projects, 'task', seq, False)])
+                if interval:
+                    time.sleep(interval)
+
+        started = time.perf_counter()
+        await asyncio.to_thread(publish)
+        await done.wait()
+        elapsed = time.perf_counter() - started
+        for consumer in consumers:
+            await consumer
+        for subscription in subscriptions:
+            subscription.close()
+
+        latencies = sorted(received_at[seq] - sent_at[seq] for seq in received_at)
+        p50, p99 = (latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0 for q in (0.50, 0.99))
+        stats = broker.stats()
+        self.stdout.write(
+            f"{count:>11} {per_subscriber:>8.2f} {expected / elapsed:>9.0f} {stats['delivered'] / elapsed:>13.0f} "
+            f"{p50:>8.1f} {p99:>8.1f} {stats['overflows']:>9}"
+        )
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.api.rows import row_serializer
+from app.api.serializers import CommentSerializer, ProjectSerializer, TaskSerializer
+from app.models import Comment, Project, Task
+from app.testing import seed_dataset
+
+BENCHMARKS = [
+    ('tasks', TaskSerializer, Task.objects.all()),
+    ('comments', CommentSerializer, Comment.objects.all()),
+    ('projects', ProjectSerializer, Project.objects.select_related('owner')),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare list serialization throughput of the ModelSerializer path with the values()/row encoder "
+        "fast path, and check both produce the same output. Seeds (and rolls back) a dataset when the "
+        "database has no tasks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500, help="Rows serialized per run (default 500, one page max).")
+        parser.add_argument('--repeat', type=int, default=20, help="Runs per path; the best one counts (default 20).")
+
+    def handle(self, *args, **options):
+        if Task.objects.exists():
+            self.run(options['rows'], options['repeat'])
+            return
+        self.stdout.write("No tasks found; benchmarking a temporary seeded dataset.")
+        try:
+            with transaction.atomic():
+                seed_dataset(projects=20, members=5, tasks=options['rows'], comments=1)
+                self.run(options['rows'], options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def run(self, limit, repeat):
+        self.stdout.write(f"{'list':<10} {'rows':>6} {'serializer rows/s':>18} {'fast rows/s':>12} {'speedup':>8}")
+        for name, serializer_class, queryset in BENCHMARKS:
+            queryset = queryset.order_by('created_at', 'id')[:limit]
+            rows = row_serializer(serializer_class)
+
+            def slow():
+                return serializer_class(list(queryset), many=True).data
+
+            def fast():
+                return rows.to_representation(rows.values(queryset))
+
+            if list(slow()) != fast():
+                raise CommandError(f"{name}: the fast path output differs from {serializer_class.__name__}.")
+            count = len(fast())
+            if not count:
+                continue
+            slow_time, fast_time = self.best(slow, repeat), self.best(fast, repeat)
+            self.stdout.write(
+                f"{name:<10} {count:>6} {count / slow_time:>18.0f} {count / fast_time:>12.0f} "
+                f"{slow_time / fast_time:>7.1f}x"
+            )
+
+    @staticmethod
+    def best(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
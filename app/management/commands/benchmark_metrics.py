@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+
+from app.metrics import record, reset_metrics
+from app.models import Task
+from app.testing import seed_dataset
+
+# (name, path); `{project}` and `{task}` are filled in from the dataset.
+ROUTES = [
+    ('task-list', '/api/projects/{project}/tasks/'),
+    ('task-detail', '/api/tasks/{task}/'),
+    ('comment-list', '/api/tasks/{task}/comments/'),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the overhead of the metrics middleware: the cost of recording one request, and the "
+        "per-request latency of real routes with and without the middleware. Seeds (and rolls back) a "
+        "dataset when the database has no tasks. The response cache is disabled while it runs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per route and variant (default 500).")
+        parser.add_argument('--rounds', type=int, default=5, help="Alternating rounds; the best one counts (default 5).")
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['rounds'] < 1:
+            raise CommandError("--requests and --rounds must be positive.")
+        with override_settings(ALLOWED_HOSTS=['*'], RESPONSE_CACHE_ENABLED=False):
+            task = Task.objects.select_related('project__owner').order_by('id').first()
+            if task is not None:
+                self.run(task, options['requests'], options['rounds'])
+                return
+            self.stdout.write("No tasks found; benchmarking a temporary seeded dataset.")
+            try:
+                with transaction.atomic():
+                    seed_dataset(projects=5, members=5, tasks=100, comments=3)
+                    self.run(Task.objects.select_related('project__owner').order_by('id').first(),
+                             options['requests'], options['rounds'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def run(self, task, requests, rounds):
+        calls = 100000
+        start = time.perf_counter()
+        for _ in range(calls):
+            record('/benchmark/', 'GET', 200, 0.01, 3, 0.001, 1000)
+        self.stdout.write(f"record(): {(time.perf_counter() - start) / calls * 1e6:.2f} us per request")
+        reset_metrics()
+
+        without = [name for name in settings.MIDDLEWARE if name != 'app.metrics.MetricsMiddleware']
+        clients = {}
+        for variant, middleware in (('with', settings.MIDDLEWARE), ('without', without)):
+            with override_settings(MIDDLEWARE=middleware):
+                clients[variant] = Client()
+                clients[variant].force_login(task.project.owner)
+                clients[variant].get('/')  # load the middleware chain under this setting
+
+        self.stdout.write(f"{'route':<14} {'with us':>9} {'without us':>11} {'overhead us':>12} {'overhead %':>11}")
+        for name, path in ROUTES:
+            path = path.format(project=task.project_id, task=task.id)
+            best = {'with': float('inf'), 'without': float('inf')}
+            for _ in range(rounds):
+                for variant, client in clients.items():
+                    start = time.perf_counter()
+                    for _ in range(requests):
+                        client.get(path)
+                    best[variant] = min(best[variant], (time.perf_counter() - start) / requests)
+            overhead = best['with'] - best['without']
+            self.stdout.write(
+                f"{name:<14} {best['with'] * 1e6:>9.0f} {best['without'] * 1e6:>11.0f} "
+                f"{overhead * 1e6:>12.0f} {overhead / best['without'] * 100:>10.1f}%"
+            )
+        reset_metrics()
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from app.changes import compact_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete change feed entries superseded by a later entry for the same object. Clients resuming from any "
+        "cursor still receive the latest state of everything changed since."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help="Only this project (may be repeated). Defaults to every project.")
+
+    def handle(self, *args, **options):
+        deleted = compact_changes(options['projects'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} superseded change feed entr{'y' if deleted == 1 else 'ies'}."))
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.importer import READERS, Importer, ImportDataError
+from app.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Import tasks with their comments from an NDJSON or CSV export. Batches are committed one at a time "
+        "and an interrupted import resumes after the last committed batch when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for standard input.")
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help="Input format. Defaults to the file extension.")
+        parser.add_argument('--project', type=int,
+                            help="Import every task into this project instead of the one named by each record.")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Tasks validated and inserted per transaction (default 1000).")
+        parser.add_argument('--skip-invalid', action='store_true',
+                            help="Report and skip invalid tasks and comments instead of stopping.")
+        parser.add_argument('--checkpoint-key',
+                            help="Name of the resume checkpoint. Defaults to the input path and project; "
+                                 "required to resume imports from standard input.")
+        parser.add_argument('--restart', action='store_true',
+                            help="Ignore the checkpoint of a previous unfinished run and start from the beginning.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in READERS:
+            raise CommandError("Cannot tell the input format; pass --format ndjson or --format csv.")
+        project_id = options['project']
+        if project_id is not None and not Project.objects.filter(pk=project_id).exists():
+            raise CommandError(f"Project {project_id} does not exist.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        key = options['checkpoint_key']
+        if key is None and path != '-':
+            key = f'{os.path.abspath(path)}:{project_id or "*"}'
+        importer = Importer(
+            project_id=project_id, batch_size=options['batch_size'], skip_invalid=options['skip_invalid'],
+            on_invalid=lambda position, message: self.stderr.write(f"record {position}: {message}"),
+        )
+        if key and options['restart']:
+            importer.forget_checkpoint(key)
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.perf_counter()
+        tasks = comments = 0
+        try:
+            for position, batch_tasks, batch_comments in importer.run(READERS[fmt](stream), checkpoint_key=key):
+                tasks += batch_tasks
+                comments += batch_comments
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{position} records read, {tasks} tasks and {comments} comments imported "
+                    f"({(tasks + comments) / max(elapsed, 1e-9):.0f} rows/sec)"
+                )
+        except ImportDataError as exc:
+            for position, message in exc.errors:
+                self.stderr.write(f"record {position}: {message}")
+            raise CommandError(
+                f"Import stopped at invalid input after {tasks} tasks and {comments} comments. "
+                "Fix the input (or pass --skip-invalid) and run again to resume."
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {tasks} tasks and {comments} comments in {elapsed:.1f}s "
+            f"({(tasks + comments) / max(elapsed, 1e-9):.0f} rows/sec)."
+        ))
@@ -0,0 +1,242 @@
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.settings import api_settings
+
+from app.models import ProjectMember, Task
+from authentication.api.throttling import LoginIPThrottle
+from authentication.models import MyUser
+
+WORDS = ['api', 'bug', 'cache', 'deploy', 'docs', 'fix', 'login', 'release', 'search', 'test']
+
+# name -> (weight, method, path, body); `{project}` and `{task}` are filled in per request.
+ROUTES = {
+    'project-list': (5, 'GET', '/api/projects/', None),
+    'project-detail': (5, 'GET', '/api/projects/{project}/', None),
+    'project-stats': (5, 'GET', '/api/projects/{project}/stats/', None),
+    'task-list': (20, 'GET', '/api/projects/{project}/tasks/', None),
+    'task-list-filtered': (10, 'GET', '/api/projects/{project}/tasks/?status=In Progress&priority=High', None),
+    'task-detail': (15, 'GET', '/api/tasks/{task}/', None),
+    'comment-list': (10, 'GET', '/api/tasks/{task}/comments/', None),
+    'member-list': (5, 'GET', '/api/projects/{project}/members/', None),
+    'project-search': (5, 'GET', '/api/projects/{project}/search/?q={word}', None),
+    'project-changes': (5, 'GET', '/api/projects/{project}/changes/?since=0', None),
+    'task-update': (10, 'PATCH', '/api/tasks/{task}/', lambda rng: {'priority': rng.choice(['Low', 'Medium', 'High'])}),
+    'comment-create': (5, 'POST', '/api/tasks/{task}/comments/', lambda rng: {'content': ' '.join(rng.choices(WORDS, k=8))}),
+}
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)] if sorted_values else None
+
+
+class Session:
+    """One logged-in user: its JWTs and the projects and tasks it can reach."""
+
+    def __init__(self, base_url, username, password, projects):
+        self.base_url = base_url
+        self.projects = projects  # {project id: [task ids]}
+        self.lock = threading.Lock()
+        tokens = self.post('/api/users/login/', {'username': username, 'password': password})['tokens']
+        self.access, self.refresh = tokens['access'], tokens['refresh']
+
+    def post(self, path, body):
+        status, content, headers = self.request('POST', path, body, authenticate=False)
+        while status == 429 and headers.get('Retry-After', '').isdigit():
+            # Every session logs in from this machine, so the login-ip throttle
+            # paces the logins of a large --users; wait for it instead of failing.
+            time.sleep(int(headers['Retry-After']))
+            status, content, headers = self.request('POST', path, body, authenticate=False)
+        if status != 200:
+            raise CommandError(f"POST {path} answered {status}: {content[:200]!r}")
+        return json.loads(content)
+
+    def request(self, method, path, body=None, authenticate=True):
+        request = urllib.request.Request(
+            self.base_url + path.replace(' ', '%20'), method=method,
+            data=json.dumps(body).encode() if body is not None else None,
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'},
+        )
+        if authenticate:
+            request.add_header('Authorization', f'Bearer {self.access}')
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read(), exc.headers
+
+    def call(self, method, path, body):
+        status, content, _ = self.request(method, path, body)
+        if status == 401:
+            # The access token expired during the run.
+            with self.lock:
+                self.access = self.post('/api/users/token-refresh/', {'refresh': self.refresh})['access']
+            status, content, _ = self.request(method, path, body)
+        return status, content
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a weighted mix of the API's routes concurrently against a running server, logged in through "
+        "/api/users/login/ as users generated by seed_bench, and report throughput and p50/p95/p99 latency "
+        "per route as JSON. Projects and tasks to request are picked from the server's database, so run it "
+        "with the same settings as the server. The mix includes writes unless --read-only is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Server to load (default http://127.0.0.1:8000).")
+        parser.add_argument('--users', type=int, default=10, help="Users to log in as and spread the load over (default 10).")
+        parser.add_argument('--prefix', default='bench', help="Prefix of the seed_bench users (default bench).")
+        parser.add_argument('--password', default='bench-pass', help="Password of the seed_bench users.")
+        parser.add_argument('--concurrency', type=int, default=16, help="Requests in flight at once (default 16).")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run (default 30).")
+        parser.add_argument('--requests', type=int, help="Stop after this many requests instead of --duration.")
+        parser.add_argument('--mix', help="Route weights as name=weight,...; routes left out are not requested. "
+                                          f"Routes: {', '.join(ROUTES)}.")
+        parser.add_argument('--read-only', action='store_true', help="Leave out the routes that write.")
+        parser.add_argument('--output', help="Write the JSON report to this file as well as standard output.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed (default 0).")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--users and --concurrency must be positive.")
+        if options['requests'] is None and options['duration'] <= 0:
+            raise CommandError("--duration must be positive.")
+        weights = self.parse_mix(options['mix'], options['read_only'])
+        rng = random.Random(options['seed'])
+        base_url = options['url'].rstrip('/')
+
+        usernames = self.usernames(options['prefix'], options['users'])
+        logins, period = LoginIPThrottle().parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get('login-ip'))
+        if logins is not None and len(usernames) > logins:
+            self.stderr.write(
+                f"Logging in {len(usernames)} users from one address exceeds the login-ip throttle of "
+                f"{logins} per {period}s; logins will wait for it (raise THROTTLE_LOGIN_IP to start faster)."
+            )
+        sessions = []
+        for username in usernames:
+            sessions.append(Session(base_url, username, options['password'], self.reachable(username, rng)))
+        self.stderr.write(f"Logged in {len(sessions)} users; loading {base_url} with {options['concurrency']} workers.")
+
+        names, route_weights = list(weights), list(weights.values())
+        timings = {name: [] for name in names}
+        statuses = {name: {} for name in names}
+        lock = threading.Lock()
+        issued = 0
+        deadline = time.perf_counter() + options['duration'] if options['requests'] is None else None
+
+        def take():
+            nonlocal issued
+            with lock:
+                if options['requests'] is not None and issued >= options['requests']:
+                    return False
+                issued += 1
+                return True
+
+        def worker(index):
+            worker_rng = random.Random(options['seed'] * 1000 + index)
+            session = sessions[index % len(sessions)]
+            while (deadline is None or time.perf_counter() < deadline) and take():
+                name = worker_rng.choices(names, route_weights)[0]
+                _, method, path, body = ROUTES[name]
+                project = worker_rng.choice(list(session.projects))
+                task = worker_rng.choice(session.projects[project]) if session.projects[project] else 0
+                path = path.format(project=project, task=task, word=worker_rng.choice(WORDS))
+                start = time.perf_counter()
+                status, _ = session.call(method, path, body(worker_rng) if body else None)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    timings[name].append(elapsed)
+                    statuses[name][status] = statuses[name].get(status, 0) + 1
+
+        started_at = timezone.now()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for future in [pool.submit(worker, index) for index in range(options['concurrency'])]:
+                future.result()
+        elapsed = time.perf_counter() - start
+
+        report = self.report(options, started_at, elapsed, timings, statuses)
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as out:
+                out.write(output + '\n')
+        self.stdout.write(output)
+
+    @staticmethod
+    def parse_mix(mix, read_only):
+        if mix is None:
+            weights = {name: weight for name, (weight, *_) in ROUTES.items()}
+        else:
+            weights = {}
+            for item in mix.split(','):
+                name, _, weight = item.partition('=')
+                if name.strip() not in ROUTES or not weight.strip().isdigit():
+                    raise CommandError(f"Bad --mix item {item!r}; expected name=weight with a route from {', '.join(ROUTES)}.")
+                weights[name.strip()] = int(weight)
+        if read_only:
+            weights = {name: weight for name, weight in weights.items() if ROUTES[name][1] == 'GET'}
+        weights = {name: weight for name, weight in weights.items() if weight > 0}
+        if not weights:
+            raise CommandError("The route mix is empty.")
+        return weights
+
+    @staticmethod
+    def usernames(prefix, count):
+        usernames = list(
+            MyUser.objects.filter(username__startswith=f'{prefix}-user', projectmember__isnull=False)
+            .distinct().order_by('id').values_list('username', flat=True)[:count]
+        )
+        if not usernames:
+            raise CommandError(f"No {prefix}-user<n> users with projects; run seed_bench first.")
+        return usernames
+
+    @staticmethod
+    def reachable(username, rng, projects=5, tasks=50):
+        """A sample of the user's projects, each with a sample of its task ids."""
+        project_ids = list(ProjectMember.objects.filter(user__username=username).values_list('project_id', flat=True))
+        reachable = {}
+        for project_id in rng.sample(project_ids, min(projects, len(project_ids))):
+            reachable[project_id] = list(
+                Task.objects.filter(project_id=project_id).order_by('-created_at').values_list('id', flat=True)[:tasks]
+            )
+        return reachable
+
+    @staticmethod
+    def report(options, started_at, elapsed, timings, statuses):
+        routes = {}
+        for name, values in timings.items():
+            values.sort()
+            errors = sum(count for status, count in statuses[name].items() if status >= 400)
+            routes[name] = {
+                'requests': len(values),
+                'errors': errors,
+                'throughput_rps': round(len(values) / elapsed, 2),
+                **{f'{label}_ms': round(value * 1000, 2) if value is not None else None
+                   for label, value in (('p50', percentile(values, 0.50)), ('p95', percentile(values, 0.95)),
+                                        ('p99', percentile(values, 0.99)), ('max', values[-1] if values else None))},
+                'statuses': {str(status): count for status, count in sorted(statuses[name].items())},
+            }
+        everything = sorted(value for values in timings.values() for value in values)
+        return {
+            'url': options['url'],
+            'started_at': started_at.isoformat(),
+            'duration_s': round(elapsed, 3),
+            'users': options['users'],
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'requests': len(everything),
+            'errors': sum(route['errors'] for route in routes.values()),
+            'throughput_rps': round(len(everything) / elapsed, 2),
+            'p50_ms': round(percentile(everything, 0.50) * 1000, 2) if everything else None,
+            'p95_ms': round(percentile(everything, 0.95) * 1000, 2) if everything else None,
+            'p99_ms': round(percentile(everything, 0.99) * 1000, 2) if everything else None,
+            'routes': routes,
+        }
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.deletion import purge_deleted
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete soft-deleted projects and tasks for good, with their comments, memberships, counters and change "
+        "feed, in batches of short transactions. Safe to interrupt: the next run carries on where this one stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows deleted per transaction (default 1000).")
+        parser.add_argument('--pause', type=float, default=0,
+                            help="Seconds to sleep between batches, to leave room for other writers (default 0).")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if options['pause'] < 0:
+            raise CommandError("--pause must not be negative.")
+
+        def progress(label, rows):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Deleted {rows} {label}.")
+
+        purged = purge_deleted(options['batch_size'], options['pause'], progress)
+        summary = ', '.join(f"{rows} {label}" for label, rows in purged.items())
+        self.stdout.write(self.style.SUCCESS(f"Purged {summary}."))
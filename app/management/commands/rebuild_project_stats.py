@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.stats import diff_counters, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-project task and comment counters from scratch and verify them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help="Only this project (may be repeated). Defaults to every project.")
+        parser.add_argument('--check', action='store_true',
+                            help="Only compare the stored counters with a fresh count; do not write.")
+
+    def handle(self, *args, **options):
+        projects = options['projects']
+        if not options['check']:
+            computed = rebuild_counters(projects)
+            self.stdout.write(f"Rebuilt counters for {len(computed)} project(s).")
+
+        mismatches = diff_counters(projects)
+        for project_id, name, stored, actual in mismatches:
+            self.stderr.write(f"project {project_id}: {name} is {stored}, expected {actual}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} counter(s) out of date.")
+        self.stdout.write(self.style.SUCCESS("Counters verified."))
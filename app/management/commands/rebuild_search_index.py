@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of tasks and comments from scratch."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', dest='projects',
+                            help="Only this project (may be repeated). Defaults to every project.")
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError("Full-text search needs the SQLite database backend.")
+        indexed = rebuild_search_index(options['projects'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} task(s) and comment(s)."))
@@ -0,0 +1,182 @@
+import datetime
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.api.response_cache import bump_project_version
+from app.changes import record_contents
+from app.models import Comment, Project, ProjectMember, Task
+from app.signals import bulk_saved
+from app.stats import rebuild_counters
+from authentication.models import MyUser
+
+WORDS = (
+    'api backend bug build cache client deploy design docs endpoint error feature fix frontend index login '
+    'merge metrics migration mobile monitor page payment performance query release report review schema '
+    'search security server signup sprint sync test timeout ui update upload user webhook'
+).split()
+STATUSES = [choice for choice, _ in Task.status_choice]
+PRIORITIES = [choice for choice, _ in Task.priority_choice]
+TASK_COLUMNS = ['title', 'description', 'status', 'priority', 'assigned_to_id', 'project_id', 'created_at', 'updated_at']
+COMMENT_COLUMNS = ['content', 'user_id', 'task_id', 'created_at', 'updated_at']
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset for benchmarks and load tests: users, projects with memberships, tasks "
+        "and comments, written with batched inserts in short transactions. Counters, the change feed "
+        "and the search index are brought up to date. Every user can log in as <prefix>-user<n> with "
+        "--password. The same --seed generates the same dataset."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Users to create (default 1000).")
+        parser.add_argument('--projects', type=int, default=100, help="Projects to create (default 100).")
+        parser.add_argument('--members', type=int, default=10,
+                            help="Members per project, its owner included (default 10).")
+        parser.add_argument('--tasks', type=int, default=1000, help="Tasks per project (default 1000).")
+        parser.add_argument('--comments', type=int, default=3, help="Comments per task (default 3).")
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help="Rows inserted per transaction (default 5000).")
+        parser.add_argument('--prefix', default='bench', help="Prefix of the generated user and project names.")
+        parser.add_argument('--password', default='bench-pass', help="Password of every generated user.")
+        parser.add_argument('--days', type=int, default=365,
+                            help="Tasks and comments are dated over this many past days (default 365).")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed (default 0).")
+
+    def handle(self, *args, **options):
+        for name in ('users', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        for name in ('projects', 'tasks', 'comments', 'days'):
+            if options[name] < 0:
+                raise CommandError(f"--{name} must not be negative.")
+        if not 1 <= options['members'] <= options['users']:
+            raise CommandError("--members must be between 1 and --users.")
+        prefix = options['prefix']
+        if MyUser.objects.filter(username__startswith=f'{prefix}-user').exists():
+            raise CommandError(f"Users named {prefix}-user<n> already exist; pass another --prefix.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.now = timezone.now()
+        self.adapt = connection.ops.adapt_datetimefield_value
+        self.started = time.perf_counter()
+        self.rows = 0
+
+        user_ids = self.create_users(prefix, options['users'], make_password(options['password']))
+        tasks_per_project = max(options['tasks'] * (1 + options['comments']), 1)
+        projects_per_batch = max(self.batch_size // tasks_per_project, 1)
+        for start in range(0, options['projects'], projects_per_batch):
+            stop = min(start + projects_per_batch, options['projects'])
+            teams = self.create_projects(prefix, range(start, stop), user_ids, options['members'])
+            self.create_tasks(teams, options['tasks'], options['comments'])
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {self.rows} rows in {elapsed:.1f}s ({self.rows / max(elapsed, 1e-9):.0f} rows/sec). "
+            f"Log in as {prefix}-user0 .. {prefix}-user{options['users'] - 1} with password {options['password']!r}."
+        ))
+
+    def progress(self, rows, what):
+        self.rows += rows
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(f"{self.rows} rows written, last batch {rows} {what} ({self.rows / max(elapsed, 1e-9):.0f} rows/sec)")
+
+    def sentence(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def create_users(self, prefix, count, password):
+        user_ids = []
+        for start in range(0, count, self.batch_size):
+            # Every user shares one password hash: hashing a million passwords is not what we measure.
+            users = [
+                MyUser(username=f'{prefix}-user{i}', email=f'{prefix}-user{i}@example.com', password=password,
+                       first_name='Bench', last_name=f'User {i}')
+                for i in range(start, min(start + self.batch_size, count))
+            ]
+            with transaction.atomic():
+                MyUser.objects.bulk_create(users)
+            user_ids.extend(user.pk for user in users)
+            self.progress(len(users), 'users')
+        return user_ids
+
+    def create_projects(self, prefix, numbers, user_ids, members):
+        """Create projects `numbers` with their memberships; return {project: member user ids}."""
+        projects = [
+            Project(name=f'{prefix} project {i}', description=self.sentence(5, 20), owner_id=user_ids[i % len(user_ids)])
+            for i in numbers
+        ]
+        teams = {}
+        memberships = []
+        with transaction.atomic():
+            Project.objects.bulk_create(projects)
+            for project in projects:
+                others = [user for user in self.rng.sample(user_ids, members) if user != project.owner_id]
+                teams[project] = [project.owner_id, *others[:members - 1]]
+                memberships.append(ProjectMember(project=project, user_id=project.owner_id, role='Admin'))
+                memberships += [ProjectMember(project=project, user_id=user, role='Member') for user in teams[project][1:]]
+            ProjectMember.objects.bulk_create(memberships, batch_size=self.batch_size)
+            bulk_saved.send(sender=ProjectMember, instances=memberships, created=True)
+        self.progress(len(projects) + len(memberships), 'projects and members')
+        return teams
+
+    def timestamps(self):
+        created = self.now - datetime.timedelta(seconds=self.rng.uniform(0, self.days * 86400))
+        updated = created + (self.now - created) * self.rng.random() ** 4
+        return self.adapt(created), self.adapt(updated)
+
+    def timestamps_after(self, created_at):
+        created = created_at + (self.now - created_at) * self.rng.random() ** 2
+        return self.adapt(created), self.adapt(created)
+
+    def create_tasks(self, teams, tasks_per_project, comments_per_task):
+        """
+        Insert the tasks and comments of `teams`' projects with plain batched
+        INSERTs, then bring the counters and change feed of those projects up
+        to date; going through models costs ten times as much per row.
+        """
+        for project, team in teams.items():
+            rows = (
+                (
+                    self.sentence(2, 6).capitalize(), self.sentence(10, 40), self.rng.choice(STATUSES),
+                    self.rng.choice(PRIORITIES),
+                    # Roughly one task in ten is unassigned.
+                    self.rng.choice(team) if self.rng.random() > 0.1 else None,
+                    project.pk, *self.timestamps(),
+                )
+                for _ in range(tasks_per_project)
+            )
+            self.insert(Task, TASK_COLUMNS, rows, 'tasks')
+            if comments_per_task:
+                tasks = Task.objects.filter(project=project).order_by('id').values_list('id', 'created_at')
+                rows = (
+                    (self.sentence(3, 30), self.rng.choice(team), task_id, *self.timestamps_after(created_at))
+                    for task_id, created_at in tasks.iterator(chunk_size=self.batch_size)
+                    for _ in range(comments_per_task)
+                )
+                self.insert(Comment, COMMENT_COLUMNS, rows, 'comments')
+
+        project_ids = [project.pk for project in teams]
+        with transaction.atomic():
+            rebuild_counters(project_ids)
+            record_contents(project_ids)
+        for project_id in project_ids:
+            bump_project_version(project_id)
+
+    def insert(self, model, columns, rows, what):
+        sql = (
+            f'INSERT INTO {model._meta.db_table} ({", ".join(columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})'
+        )
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+            self.progress(len(batch), what)
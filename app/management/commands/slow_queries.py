@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.slow_queries import aggregate_slow_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate the slow-query log written to SLOW_QUERY_LOG_FILE by every process, grouped by normalized "
+        "SQL and call site, worst total time first. A running process's own ring buffer is served at "
+        "/api/slow-queries/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.SLOW_QUERY_LOG_FILE,
+                            help="JSON lines log to read (default SLOW_QUERY_LOG_FILE).")
+        parser.add_argument('--limit', type=int, default=20, help="Offenders to show (default 20).")
+        parser.add_argument('--json', action='store_true', help="Print the offenders as JSON.")
+
+    def handle(self, *args, **options):
+        if not options['file']:
+            raise CommandError("Set SLOW_QUERY_LOG_FILE or pass --file.")
+        try:
+            with open(options['file']) as log:
+                entries = [json.loads(line) for line in log if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"{options['file']} does not exist; no slow query has been logged yet.")
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"{options['file']} is not a JSON lines slow-query log: {exc}")
+
+        offenders = aggregate_slow_queries(entries, options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps(offenders, indent=2))
+            return
+        if not offenders:
+            self.stdout.write("No slow queries logged.")
+            return
+        for rank, offender in enumerate(offenders, 1):
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"#{rank}  {offender['count']} x, total {offender['total_ms']:.1f} ms, "
+                f"mean {offender['mean_ms']:.1f} ms, max {offender['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"  at   {offender['call_site'] or 'unknown'}")
+            self.stdout.write(f"  sql  {offender['sql']}")
+            for detail in offender['plan']:
+                self.stdout.write(f"  plan {detail}")
+            if offender['full_scans']:
+                self.stdout.write(self.style.WARNING(f"  full scans: {', '.join(offender['full_scans'])}"))
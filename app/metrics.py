@@ -0,0 +1,263 @@
+"""
+Per-route request metrics, exposed in the Prometheus text format at `/metrics`.
+
+`MetricsMiddleware` records, for every request, under the URL pattern that
+served it (`unmatched` for requests no pattern resolved):
+
+    app_http_requests_total                    requests per status code
+    app_http_request_duration_seconds          latency histogram
+    app_http_response_size_bytes               response body size histogram
+    app_http_request_db_queries                queries per request histogram
+    app_http_request_db_seconds_total          time spent in the database
+
+The latency of a streaming response is the time until its headers, and its
+size is not recorded. Queries are counted by a wrapper installed on every
+database connection, which only does work while a request is being measured.
+
+Requests are aggregated in process, into fixed histogram buckets under one
+lock, so recording one costs a few microseconds and memory does not grow with
+traffic. Each process exposes its own counters; Prometheus sums them across
+workers. The counters of the response cache, login throttles, password
+hashing pool and event broker of the process are exported alongside.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+UNMATCHED = 'unmatched'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Tally:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_tally = contextvars.ContextVar('request_db_tally', default=None)
+
+
+def _time_query(execute, sql, params, many, context):
+    tally = _tally.get()
+    if tally is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tally.db_time += time.perf_counter() - start
+        tally.queries += 1
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Fires again whenever the same connection object reconnects.
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        # Buckets are upper bounds, inclusive, as in Prometheus; the last one is +Inf.
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def copy(self):
+        histogram = Histogram(self.bounds)
+        histogram.counts, histogram.sum = list(self.counts), self.sum
+        return histogram
+
+
+class RouteMetrics:
+    __slots__ = ('statuses', 'duration', 'size', 'queries', 'db_seconds')
+
+    def __init__(self):
+        self.statuses = {}
+        self.duration = Histogram(settings.METRICS_LATENCY_BUCKETS)
+        self.size = Histogram(settings.METRICS_SIZE_BUCKETS)
+        self.queries = Histogram(settings.METRICS_QUERY_BUCKETS)
+        self.db_seconds = 0.0
+
+
+_lock = threading.Lock()
+_routes = {}
+
+
+def record(route, method, status, duration, queries, db_time, size=None):
+    with _lock:
+        metrics = _routes.get((route, method))
+        if metrics is None:
+            metrics = _routes[(route, method)] = RouteMetrics()
+        metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+        metrics.duration.observe(duration)
+        metrics.queries.observe(queries)
+        metrics.db_seconds += db_time
+        if size is not None:
+            metrics.size.observe(size)
+
+
+def reset_metrics():
+    with _lock:
+        _routes.clear()
+
+
+def _route_of(request):
+    match = request.resolver_match
+    # Router patterns are regular expressions; drop their end anchor.
+    return '/' + match.route.rstrip('$') if match is not None else UNMATCHED
+
+
+class MetricsMiddleware:
+    """Records the metrics of every request; place it first so it measures the whole stack."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tally = _Tally()
+        token = _tally.set(tally)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _tally.reset(token)
+        self.record(request, response, time.perf_counter() - start, tally)
+        return response
+
+    async def __acall__(self, request):
+        tally = _Tally()
+        token = _tally.set(tally)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _tally.reset(token)
+        self.record(request, response, time.perf_counter() - start, tally)
+        return response
+
+    @staticmethod
+    def record(request, response, duration, tally):
+        size = None if response.streaming else len(response.content)
+        record(_route_of(request), request.method, response.status_code, duration, tally.queries, tally.db_time, size)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _histogram_lines(name, histogram, labels):
+    cumulative = 0
+    for bound, count in zip([*histogram.bounds, '+Inf'], histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{_labels(**labels, le=bound)} {cumulative}'
+    yield f'{name}_sum{_labels(**labels)} {histogram.sum}'
+    yield f'{name}_count{_labels(**labels)} {cumulative}'
+
+
+def _family(name, kind, help_text, samples):
+    yield f'# HELP {name} {help_text}'
+    yield f'# TYPE {name} {kind}'
+    yield from samples
+
+
+def _process_samples():
+    # Imported here: these modules load DRF settings and models.
+    from app.api.response_cache import response_cache_stats
+    from app.events import event_backend
+    from authentication.api.throttling import throttle_stats
+    from authentication.hashing import password_hash_pool
+
+    cache = response_cache_stats()
+    yield from _family(
+        'app_response_cache_total', 'counter', 'Response cache lookups by result.',
+        (f'app_response_cache_total{_labels(result=result)} {count}' for result, count in sorted(cache.items())),
+    )
+    yield from _family(
+        'app_throttled_total', 'counter', 'Requests rejected by a throttle, per scope.',
+        (f'app_throttled_total{_labels(scope=scope)} {count}' for scope, count in sorted(throttle_stats().items())),
+    )
+    pool = password_hash_pool().stats()
+    yield from _family(
+        'app_password_hash_pool', 'gauge', 'Password hashing pool state and totals.',
+        (f'app_password_hash_pool{_labels(stat=stat)} {value}' for stat, value in sorted(pool.items())),
+    )
+    broker = event_backend().broker.stats()
+    yield from _family(
+        'app_event_streams', 'gauge', 'Open event streams.', [f'app_event_streams {broker.pop("subscribers")}'],
+    )
+    yield from _family(
+        'app_events_total', 'counter', 'Live events by outcome.',
+        (f'app_events_total{_labels(outcome=outcome)} {count}' for outcome, count in sorted(broker.items())),
+    )
+
+
+def render_metrics():
+    """The metrics of this process in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = [
+            (route, method, dict(metrics.statuses), metrics.db_seconds,
+             metrics.duration.copy(), metrics.size.copy(), metrics.queries.copy())
+            for (route, method), metrics in sorted(_routes.items())
+        ]
+
+    def histograms(name, index):
+        for route, method, *values in snapshot:
+            yield from _histogram_lines(name, values[index], {'route': route, 'method': method})
+
+    lines = [
+        *_family(
+            'app_http_requests_total', 'counter', 'Requests by route, method and status code.',
+            (f'app_http_requests_total{_labels(route=route, method=method, status=code)} {count}'
+             for route, method, statuses, *_ in snapshot for code, count in sorted(statuses.items())),
+        ),
+        *_family('app_http_request_duration_seconds', 'histogram', 'Time to respond, until the headers of a streaming response.',
+                 histograms('app_http_request_duration_seconds', 2)),
+        *_family('app_http_response_size_bytes', 'histogram', 'Response body size, streaming responses excluded.',
+                 histograms('app_http_response_size_bytes', 3)),
+        *_family('app_http_request_db_queries', 'histogram', 'Database queries per request.',
+                 histograms('app_http_request_db_queries', 4)),
+        *_family(
+            'app_http_request_db_seconds_total', 'counter', 'Time spent in database queries.',
+            (f'app_http_request_db_seconds_total{_labels(route=route, method=method)} {db_seconds}'
+             for route, method, _, db_seconds, *_ in snapshot),
+        ),
+        *_process_samples(),
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Serve `render_metrics()`; requires `Authorization: Bearer <METRICS_TOKEN>` when a token is configured."""
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['task', 'created_at'], name='comment_task_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['created_at'], name='project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectmember',
+            index=models.Index(fields=['project', 'created_at'], name='member_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'created_at'], name='task_project_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'updated_at'], name='task_project_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'priority'], name='task_project_status_prio_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='projectmember',
+            constraint=models.UniqueConstraint(fields=('project', 'user'), name='unique_project_member'),
+        ),
+    ]
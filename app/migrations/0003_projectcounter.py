@@ -0,0 +1,45 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('app', 'Task')
+    Comment = apps.get_model('app', 'Comment')
+    ProjectCounter = apps.get_model('app', 'ProjectCounter')
+    counters = {}
+    for row in Task.objects.values('project_id', 'status', 'priority').annotate(n=Count('id')).order_by():
+        for name in ('tasks', f"status:{row['status']}", f"priority:{row['priority']}"):
+            key = (row['project_id'], name)
+            counters[key] = counters.get(key, 0) + row['n']
+    for row in Comment.objects.values('task__project_id').annotate(n=Count('id')).order_by():
+        counters[(row['task__project_id'], 'comments')] = row['n']
+    ProjectCounter.objects.bulk_create([
+        ProjectCounter(project_id=project_id, name=name, value=value)
+        for (project_id, name), value in counters.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64)),
+                ('value', models.BigIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counters', to='app.project')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('project', 'name'), name='unique_project_counter')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 08:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_projectcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['updated_at'], name='project_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,111 @@
+from django.db import migrations
+
+# FTS5 index over task titles/descriptions and comment content, kept in sync
+# by triggers so that bulk inserts, queryset updates and cascading deletes are
+# indexed as well. Tasks are stored under rowid 2 * id and comments under
+# 2 * id + 1; `scope` holds "p<project id>" so a search can be restricted to a
+# project inside the MATCH expression.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE app_search USING fts5(
+        title, body, scope, task_id UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER app_search_task_insert AFTER INSERT ON app_task BEGIN
+        INSERT INTO app_search (rowid, title, body, scope, task_id)
+        VALUES (new.id * 2, new.title, new.description, 'p' || new.project_id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_task_update AFTER UPDATE OF title, description, project_id ON app_task
+    WHEN old.title IS NOT new.title OR old.description IS NOT new.description OR old.project_id IS NOT new.project_id
+    BEGIN
+        DELETE FROM app_search WHERE rowid = old.id * 2;
+        INSERT INTO app_search (rowid, title, body, scope, task_id)
+        VALUES (new.id * 2, new.title, new.description, 'p' || new.project_id, new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_task_move AFTER UPDATE OF project_id ON app_task
+    WHEN old.project_id IS NOT new.project_id
+    BEGIN
+        UPDATE app_search SET scope = 'p' || new.project_id
+        WHERE rowid IN (SELECT id * 2 + 1 FROM app_comment WHERE task_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_task_delete AFTER DELETE ON app_task BEGIN
+        DELETE FROM app_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_comment_insert AFTER INSERT ON app_comment BEGIN
+        INSERT INTO app_search (rowid, title, body, scope, task_id)
+        SELECT new.id * 2 + 1, '', new.content, 'p' || project_id, new.task_id FROM app_task WHERE id = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_comment_update AFTER UPDATE OF content, task_id ON app_comment
+    WHEN old.content IS NOT new.content OR old.task_id IS NOT new.task_id
+    BEGIN
+        DELETE FROM app_search WHERE rowid = old.id * 2 + 1;
+        INSERT INTO app_search (rowid, title, body, scope, task_id)
+        SELECT new.id * 2 + 1, '', new.content, 'p' || project_id, new.task_id FROM app_task WHERE id = new.task_id;
+    END
+    """,
+    """
+    CREATE TRIGGER app_search_comment_delete AFTER DELETE ON app_comment BEGIN
+        DELETE FROM app_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+POPULATE_SQL = [
+    """
+    INSERT INTO app_search (rowid, title, body, scope, task_id)
+    SELECT id * 2, title, description, 'p' || project_id, id FROM app_task
+    """,
+    """
+    INSERT INTO app_search (rowid, title, body, scope, task_id)
+    SELECT c.id * 2 + 1, '', c.content, 'p' || t.project_id, c.task_id
+    FROM app_comment c JOIN app_task t ON t.id = c.task_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS app_search_task_insert',
+    'DROP TRIGGER IF EXISTS app_search_task_update',
+    'DROP TRIGGER IF EXISTS app_search_task_move',
+    'DROP TRIGGER IF EXISTS app_search_task_delete',
+    'DROP TRIGGER IF EXISTS app_search_comment_insert',
+    'DROP TRIGGER IF EXISTS app_search_comment_update',
+    'DROP TRIGGER IF EXISTS app_search_comment_delete',
+    'DROP TABLE IF EXISTS app_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL + POPULATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_importcheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
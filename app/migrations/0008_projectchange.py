@@ -0,0 +1,53 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Seed the change feed with one entry per existing membership, task and
+# comment, in the order they were last updated, so a client syncing from
+# cursor 0 receives the whole project.
+POPULATE_SQL = [
+    """
+    INSERT INTO app_projectchange (project_id, kind, object_id, deleted, created_at)
+    SELECT project_id, 'member', id, %s, updated_at FROM app_projectmember ORDER BY updated_at, id
+    """,
+    """
+    INSERT INTO app_projectchange (project_id, kind, object_id, deleted, created_at)
+    SELECT project_id, 'task', id, %s, updated_at FROM app_task ORDER BY updated_at, id
+    """,
+    """
+    INSERT INTO app_projectchange (project_id, kind, object_id, deleted, created_at)
+    SELECT t.project_id, 'comment', c.id, %s, c.updated_at
+    FROM app_comment c JOIN app_task t ON t.id = c.task_id ORDER BY c.updated_at, c.id
+    """,
+]
+
+
+def populate_changes(apps, schema_editor):
+    for sql in POPULATE_SQL:
+        schema_editor.execute(sql, [False])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_task_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('task', 'Task'), ('comment', 'Comment'), ('member', 'Member')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'id'], name='change_project_seq_idx'), models.Index(fields=['project', 'kind', 'object_id'], name='change_project_object_idx')],
+            },
+        ),
+        migrations.RunPython(populate_changes, migrations.RunPython.noop),
+    ]
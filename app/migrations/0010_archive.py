@@ -0,0 +1,91 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# The rows behind `TaskWithArchived`: active tasks, then archived tasks. SQLite
+# only flattens the view into a merge of two index scans when neither half has
+# a WHERE clause or a bare NULL column, hence no soft-delete filter here and
+# the typed NULL; `archived_at` of an active task is its (null) `deleted_at`
+# once the manager has left out soft-deleted tasks.
+CREATE_VIEW_SQL = """
+    CREATE VIEW app_task_with_archived AS
+    SELECT id, title, description, status, priority, assigned_to_id, project_id, created_at, updated_at,
+           deleted_at, deleted_at AS archived_at
+    FROM app_task
+    UNION ALL
+    SELECT id, title, description, status, priority, assigned_to_id, project_id, created_at, updated_at,
+           CAST(NULL AS datetime), archived_at
+    FROM app_archivedtask
+"""
+
+DROP_VIEW_SQL = 'DROP VIEW IF EXISTS app_task_with_archived'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskWithArchived',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('To Do', 'To Do'), ('In Progress', 'In Progress'), ('Done', 'Done')], max_length=50)),
+                ('priority', models.CharField(choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField(null=True)),
+                ('archived_at', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'app_task_with_archived',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField()),
+                ('status', models.CharField(choices=[('To Do', 'To Do'), ('In Progress', 'In Progress'), ('Done', 'Done')], max_length=50)),
+                ('priority', models.CharField(choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High')], max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField()),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.archivedtask')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['project', 'created_at'], name='archived_task_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['project', 'updated_at'], name='archived_task_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedcomment',
+            index=models.Index(fields=['task', 'created_at'], name='archived_comment_created_idx'),
+        ),
+        migrations.RunSQL(CREATE_VIEW_SQL, DROP_VIEW_SQL),
+    ]
@@ -1,28 +1,122 @@
-from django.db import models
+from django.db import models, router, transaction
 
 from authentication.models import MyUser
 
 
+class LoadedValuesMixin:
+    """
+    Remembers the values of `tracked_fields` as they were last read from or
+    written to the database, so signal handlers can tell what a save changed.
+
+    Saving an existing row first re-reads them from the row about to be
+    overwritten; combined with `AtomicSaveMixin` that read and the UPDATE
+    share a transaction. A concurrent save between loading this instance and
+    saving it therefore cannot make the handlers undo the same old values
+    twice.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_loaded_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not self._state.adding:
+            self.reload_loaded_values(kwargs.get('using'))
+        super().save(*args, **kwargs)
+        self.remember_loaded_values()
+
+    def reload_loaded_values(self, using=None):
+        using = using or router.db_for_write(type(self), instance=self)
+        row = (
+            type(self)._base_manager.using(using).select_for_update()
+            .filter(pk=self.pk).values(*self.tracked_fields).first()
+        )
+        if row is not None:
+            self._loaded_values = row
+
+    def remember_loaded_values(self):
+        self._loaded_values = {
+            name: getattr(self, name) for name in self.tracked_fields if name in self.__dict__
+        }
+
+    def loaded_value(self, name):
+        """Return `name` as last read from the database, or None for new rows."""
+        return getattr(self, '_loaded_values', {}).get(name)
+
+
+class AtomicSaveMixin:
+    """
+    Saves inside a transaction so that rows written by `post_save` handlers,
+    such as the project counters, commit or roll back together with the row.
+    """
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class ActiveManager(models.Manager):
+    """
+    Hides soft-deleted rows: those with one of the `deleted_lookups` set.
+    They stay in the table until `manage.py purge_deleted` removes them (see
+    `app.deletion`).
+    """
+    deleted_lookups = ('deleted_at',)
+
+    def get_queryset(self):
+        return super().get_queryset().filter(**{f'{lookup}__isnull': True for lookup in self.deleted_lookups})
+
+
+class ActiveCommentManager(ActiveManager):
+    """Hides the comments of soft-deleted tasks along with them."""
+    deleted_lookups = ('task__deleted_at',)
+
+
 class Project(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
     owner = models.ForeignKey(MyUser, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='project_created_idx'),
+            # Partial, like every query of live projects, so it covers the list's count and last update.
+            models.Index(fields=['updated_at'], condition=models.Q(deleted_at__isnull=True), name='project_updated_idx'),
+            # Partial: holds only the soft-deleted rows awaiting purge.
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False), name='project_deleted_idx'),
+        ]
 
 
-class ProjectMember(models.Model):
+class ProjectMember(AtomicSaveMixin, LoadedValuesMixin, models.Model):
     role_choice = [
         ('Admin', 'Admin'),
         ('Member', 'Member'),
         ]
+    tracked_fields = ('project_id', 'user_id')
+
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     user = models.ForeignKey(MyUser, on_delete=models.CASCADE)
     role = models.CharField(max_length=10, choices=role_choice)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    
-class Task(models.Model):
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'user'], name='unique_project_member'),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='member_project_created_idx'),
+        ]
+
+class Task(AtomicSaveMixin, LoadedValuesMixin, models.Model):
     status_choice = [
         ('To Do', 'To Do'),
         ('In Progress', 'In Progress'),
@@ -33,7 +127,8 @@ class Task(models.Model):
         ('Medium', 'Medium'),
         ('High', 'High'),
         ]
-    
+    tracked_fields = ('project_id', 'status', 'priority')
+
     title = models.CharField(max_length=255)
     description = models.TextField()
     status = models.CharField(max_length=50, choices=status_choice)
@@ -42,10 +137,183 @@ class Task(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], condition=models.Q(deleted_at__isnull=False), name='task_deleted_idx'),
+            models.Index(fields=['project', 'created_at'], name='task_project_created_idx'),
+            models.Index(fields=['project', 'updated_at'], name='task_project_updated_idx'),
+            # One index per filter combination and ordering supported by the
+            # task list (see app/api/filters.py): equality columns first, then
+            # the ordering/range column, so no combination needs a sort.
+            models.Index(fields=['project', 'status', 'created_at'], name='task_status_created_idx'),
+            models.Index(fields=['project', 'status', 'updated_at'], name='task_status_updated_idx'),
+            models.Index(fields=['project', 'status', 'priority', 'created_at'], name='task_status_prio_created_idx'),
+            models.Index(fields=['project', 'status', 'priority', 'updated_at'], name='task_status_prio_updated_idx'),
+            models.Index(fields=['project', 'assigned_to', 'created_at'], name='task_asg_created_idx'),
+            models.Index(fields=['project', 'assigned_to', 'updated_at'], name='task_asg_updated_idx'),
+            models.Index(fields=['project', 'assigned_to', 'status', 'created_at'], name='task_asg_status_created_idx'),
+            models.Index(fields=['project', 'assigned_to', 'status', 'updated_at'], name='task_asg_status_updated_idx'),
+            models.Index(
+                fields=['project', 'assigned_to', 'status', 'priority', 'created_at'], name='task_asg_stat_prio_created_idx',
+            ),
+            models.Index(
+                fields=['project', 'assigned_to', 'status', 'priority', 'updated_at'], name='task_asg_stat_prio_updated_idx',
+            ),
+            # The same for the caller's tasks across projects (/api/users/me/tasks/).
+            models.Index(fields=['assigned_to', 'created_at'], name='asg_task_created_idx'),
+            models.Index(fields=['assigned_to', 'updated_at'], name='asg_task_updated_idx'),
+            models.Index(fields=['assigned_to', 'status', 'created_at'], name='asg_task_status_created_idx'),
+            models.Index(fields=['assigned_to', 'status', 'updated_at'], name='asg_task_status_updated_idx'),
+            models.Index(fields=['assigned_to', 'status', 'priority', 'created_at'], name='asg_task_stat_prio_created_idx'),
+            models.Index(fields=['assigned_to', 'status', 'priority', 'updated_at'], name='asg_task_stat_prio_updated_idx'),
+        ]
+
+class Comment(AtomicSaveMixin, LoadedValuesMixin, models.Model):
+    tracked_fields = ('task_id',)
 
-class Comment(models.Model):
     content = models.TextField()
     user = models.ForeignKey(MyUser, on_delete=models.CASCADE)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
\ No newline at end of file
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ActiveCommentManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'created_at'], name='comment_task_created_idx'),
+        ]
+
+
+class ArchivedTask(models.Model):
+    """
+    A Done task moved out of `Task` by `manage.py archive_tasks`, with its
+    id, until restored (see `app.archive`). Archived tasks are read-only.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    status = models.CharField(max_length=50, choices=Task.status_choice)
+    priority = models.CharField(max_length=50, choices=Task.priority_choice)
+    assigned_to = models.ForeignKey(MyUser, on_delete=models.CASCADE, null=True, blank=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'created_at'], name='archived_task_created_idx'),
+            models.Index(fields=['project', 'updated_at'], name='archived_task_updated_idx'),
+        ]
+
+
+class ArchivedComment(models.Model):
+    """A comment of an `ArchivedTask`, archived and restored together with it."""
+    id = models.IntegerField(primary_key=True)
+    content = models.TextField()
+    user = models.ForeignKey(MyUser, on_delete=models.CASCADE)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['task', 'created_at'], name='archived_comment_created_idx'),
+        ]
+
+
+class TaskWithArchived(models.Model):
+    """
+    Active and archived tasks together, read through the `UNION ALL` view of
+    migration 0010 by `?include_archived=true`. `archived_at` is null for
+    active tasks. SQLite merges the two halves through their own
+    (project, ...) indexes, so a page costs two index seeks.
+
+    The view filters nothing itself: SQLite only merges a `UNION ALL` view
+    whose halves have no WHERE clause, so soft-deleted tasks are left out by
+    the manager instead.
+    """
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    status = models.CharField(max_length=50, choices=Task.status_choice)
+    priority = models.CharField(max_length=50, choices=Task.priority_choice)
+    assigned_to = models.ForeignKey(
+        MyUser, on_delete=models.DO_NOTHING, null=True, db_constraint=False, related_name='+',
+    )
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(null=True)
+
+    objects = ActiveManager()
+
+    class Meta:
+        managed = False
+        db_table = 'app_task_with_archived'
+
+
+class ProjectCounter(models.Model):
+    """
+    Denormalized per-project counters (task totals by status and priority,
+    comment totals), maintained incrementally by the handlers in
+    `app.signals` and rebuilt by `manage.py rebuild_project_stats`.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='counters')
+    name = models.CharField(max_length=64)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'name'], name='unique_project_counter'),
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of an unfinished `manage.py import_project` run: the number of
+    input records already committed. Written in the same transaction as each
+    imported chunk and deleted when the import completes.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ProjectChange(models.Model):
+    """
+    One entry of a project's change feed: a task, comment or membership was
+    created or updated, or deleted (`deleted`, a tombstone). The id is the
+    feed's sequence number; SQLite hands out AUTOINCREMENT ids in commit
+    order because it serializes writers. Recorded by the handlers in
+    `app.signals`, in the transaction of the write itself.
+    """
+    TASK = 'task'
+    COMMENT = 'comment'
+    MEMBER = 'member'
+    kind_choice = [
+        (TASK, 'Task'),
+        (COMMENT, 'Comment'),
+        (MEMBER, 'Member'),
+        ]
+
+    # Covered by the indexes below, which start with the project.
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, db_index=False)
+    kind = models.CharField(max_length=10, choices=kind_choice)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'id'], name='change_project_seq_idx'),
+            models.Index(fields=['project', 'kind', 'object_id'], name='change_project_object_idx'),
+        ]
@@ -0,0 +1,122 @@
+"""
+Full-text search over task titles/descriptions and comment content.
+
+The SQLite FTS5 table `app_search` (migration 0006) holds one document per
+task (rowid 2 * id) and per comment (rowid 2 * id + 1), and database triggers
+keep it in step with every write to `app_task` and `app_comment`. Each
+document carries a `scope` token "p<project id>", which the MATCH expression
+requires, so a search only ever visits the documents of one project.
+Documents of soft-deleted tasks stay indexed until the purge deletes the
+rows; searches leave them out.
+"""
+import re
+
+from django.db import connections, router, transaction
+
+from app.models import Task
+
+SEARCH_TABLE = 'app_search'
+# bm25() weights of the title, body and scope columns: a hit in a task title
+# counts ten times as much as one in a description or comment.
+RANK = f'bm25({SEARCH_TABLE}, 10.0, 1.0, 0.0)'
+
+TERM_RE = re.compile(r'\w+\*?')
+
+
+def search_available(using=None):
+    using = using or router.db_for_read(Task)
+    return connections[using].vendor == 'sqlite'
+
+
+def match_expression(project_id, query):
+    """
+    Build an FTS5 MATCH expression from free text: every word must appear in
+    the title or body, words ending in `*` match as prefixes, and FTS5
+    operators in the input are treated as plain words. Returns None when the
+    query has no words.
+    """
+    terms = []
+    for term in TERM_RE.findall(query):
+        prefix = term.endswith('*')
+        word = term.rstrip('*')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    if not terms:
+        return None
+    return f'scope:p{int(project_id)} AND {{title body}}: ({" AND ".join(terms)})'
+
+
+def search_project(project_id, query, limit, offset=0):
+    """
+    Return up to `limit` ranked hits for `query` in a project, skipping the
+    first `offset`. Each hit is a dict with `type` ("task" or "comment"),
+    `id`, `task`, `title` (of the task), `snippet` and `rank` (lower is better).
+    """
+    expression = match_expression(project_id, query)
+    if expression is None:
+        return []
+    sql = f"""
+        SELECT s.rowid, s.task_id, t.title, snippet({SEARCH_TABLE}, -1, '', '', '…', 16), {RANK} AS rank
+        FROM {SEARCH_TABLE} s JOIN app_task t ON t.id = s.task_id
+        WHERE {SEARCH_TABLE} MATCH %s AND t.deleted_at IS NULL
+        ORDER BY rank, s.rowid
+        LIMIT %s OFFSET %s
+    """
+    with connections[router.db_for_read(Task)].cursor() as cursor:
+        cursor.execute(sql, [expression, limit, offset])
+        rows = cursor.fetchall()
+    return [
+        {
+            'type': 'comment' if rowid % 2 else 'task',
+            'id': rowid // 2,
+            'task': task_id,
+            'title': title,
+            'snippet': snippet,
+            'rank': round(rank, 4) + 0.0,  # bm25() can return -0.0
+        }
+        for rowid, task_id, title, snippet, rank in rows
+    ]
+
+
+def rebuild_search_index(project_ids=None):
+    """
+    Re-index tasks and comments from scratch, for every project or only
+    `project_ids`, in one transaction, then merge the index b-trees.
+    Returns the number of documents indexed.
+    """
+    if project_ids is not None and not project_ids:
+        return 0
+    using = router.db_for_write(Task)
+    task_filter = comment_filter = ''
+    params = []
+    if project_ids is not None:
+        placeholders = ', '.join(['%s'] * len(project_ids))
+        task_filter = f' WHERE project_id IN ({placeholders})'
+        comment_filter = f' WHERE t.project_id IN ({placeholders})'
+        params = list(project_ids)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        if project_ids is None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        else:
+            scopes = ' OR '.join(f'p{int(project_id)}' for project_id in project_ids)
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN '
+                f'(SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s)',
+                [f'scope: ({scopes})'],
+            )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, scope, task_id) "
+            f"SELECT id * 2, title, description, 'p' || project_id, id FROM app_task{task_filter}",
+            params,
+        )
+        indexed = cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, body, scope, task_id) "
+            f"SELECT c.id * 2 + 1, '', c.content, 'p' || t.project_id, c.task_id "
+            f"FROM app_comment c JOIN app_task t ON t.id = c.task_id{comment_filter}",
+            params,
+        )
+        indexed += cursor.rowcount
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    return indexed
@@ -0,0 +1,322 @@
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from app import changes, stats
+from app.api import permissions
+from app.api.response_cache import bump_project_version
+from app.models import Project, ProjectMember, Task, Comment
+
+# Sent by code that writes tasks, comments or memberships with bulk_create()/bulk_update(),
+# which do not send post_save. Arguments: sender (the model), instances, created.
+bulk_saved = Signal()
+
+# Sent by `app.deletion` after stamping `deleted_at` on projects or tasks, which
+# from then on are hidden as if deleted. Arguments: sender (the model), instances.
+soft_deleted = Signal()
+
+
+def deleted_along_with(origin, *models):
+    """True when a delete cascaded from an instance or queryset of `models`."""
+    return isinstance(origin, models) or getattr(origin, 'model', None) in models
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def forget_cached_owner(sender, instance, **kwargs):
+    permissions.forget_project_owner(instance.pk)
+
+
+@receiver(soft_deleted, sender=Project)
+def forget_soft_deleted_owners(sender, instances, **kwargs):
+    # Without a cached owner, role lookups go to the database and find the project gone.
+    for project in instances:
+        permissions.forget_project_owner(project.pk)
+
+
+def now_and_on_commit(forget):
+    """
+    Run `forget()` now and again on commit, so a concurrent request that
+    reads the old rows before the transaction commits cannot cache them for
+    the whole timeout.
+    """
+    forget()
+    transaction.on_commit(forget)
+
+
+@receiver(post_save, sender=ProjectMember)
+@receiver(post_delete, sender=ProjectMember)
+def forget_cached_role(sender, instance, **kwargs):
+    roles = {(instance.project_id, instance.user_id)}
+    old_project, old_user = instance.loaded_value('project_id'), instance.loaded_value('user_id')
+    if old_project is not None:
+        roles.add((old_project, old_user))
+
+    def forget():
+        for project_id, user_id in roles:
+            permissions.forget_project_role(project_id, user_id)
+        permissions.forget_project_of('member', instance.pk)
+
+    now_and_on_commit(forget)
+
+
+@receiver(bulk_saved, sender=ProjectMember)
+def forget_bulk_cached_roles(sender, instances, **kwargs):
+    roles = {(member.project_id, member.user_id) for member in instances}
+
+    def forget():
+        for project_id, user_id in roles:
+            permissions.forget_project_role(project_id, user_id)
+
+    now_and_on_commit(forget)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def forget_cached_task_project(sender, instance, created=False, **kwargs):
+    if not created:
+        permissions.forget_project_of('task', instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def forget_cached_comment_project(sender, instance, created=False, **kwargs):
+    if not created:
+        permissions.forget_project_of('comment', instance.pk)
+
+
+def saved_task_deltas(task, created, deltas):
+    """Accumulate the counter changes caused by saving `task` into `deltas` ({project_id: {name: amount}})."""
+    def add(project_id, changes):
+        bucket = deltas.setdefault(project_id, {})
+        for name, amount in changes.items():
+            bucket[name] = bucket.get(name, 0) + amount
+
+    if created:
+        add(task.project_id, stats.task_deltas(task.status, task.priority))
+        return deltas
+    old_project = task.loaded_value('project_id')
+    if old_project is None:
+        return deltas
+    old = stats.task_deltas(task.loaded_value('status'), task.loaded_value('priority'), -1)
+    new = stats.task_deltas(task.status, task.priority)
+    if old_project != task.project_id:
+        comments = Comment.objects.filter(task=task).count()
+        add(old_project, {**old, stats.COMMENTS: -comments})
+        add(task.project_id, {**new, stats.COMMENTS: comments})
+    else:
+        add(task.project_id, old)
+        add(task.project_id, new)
+    return deltas
+
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, **kwargs):
+    for project_id, deltas in saved_task_deltas(instance, created, {}).items():
+        stats.apply_deltas(project_id, deltas)
+
+
+@receiver(bulk_saved, sender=Task)
+def count_bulk_saved_tasks(sender, instances, created, **kwargs):
+    deltas = {}
+    for task in instances:
+        saved_task_deltas(task, created, deltas)
+    for project_id, changes in deltas.items():
+        stats.apply_deltas(project_id, changes)
+
+
+@receiver(pre_delete, sender=Task)
+def count_comments_of_deleted_task(sender, instance, origin=None, **kwargs):
+    if not deleted_along_with(origin, Project):
+        instance._comment_count = Comment.objects.filter(task=instance).count()
+
+
+@receiver(post_delete, sender=Task)
+def count_deleted_task(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, Project):
+        return
+    deltas = stats.task_deltas(instance.status, instance.priority, -1)
+    deltas[stats.COMMENTS] = -getattr(instance, '_comment_count', 0)
+    stats.apply_deltas(instance.project_id, deltas)
+
+
+@receiver(soft_deleted, sender=Task)
+def count_soft_deleted_tasks(sender, instances, **kwargs):
+    comments = dict(
+        Comment.all_objects.filter(task__in=instances).values('task_id').annotate(n=Count('id'))
+        .order_by().values_list('task_id', 'n')
+    )
+    deltas = {}
+    for task in instances:
+        bucket = deltas.setdefault(task.project_id, {})
+        changes = stats.task_deltas(task.status, task.priority, -1)
+        changes[stats.COMMENTS] = -comments.get(task.pk, 0)
+        for name, amount in changes.items():
+            bucket[name] = bucket.get(name, 0) + amount
+    for project_id, changes in deltas.items():
+        stats.apply_deltas(project_id, changes)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    old_task = instance.loaded_value('task_id')
+    if created:
+        stats.apply_deltas(instance.task.project_id, {stats.COMMENTS: 1})
+    elif old_task is not None and old_task != instance.task_id:
+        old_project = Task.objects.filter(pk=old_task).values_list('project_id', flat=True).first()
+        if old_project != instance.task.project_id:
+            stats.apply_deltas(old_project, {stats.COMMENTS: -1})
+            stats.apply_deltas(instance.task.project_id, {stats.COMMENTS: 1})
+
+
+@receiver(bulk_saved, sender=Comment)
+def count_bulk_saved_comments(sender, instances, created, **kwargs):
+    if not created:
+        return
+    deltas = {}
+    for comment in instances:
+        deltas[comment.task.project_id] = deltas.get(comment.task.project_id, 0) + 1
+    for project_id, amount in deltas.items():
+        stats.apply_deltas(project_id, {stats.COMMENTS: amount})
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    # Comments removed with their task or project are counted by that delete.
+    if deleted_along_with(origin, Task, Project):
+        return
+    stats.apply_deltas(instance.task.project_id, {stats.COMMENTS: -1})
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_responses(sender, instance, created=False, origin=None, **kwargs):
+    if deleted_along_with(origin, Project):
+        return
+    bump_project_version(instance.project_id)
+    old_project = instance.loaded_value('project_id')
+    if old_project is not None and old_project != instance.project_id:
+        bump_project_version(old_project)
+
+
+@receiver(bulk_saved, sender=Task)
+def invalidate_bulk_task_responses(sender, instances, **kwargs):
+    for project_id in {task.project_id for task in instances}:
+        bump_project_version(project_id)
+
+
+@receiver(soft_deleted, sender=Project)
+@receiver(soft_deleted, sender=Task)
+def invalidate_soft_deleted_responses(sender, instances, **kwargs):
+    for project_id in {instance.pk if sender is Project else instance.project_id for instance in instances}:
+        bump_project_version(project_id)
+
+
+@receiver(bulk_saved, sender=Comment)
+def invalidate_bulk_comment_responses(sender, instances, **kwargs):
+    for project_id in {comment.task.project_id for comment in instances}:
+        bump_project_version(project_id)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_responses(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, Task, Project):
+        return
+    bump_project_version(instance.task.project_id)
+    old_task = instance.loaded_value('task_id')
+    if old_task is not None and old_task != instance.task_id:
+        old_project = Task.objects.filter(pk=old_task).values_list('project_id', flat=True).first()
+        if old_project is not None and old_project != instance.task.project_id:
+            bump_project_version(old_project)
+
+
+@receiver(post_save, sender=ProjectMember)
+@receiver(post_delete, sender=ProjectMember)
+def invalidate_member_responses(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, Project):
+        return
+    bump_project_version(instance.project_id)
+    old_project = instance.loaded_value('project_id')
+    if old_project is not None and old_project != instance.project_id:
+        bump_project_version(old_project)
+
+
+@receiver(bulk_saved, sender=ProjectMember)
+def invalidate_bulk_member_responses(sender, instances, **kwargs):
+    for project_id in {member.project_id for member in instances}:
+        bump_project_version(project_id)
+
+
+@receiver(post_save, sender=Task)
+def record_saved_task(sender, instance, created, **kwargs):
+    entries = [(instance.project_id, changes.TASK, instance.pk, False)]
+    old_project = instance.loaded_value('project_id')
+    if not created and old_project is not None and old_project != instance.project_id:
+        # To the old project the task is gone; the new one receives its comments too.
+        entries.append((old_project, changes.TASK, instance.pk, True))
+        entries += [
+            (instance.project_id, changes.COMMENT, comment_id, False)
+            for comment_id in Comment.objects.filter(task=instance).values_list('id', flat=True)
+        ]
+    changes.record_changes(entries)
+
+
+@receiver(post_delete, sender=Task)
+def record_deleted_task(sender, instance, origin=None, **kwargs):
+    if not deleted_along_with(origin, Project):
+        changes.record_change(instance.project_id, changes.TASK, instance.pk, deleted=True)
+
+
+@receiver(soft_deleted, sender=Task)
+def record_soft_deleted_tasks(sender, instances, **kwargs):
+    changes.record_changes([(task.project_id, changes.TASK, task.pk, True) for task in instances])
+
+
+@receiver(bulk_saved, sender=Task)
+def record_bulk_saved_tasks(sender, instances, **kwargs):
+    changes.record_changes([(task.project_id, changes.TASK, task.pk, False) for task in instances])
+
+
+@receiver(post_save, sender=Comment)
+def record_saved_comment(sender, instance, created, **kwargs):
+    entries = [(instance.task.project_id, changes.COMMENT, instance.pk, False)]
+    old_task = instance.loaded_value('task_id')
+    if not created and old_task is not None and old_task != instance.task_id:
+        old_project = Task.objects.filter(pk=old_task).values_list('project_id', flat=True).first()
+        if old_project is not None and old_project != instance.task.project_id:
+            entries.append((old_project, changes.COMMENT, instance.pk, True))
+    changes.record_changes(entries)
+
+
+@receiver(post_delete, sender=Comment)
+def record_deleted_comment(sender, instance, origin=None, **kwargs):
+    # A task tombstone stands for the comments deleted with the task.
+    if not deleted_along_with(origin, Task, Project):
+        changes.record_change(instance.task.project_id, changes.COMMENT, instance.pk, deleted=True)
+
+
+@receiver(bulk_saved, sender=Comment)
+def record_bulk_saved_comments(sender, instances, **kwargs):
+    changes.record_changes([(comment.task.project_id, changes.COMMENT, comment.pk, False) for comment in instances])
+
+
+@receiver(post_save, sender=ProjectMember)
+def record_saved_member(sender, instance, created, **kwargs):
+    entries = [(instance.project_id, changes.MEMBER, instance.pk, False)]
+    old_project = instance.loaded_value('project_id')
+    if not created and old_project is not None and old_project != instance.project_id:
+        entries.append((old_project, changes.MEMBER, instance.pk, True))
+    changes.record_changes(entries)
+
+
+@receiver(post_delete, sender=ProjectMember)
+def record_deleted_member(sender, instance, origin=None, **kwargs):
+    if not deleted_along_with(origin, Project):
+        changes.record_change(instance.project_id, changes.MEMBER, instance.pk, deleted=True)
+
+
+@receiver(bulk_saved, sender=ProjectMember)
+def record_bulk_saved_members(sender, instances, **kwargs):
+    changes.record_changes([(member.project_id, changes.MEMBER, member.pk, False) for member in instances])
@@ -0,0 +1,164 @@
+"""
+Slow-query log.
+
+A wrapper installed on every database connection times each query. Queries
+taking at least `SLOW_QUERY_MS` milliseconds are recorded, with
+
+- the SQL normalized so that executions differing only in their parameters
+  (or in the length of an `IN (...)` list) group together,
+- the call site: the innermost frame of the project's own code (e.g.
+  `app/api/views.py:212 in get_queryset`),
+- the duration, and
+- the `EXPLAIN QUERY PLAN` output, taken once per normalized statement.
+
+Entries go to a ring buffer of the last `SLOW_QUERY_LOG_SIZE` slow queries in
+the process (`GET /api/slow-queries/` aggregates it) and, when
+`SLOW_QUERY_LOG_FILE` is set, are appended to that file as JSON lines, which
+`manage.py slow_queries` aggregates across processes.
+
+A query under the threshold costs the wrapper two `perf_counter()` calls.
+"""
+import json
+import re
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+from app.api.utils import FULL_SCAN_RE
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS_RE = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE_RE = re.compile(r'\s+')
+
+_lock = threading.Lock()
+_entries = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+_plans = {}
+_MAX_PLANS = 1000
+
+_own_file = Path(__file__).resolve()
+_base_dir = str(Path(settings.BASE_DIR).resolve())
+
+
+def normalize_sql(sql):
+    """`sql` with its literals and placeholders as `?` and value lists as `(...)`."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    sql = _ROWS_RE.sub('(...)', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+def call_site():
+    """`path:line in function` of the innermost frame of the project's code, outside this module."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_base_dir) and 'site-packages' not in filename and Path(filename) != _own_file:
+            path = Path(filename).relative_to(_base_dir)
+            return f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def _explain(connection, sql, params):
+    if not connection.features.supports_explaining_query_execution:
+        return []
+    # A backend cursor, so the EXPLAIN itself skips the connection's wrappers.
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+    except DatabaseError:
+        return []
+    finally:
+        cursor.close()
+
+
+def _record(connection, sql, params, many, duration):
+    normalized = normalize_sql(sql)
+    with _lock:
+        plan = _plans.get(normalized)
+    if plan is None:
+        plan = [] if many else _explain(connection, sql, params)
+        with _lock:
+            if len(_plans) >= _MAX_PLANS:
+                _plans.clear()
+            _plans[normalized] = plan
+    entry = {
+        'sql': normalized,
+        'call_site': call_site(),
+        'duration_ms': round(duration * 1000, 3),
+        'database': connection.alias,
+        'plan': plan,
+        'at': timezone.now().isoformat(),
+    }
+    with _lock:
+        _entries.append(entry)
+        if settings.SLOW_QUERY_LOG_FILE:
+            with open(settings.SLOW_QUERY_LOG_FILE, 'a') as log:
+                log.write(json.dumps(entry) + '\n')
+
+
+def _log_slow_query(execute, sql, params, many, context):
+    threshold = settings.SLOW_QUERY_MS
+    if not threshold:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = time.perf_counter() - start
+    if duration * 1000 >= threshold:
+        _record(context['connection'], sql, params, many, duration)
+    return result
+
+
+@receiver(connection_created)
+def install_slow_query_log(sender, connection, **kwargs):
+    # Fires again whenever the same connection object reconnects.
+    if _log_slow_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_log_slow_query)
+
+
+def slow_queries():
+    """The slow queries recorded by this process, oldest first."""
+    with _lock:
+        return list(_entries)
+
+
+def reset_slow_queries():
+    with _lock:
+        _entries.clear()
+        _plans.clear()
+
+
+def aggregate_slow_queries(entries, limit=None):
+    """
+    Group `entries` by normalized SQL and call site, worst total time first:
+    count, total/mean/max duration, the plan and the tables it fully scans.
+    """
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault((entry['sql'], entry['call_site']), {
+            'sql': entry['sql'], 'call_site': entry['call_site'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+        })
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['plan'] = entry['plan']
+    offenders = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:limit]
+    for group in offenders:
+        group['total_ms'] = round(group['total_ms'], 3)
+        group['mean_ms'] = round(group['total_ms'] / group['count'], 3)
+        group['full_scans'] = [match.group(1) for match in map(FULL_SCAN_RE.match, group['plan']) if match]
+    return offenders
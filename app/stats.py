@@ -0,0 +1,138 @@
+"""
+Incrementally maintained per-project statistics.
+
+Counters live in `ProjectCounter` rows named:
+
+    tasks                total number of tasks
+    status:<status>      tasks per status
+    priority:<priority>  tasks per priority
+    comments             total number of comments on the project's tasks
+
+`app.signals` applies deltas as tasks and comments are written, so reading
+the statistics of a project is a single indexed query regardless of its size.
+"""
+from collections import Counter
+
+from django.db import connections, router, transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from app.models import ProjectCounter, Task, Comment
+
+TASKS = 'tasks'
+COMMENTS = 'comments'
+
+
+def task_counters(status, priority):
+    """Names of the counters a task with `status` and `priority` contributes to."""
+    return [TASKS, f'status:{status}', f'priority:{priority}']
+
+
+def task_deltas(status, priority, sign=1):
+    return {name: sign for name in task_counters(status, priority)}
+
+
+def apply_deltas(project_id, deltas):
+    """
+    Add `deltas` ({counter name: amount}) to the counters of a project with a
+    single upsert, creating counters that do not exist yet.
+    """
+    deltas = {name: amount for name, amount in deltas.items() if amount}
+    if not deltas:
+        return
+    table = ProjectCounter._meta.db_table
+    rows = ', '.join(['(%s, %s, %s)'] * len(deltas))
+    params = [value for name, amount in sorted(deltas.items()) for value in (project_id, name, amount)]
+    using = router.db_for_write(ProjectCounter)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (project_id, name, value) VALUES {rows} '
+            f'ON CONFLICT (project_id, name) DO UPDATE SET value = {table}.value + excluded.value',
+            params,
+        )
+
+
+def counter_subquery(name, project_ref='pk'):
+    """Subquery expression reading counter `name` of the project `project_ref` points at."""
+    return Subquery(
+        ProjectCounter.objects.filter(project_id=OuterRef(project_ref), name=name).values('value')[:1]
+    )
+
+
+def get_project_stats(project_id):
+    """Return the statistics of one project as served by the stats endpoint."""
+    counters = dict(ProjectCounter.objects.filter(project_id=project_id).values_list('name', 'value'))
+    return {
+        'project': project_id,
+        'tasks': {
+            'total': counters.get(TASKS, 0),
+            'by_status': {status: counters.get(f'status:{status}', 0) for status, _ in Task.status_choice},
+            'by_priority': {priority: counters.get(f'priority:{priority}', 0) for priority, _ in Task.priority_choice},
+        },
+        'comments': counters.get(COMMENTS, 0),
+    }
+
+
+def compute_counters(project_ids=None):
+    """
+    Count everything from scratch. Returns {project_id: Counter(name -> value)}
+    for `project_ids`, or for every project that has tasks when None.
+    """
+    tasks = Task.objects.all()
+    comments = Comment.objects.all()
+    if project_ids is not None:
+        tasks = tasks.filter(project_id__in=project_ids)
+        comments = comments.filter(task__project_id__in=project_ids)
+
+    counters = {project_id: Counter() for project_id in project_ids or ()}
+    rows = tasks.values('project_id', 'status', 'priority').annotate(n=Count('id')).order_by()
+    for row in rows:
+        counter = counters.setdefault(row['project_id'], Counter())
+        for name in task_counters(row['status'], row['priority']):
+            counter[name] += row['n']
+    rows = comments.values('task__project_id').annotate(n=Count('id')).order_by()
+    for row in rows:
+        counters.setdefault(row['task__project_id'], Counter())[COMMENTS] += row['n']
+    return counters
+
+
+def stored_counters(project_ids=None):
+    """Return the maintained counters in the same shape as `compute_counters`."""
+    rows = ProjectCounter.objects.exclude(value=0)
+    if project_ids is not None:
+        rows = rows.filter(project_id__in=project_ids)
+    counters = {project_id: Counter() for project_id in project_ids or ()}
+    for project_id, name, value in rows.values_list('project_id', 'name', 'value'):
+        counters.setdefault(project_id, Counter())[name] = value
+    return counters
+
+
+def rebuild_counters(project_ids=None):
+    """Replace the stored counters with freshly computed ones in one transaction."""
+    with transaction.atomic():
+        computed = compute_counters(project_ids)
+        stale = ProjectCounter.objects.all()
+        if project_ids is not None:
+            stale = stale.filter(project_id__in=project_ids)
+        stale.delete()
+        ProjectCounter.objects.bulk_create([
+            ProjectCounter(project_id=project_id, name=name, value=value)
+            for project_id, counter in computed.items()
+            for name, value in counter.items() if value
+        ])
+    return computed
+
+
+def diff_counters(project_ids=None):
+    """
+    Compare stored and recomputed counters. Returns a list of
+    (project_id, name, stored, actual) for every mismatch.
+    """
+    computed = compute_counters(project_ids)
+    stored = stored_counters(project_ids)
+    mismatches = []
+    for project_id in sorted(set(computed) | set(stored)):
+        actual, kept = computed.get(project_id, Counter()), stored.get(project_id, Counter())
+        for name in sorted(set(actual) | set(kept)):
+            if actual[name] != kept[name]:
+                mismatches.append((project_id, name, kept[name], actual[name]))
+    return mismatches
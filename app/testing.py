@@ -0,0 +1,167 @@
+"""
+Helpers for the per-route query-count and latency regression tests.
+
+Each route is given a pinned query budget in the test itself and a wall-time
+baseline recorded in a JSON file next to the tests. A route fails when it runs
+more queries than its budget, or when its best wall time exceeds
+
+    baseline * PERF_TOLERANCE + PERF_SLACK_MS
+
+Subclasses also map every URL pattern of their URLconf to the budgets that
+measure it, so a route added without a budget fails the tests.
+
+Re-record the baselines after an intentional change with:
+
+    PERF_RECORD=1 python manage.py test
+"""
+import gc
+import json
+import os
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+
+from app.models import Project, ProjectMember, Task, Comment
+from app.stats import rebuild_counters
+from authentication.models import MyUser
+
+PERF_RECORD = os.environ.get('PERF_RECORD') == '1'
+PERF_TOLERANCE = float(os.environ.get('PERF_TOLERANCE', '3.0'))
+PERF_SLACK_MS = float(os.environ.get('PERF_SLACK_MS', '25'))
+PERF_REPEAT = int(os.environ.get('PERF_REPEAT', '5'))
+
+
+def seed_dataset(projects=10, members=5, tasks=40, comments=3):
+    """
+    Create a dataset shaped like a busy tenant with bulk inserts and return
+    the owner, whose first project is the one the route tests exercise.
+    """
+    owner = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+    # Every seeded user shares one password hash; hashing is not what we measure.
+    users = MyUser.objects.bulk_create([
+        MyUser(email=f'user{i}@example.com', username=f'user{i}', password=owner.password)
+        for i in range(members)
+    ])
+    Project.objects.bulk_create([
+        Project(name=f'Project {i}', description='Seeded project', owner=owner) for i in range(projects)
+    ])
+    project_list = list(Project.objects.order_by('id'))
+    ProjectMember.objects.bulk_create(
+        [ProjectMember(project=project, user=owner, role='Admin') for project in project_list]
+        + [ProjectMember(project=project, user=user, role='Member') for project in project_list for user in users]
+    )
+    statuses = [choice for choice, _ in Task.status_choice]
+    priorities = [choice for choice, _ in Task.priority_choice]
+    Task.objects.bulk_create([
+        Task(
+            title=f'Task {i}', description='Seeded task', project=project,
+            status=statuses[i % len(statuses)], priority=priorities[i % len(priorities)],
+            assigned_to=users[i % len(users)] if users else None,
+        )
+        for project in project_list for i in range(tasks)
+    ])
+    Comment.objects.bulk_create([
+        Comment(content=f'Comment {i}', user=owner, task=task)
+        for task in Task.objects.filter(project=project_list[0]) for i in range(comments)
+    ])
+    # bulk_create() bypasses the signals that maintain the project counters.
+    rebuild_counters()
+    return owner
+
+
+def url_names(patterns):
+    """Names of the URL patterns in `patterns`, including those of included URLconfs."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from url_names(pattern.url_patterns)
+        else:
+            yield pattern.name
+
+
+class RouteBudgetMixin:
+    """
+    Mixin for `TestCase` classes that pin a query budget and a wall-time
+    baseline per route. Subclasses set `baseline_path`, `urlconf` and
+    `route_budgets`, which maps each URL pattern name of `urlconf` to the
+    names of the budgets that measure it.
+    """
+    baseline_path = None
+    urlconf = None
+    route_budgets = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.baselines = {}
+        if os.path.exists(cls.baseline_path):
+            with open(cls.baseline_path) as fh:
+                cls.baselines = json.load(fh)
+        cls.recorded = {}
+
+    def setUp(self):
+        super().setUp()
+        # Cached roles, versions and responses must not leak between rolled-back tests.
+        for alias in settings.CACHES:
+            caches[alias].clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        if PERF_RECORD and cls.recorded:
+            baselines = dict(cls.baselines, **cls.recorded)
+            with open(cls.baseline_path, 'w') as fh:
+                json.dump(dict(sorted(baselines.items())), fh, indent=2)
+                fh.write('\n')
+        super().tearDownClass()
+
+    def test_every_route_has_a_budget(self):
+        names = set(url_names(import_module(self.urlconf).urlpatterns))
+        self.assertNotIn(None, names, f'Name every URL pattern of {self.urlconf} so it can be given a budget.')
+        self.assertEqual(sorted(names - set(self.route_budgets)), [], f'URL patterns of {self.urlconf} without a budget.')
+        if not PERF_RECORD:
+            budgets = [budget for budgets in self.route_budgets.values() for budget in budgets]
+            self.assertEqual([budget for budget in budgets if budget not in self.baselines], [],
+                             'Budgets without a wall-time baseline; run with PERF_RECORD=1.')
+
+    def assertRouteBudget(self, name, request, queries, status_code=200, repeat=PERF_REPEAT):
+        """
+        Call `request()` and check the route stays within `queries` database
+        queries and its recorded wall-time baseline. Idempotent routes are
+        timed `repeat` times and judged on the fastest run; pass `repeat=1`
+        for routes that change state.
+        """
+        # A full collection owed by earlier tests would otherwise land in a single-run route.
+        gc.collect()
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = request()
+            best = time.perf_counter() - start
+        self.assertEqual(response.status_code, status_code, getattr(response, 'data', response))
+        url_name = response.resolver_match.url_name
+        self.assertIn(name, self.route_budgets.get(url_name, ()), f'{name} requested the {url_name} route.')
+        self.assertLessEqual(
+            len(ctx.captured_queries), queries,
+            f'{name} ran {len(ctx.captured_queries)} queries, budget is {queries}:\n'
+            + '\n'.join(query['sql'] for query in ctx.captured_queries),
+        )
+
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            request()
+            best = min(best, time.perf_counter() - start)
+        best_ms = best * 1000
+
+        if PERF_RECORD:
+            self.recorded[name] = round(best_ms, 2)
+            return response
+        self.assertIn(name, self.baselines, f'No wall-time baseline for {name}; run with PERF_RECORD=1.')
+        allowed_ms = self.baselines[name] * PERF_TOLERANCE + PERF_SLACK_MS
+        self.assertLessEqual(
+            best_ms, allowed_ms,
+            f'{name} took {best_ms:.1f}ms, baseline is {self.baselines[name]}ms (allowed {allowed_ms:.1f}ms).',
+        )
+        return response
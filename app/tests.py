@@ -1,3 +1,1894 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import datetime
+import json
+import os
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.db.models import F
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from app.api.export import iter_task_chunks
+from app.api.filters import MY_TASK_INDEXES, TASK_LIST_INDEXES
+from app.db import ReplicaRoutingMiddleware
+from app.api.events import event_stream
+from app.events import event_backend
+from app.metrics import reset_metrics
+from app.slow_queries import normalize_sql, reset_slow_queries, slow_queries
+from app.api.response_cache import aget_or_compute, get_or_compute
+from app.archive import archive_tasks
+from app.changes import compact_changes, record_changes
+from app.deletion import purge_deleted, soft_delete_project, soft_delete_tasks
+from app.api.utils import explain_query_plan, full_table_scans
+from app.models import ArchivedComment, ArchivedTask, Project, ProjectChange, ProjectMember, Task, Comment
+from app.stats import diff_counters, get_project_stats
+from app.testing import RouteBudgetMixin, seed_dataset
+from authentication.models import MyUser
+
+
+def streamed(response):
+    """Consume a streaming response so its queries run inside the caller's measurement."""
+    response.content_bytes = b''.join(response.streaming_content)
+    return response
+
+
+class QueryPlanTests(TestCase):
+    """Every list and detail endpoint must be served from an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.member = ProjectMember.objects.create(project=cls.project, user=cls.user, role='Admin')
+        cls.task = Task.objects.create(
+            title='Task', description='', status='To Do', priority='Low', project=cls.project, assigned_to=cls.user,
+        )
+        cls.comment = Comment.objects.create(content='Comment', user=cls.user, task=cls.task)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def endpoints(self):
+        return [
+            '/api/projects/',
+            f'/api/projects/{self.project.id}/',
+            f'/api/projects/{self.project.id}/tasks/',
+            f'/api/projects/{self.project.id}/changes/',
+            f'/api/tasks/{self.task.id}/',
+            f'/api/tasks/{self.task.id}/comments/',
+            f'/api/comments/{self.comment.id}/',
+            f'/api/projects/{self.project.id}/members/',
+            f'/api/members/{self.member.id}/',
+            f'/api/users/{self.user.id}/',
+            '/api/users/me/tasks/',
+        ]
+
+    def test_no_full_table_scans(self):
+        for url in self.endpoints():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                for query in ctx.captured_queries:
+                    if not query['sql'].startswith('SELECT'):
+                        continue
+                    self.assertEqual(full_table_scans(query['sql']), [], query['sql'])
+
+
+    def test_task_list_filters_use_their_index(self):
+        self.assertFiltersUseTheirIndex(f'/api/projects/{self.project.id}/tasks/', TASK_LIST_INDEXES, scope='project_id')
+
+    def test_my_task_filters_use_their_index(self):
+        self.assertFiltersUseTheirIndex('/api/users/me/tasks/', MY_TASK_INDEXES, scope='assigned_to_id')
+
+    def test_export_chunks_seek_the_project_foreign_key_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            list(iter_task_chunks(self.project.id, chunk_size=1))
+        chunks = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT "app_task"."id"')]
+        self.assertEqual(len(chunks), 2)
+        for sql in chunks:
+            plan = explain_query_plan(sql)
+            self.assertTrue(any(detail.startswith('SEARCH app_task USING INDEX ')
+                                and detail.endswith('(project_id=? AND rowid>?)') for detail in plan), plan)
+            self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+
+    def test_later_pages_seek_past_the_cursor(self):
+        Task.objects.create(title='Second', description='', status='To Do', priority='Low', project=self.project)
+        first = self.client.get(f'/api/projects/{self.project.id}/tasks/', {'page_size': 1}).data
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(first['next'])
+        self.assertEqual([task['title'] for task in response.data['results']], ['Second'])
+        page = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT "app_task"."id"')]
+        plan = explain_query_plan(page[0])
+        self.assertTrue(any(detail.startswith('SEARCH app_task USING INDEX ')
+                            and detail.endswith('(project_id=? AND created_at>?)') for detail in plan), plan)
+        self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+
+    def assertFiltersUseTheirIndex(self, url, indexes, scope):
+        """
+        Check every combination of `indexes` plans as a sort-free search of its
+        index that seeks on `scope` (the column the list is restricted to) and
+        every filter, so no filter is left to be checked row by row.
+        """
+        values = {'status': 'To Do', 'priority': 'Low', 'assigned_to': 'me'}
+        columns = {'status': 'status', 'priority': 'priority', 'assigned_to': 'assigned_to_id'}
+        for (filters, field), index in indexes.items():
+            for ordering in [field, '-' + field]:
+                params = dict({name: values[name] for name in filters}, ordering=ordering)
+                if field == 'updated_at':
+                    params['updated_since'] = '2000-01-01T00:00:00Z'
+                with self.subTest(params=params):
+                    with CaptureQueriesContext(connection) as ctx:
+                        response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 200, response.data)
+                    self.assertEqual(len(response.data['results']), 1)
+                    page = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith(
+                        'SELECT "app_task"."id"')]
+                    self.assertEqual(len(page), 1, ctx.captured_queries)
+                    plan = explain_query_plan(page[0])
+                    searches = [detail for detail in plan if f'USING INDEX {index} ' in detail]
+                    self.assertTrue(searches, plan)
+                    self.assertFalse(any('TEMP B-TREE' in detail for detail in plan), plan)
+                    for column in [scope, *(columns[name] for name in filters)]:
+                        self.assertIn(f'{column}=?', searches[0])
+
+
+class RouteBudgetTests(RouteBudgetMixin, TestCase):
+    """Query-count budgets and wall-time baselines for every route in app/api/urls.py."""
+    baseline_path = os.path.join(os.path.dirname(__file__), 'perf_baseline.json')
+    urlconf = 'app.api.urls'
+    route_budgets = {
+        'api-root': ['api-root'],
+        'project-list': ['project-list', 'project-create'],
+        'project-detail': ['project-retrieve', 'project-update', 'project-destroy'],
+        'project-stats': ['project-stats'],
+        'project-export': ['project-export'],
+        'project-search': ['project-search'],
+        'project-changes': ['project-changes'],
+        'project-events': ['project-events'],
+        'task-list': ['task-list', 'task-list-filtered', 'task-create'],
+        'task-bulk': ['task-bulk'],
+        'task-detail': ['task-retrieve', 'task-update', 'task-destroy'],
+        'task-restore': ['task-restore'],
+        'my-task-list': ['my-task-list'],
+        'comment-list': ['comment-list', 'comment-create'],
+        'comment-detail': ['comment-retrieve', 'comment-update', 'comment-destroy'],
+        'member-list': ['member-list', 'member-create'],
+        'member-detail': ['member-retrieve', 'member-update', 'member-destroy'],
+        'async-task-list': ['async-task-list', 'async-task-create'],
+        'async-task-detail': ['async-task-retrieve', 'async-task-update', 'async-task-destroy'],
+        'async-task-restore': ['async-task-restore'],
+        'async-comment-list': ['async-comment-list', 'async-comment-create'],
+        'async-comment-detail': ['async-comment-retrieve', 'async-comment-update', 'async-comment-destroy'],
+        'response-cache-stats': ['response-cache-stats'],
+        'slow-queries': ['slow-queries'],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset()
+        cls.project = Project.objects.order_by('id').first()
+        cls.task = Task.objects.filter(project=cls.project).order_by('id').first()
+        cls.comment = Comment.objects.filter(task=cls.task).order_by('id').first()
+        cls.member = ProjectMember.objects.filter(project=cls.project).exclude(user=cls.user).order_by('id').first()
+        cls.outsider = MyUser.objects.create_user(email='outsider@example.com', username='outsider', password='pass')
+        cls.admin = MyUser.objects.create_superuser(email='admin@example.com', username='admin', password='pass')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_project_routes(self):
+        self.assertRouteBudget('api-root', lambda: self.client.get('/api/'), queries=0)
+        self.assertRouteBudget('project-list', lambda: self.client.get('/api/projects/'), queries=2)
+        self.assertRouteBudget(
+            'project-create',
+            lambda: self.client.post('/api/projects/', {'name': 'New', 'description': 'New project'}),
+            queries=1, status_code=201, repeat=1,
+        )
+        url = f'/api/projects/{self.project.id}/'
+        self.assertRouteBudget('project-retrieve', lambda: self.client.get(url), queries=1)
+        self.assertRouteBudget(
+            'project-stats', lambda: self.client.get(f'/api/projects/{self.project.id}/stats/'), queries=3,
+        )
+        self.assertRouteBudget(
+            'project-export',
+            lambda: streamed(self.client.get(f'/api/projects/{self.project.id}/export/?format=csv')), queries=4,
+        )
+        self.assertRouteBudget(
+            'project-search', lambda: self.client.get(f'/api/projects/{self.project.id}/search/?q=task'), queries=3,
+        )
+        # seed_dataset() bulk-inserts without signals, so feed the project's objects in by hand.
+        record_changes(
+            [(self.project.id, 'member', pk, False) for pk in ProjectMember.objects.filter(project=self.project).values_list('id', flat=True)]
+            + [(self.project.id, 'task', pk, False) for pk in Task.objects.filter(project=self.project).values_list('id', flat=True)]
+            + [(self.project.id, 'comment', pk, False) for pk in Comment.objects.filter(task__project=self.project).values_list('id', flat=True)]
+        )
+        self.assertRouteBudget(
+            'project-changes', lambda: self.client.get(f'/api/projects/{self.project.id}/changes/?page_size=500'), queries=5,
+        )
+        self.assertRouteBudget(
+            'project-update', lambda: self.client.patch(url, {'description': 'Changed'}), queries=2,
+        )
+        empty = Project.objects.create(name='Empty', description='', owner=self.user)
+        self.assertRouteBudget(
+            'project-destroy', lambda: self.client.delete(f'/api/projects/{empty.id}/'),
+            queries=7, status_code=204, repeat=1,
+        )
+
+    def test_task_routes(self):
+        list_url = f'/api/projects/{self.project.id}/tasks/'
+        self.assertRouteBudget('task-list', lambda: self.client.get(list_url), queries=3)
+        self.assertRouteBudget(
+            'task-list-filtered',
+            lambda: self.client.get(list_url, {'assigned_to': 'me', 'status': 'To Do', 'ordering': '-updated_at'}),
+            queries=3,
+        )
+        self.assertRouteBudget(
+            'task-create',
+            lambda: self.client.post(list_url, {
+                'title': 'New', 'description': 'New task', 'status': 'To Do', 'priority': 'Low',
+            }),
+            queries=7, status_code=201, repeat=1,
+        )
+        url = f'/api/tasks/{self.task.id}/'
+        self.assertRouteBudget('task-retrieve', lambda: self.client.get(url), queries=2)
+        self.assertRouteBudget('task-update', lambda: self.client.patch(url, {'status': 'Done'}), queries=7)
+        task = Task.objects.create(title='Doomed', description='', status='To Do', priority='Low', project=self.project)
+        self.assertRouteBudget(
+            'task-destroy', lambda: self.client.delete(f'/api/tasks/{task.id}/'),
+            queries=8, status_code=204, repeat=1,
+        )
+        archived = Task.objects.create(title='Old', description='', status='Done', priority='Low', project=self.project)
+        Task.objects.filter(id=archived.id).update(updated_at=timezone.now() - datetime.timedelta(days=200))
+        archive_tasks(timezone.now() - datetime.timedelta(days=90), project_ids=[self.project.id])
+        self.assertRouteBudget(
+            'task-restore', lambda: self.client.post(f'/api/tasks/{archived.id}/restore/'), queries=13, repeat=1,
+        )
+
+    def test_async_routes(self):
+        list_url = f'/api/async/projects/{self.project.id}/tasks/'
+        self.assertRouteBudget('async-task-list', lambda: self.client.get(list_url), queries=3)
+        self.assertRouteBudget(
+            'async-task-create',
+            lambda: self.client.post(list_url, {
+                'title': 'New', 'description': 'New task', 'status': 'To Do', 'priority': 'Low',
+            }),
+            queries=7, status_code=201, repeat=1,
+        )
+        url = f'/api/async/tasks/{self.task.id}/'
+        self.assertRouteBudget('async-task-retrieve', lambda: self.client.get(url), queries=2)
+        self.assertRouteBudget('async-task-update', lambda: self.client.patch(url, {'status': 'Done'}), queries=7)
+        task = Task.objects.create(title='Doomed', description='', status='To Do', priority='Low', project=self.project)
+        self.assertRouteBudget(
+            'async-task-destroy', lambda: self.client.delete(f'/api/async/tasks/{task.id}/'),
+            queries=8, status_code=204, repeat=1,
+        )
+        archived = Task.objects.create(title='Old', description='', status='Done', priority='Low', project=self.project)
+        Task.objects.filter(id=archived.id).update(updated_at=timezone.now() - datetime.timedelta(days=200))
+        archive_tasks(timezone.now() - datetime.timedelta(days=90), project_ids=[self.project.id])
+        self.assertRouteBudget(
+            'async-task-restore', lambda: self.client.post(f'/api/async/tasks/{archived.id}/restore/'),
+            queries=13, repeat=1,
+        )
+
+        list_url = f'/api/async/tasks/{self.task.id}/comments/'
+        self.assertRouteBudget('async-comment-list', lambda: self.client.get(list_url), queries=4)
+        self.assertRouteBudget(
+            'async-comment-create', lambda: self.client.post(list_url, {'content': 'New comment'}),
+            queries=8, status_code=201, repeat=1,
+        )
+        url = f'/api/async/comments/{self.comment.id}/'
+        self.assertRouteBudget('async-comment-retrieve', lambda: self.client.get(url), queries=2)
+        self.assertRouteBudget('async-comment-update', lambda: self.client.patch(url, {'content': 'Edited'}), queries=6)
+        comment = Comment.objects.create(content='Doomed', user=self.user, task=self.task)
+        self.assertRouteBudget(
+            'async-comment-destroy', lambda: self.client.delete(f'/api/async/comments/{comment.id}/'),
+            queries=6, status_code=204, repeat=1,
+        )
+
+    def test_comment_routes(self):
+        list_url = f'/api/tasks/{self.task.id}/comments/'
+        self.assertRouteBudget('comment-list', lambda: self.client.get(list_url), queries=4)
+        self.assertRouteBudget(
+            'comment-create', lambda: self.client.post(list_url, {'content': 'New comment'}),
+            queries=8, status_code=201, repeat=1,
+        )
+        url = f'/api/comments/{self.comment.id}/'
+        self.assertRouteBudget('comment-retrieve', lambda: self.client.get(url), queries=2)
+        self.assertRouteBudget('comment-update', lambda: self.client.patch(url, {'content': 'Edited'}), queries=6)
+        comment = Comment.objects.create(content='Doomed', user=self.user, task=self.task)
+        self.assertRouteBudget(
+            'comment-destroy', lambda: self.client.delete(f'/api/comments/{comment.id}/'),
+            queries=6, status_code=204, repeat=1,
+        )
+
+    def test_member_routes(self):
+        list_url = f'/api/projects/{self.project.id}/members/'
+        self.assertRouteBudget('member-list', lambda: self.client.get(list_url), queries=4)
+        self.assertRouteBudget(
+            'member-create', lambda: self.client.post(list_url, {'user': self.outsider.id, 'role': 'Member'}),
+            queries=8, status_code=201, repeat=1,
+        )
+        url = f'/api/members/{self.member.id}/'
+        self.assertRouteBudget('member-retrieve', lambda: self.client.get(url), queries=2)
+        self.assertRouteBudget('member-update', lambda: self.client.patch(url, {'role': 'Member'}), queries=6)
+        self.assertRouteBudget(
+            'member-destroy', lambda: self.client.delete(url), queries=4, status_code=204, repeat=1,
+        )
+
+    def test_event_stream_route(self):
+        # Only opening the stream is measured: events are sent after the response has started.
+        def open_stream():
+            response = self.client.get(f'/api/projects/{self.project.id}/events/')
+            response.close()
+            return response
+        self.assertRouteBudget('project-events', open_stream, queries=3)
+
+    def test_admin_routes(self):
+        self.client.force_authenticate(self.admin)
+        self.assertRouteBudget('response-cache-stats', lambda: self.client.get('/api/cache/stats/'), queries=0)
+        self.assertRouteBudget('slow-queries', lambda: self.client.get('/api/slow-queries/'), queries=0)
+
+    def test_my_task_route(self):
+        # seed_dataset() assigns the tasks to the members, across every project.
+        self.client.force_authenticate(self.member.user)
+        self.assertRouteBudget('my-task-list', lambda: self.client.get('/api/users/me/tasks/'), queries=1)
+
+    def test_task_bulk_route(self):
+        doomed = Task.objects.create(title='Doomed', description='', status='To Do', priority='Low', project=self.project)
+        moved = Task.objects.filter(project=self.project).exclude(id=doomed.id).order_by('id')[:50]
+        payload = {
+            'create': [
+                {'title': f'Bulk {i}', 'description': 'Imported', 'status': 'To Do', 'priority': 'High', 'assigned_to': self.member.user_id}
+                for i in range(50)
+            ],
+            'update': [{'id': task.id, 'status': 'Done'} for task in moved],
+            'delete': [doomed.id],
+        }
+        self.assertRouteBudget(
+            'task-bulk', lambda: self.client.post(f'/api/projects/{self.project.id}/tasks/bulk/', payload, format='json'),
+            queries=20, repeat=1,
+        )
+
+
+class TaskBulkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.other = Project.objects.create(name='Other', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='Task', description='', status='To Do', priority='Low', project=cls.project)
+        cls.foreign = Task.objects.create(title='Foreign', description='', status='To Do', priority='Low', project=cls.other)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/projects/{self.project.id}/tasks/bulk/'
+
+    def test_applies_creates_updates_and_deletes(self):
+        doomed = Task.objects.create(title='Doomed', description='', status='To Do', priority='Low', project=self.project)
+        response = self.client.post(self.url, {
+            'create': [{'title': 'New', 'description': 'Imported', 'status': 'To Do', 'priority': 'High'}],
+            'update': [{'id': self.task.id, 'status': 'Done'}],
+            'delete': [doomed.id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'][0]['project'], self.project.id)
+        self.assertEqual(response.data['updated'][0]['status'], 'Done')
+        self.assertEqual(response.data['deleted'], [doomed.id])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'Done')
+        self.assertGreater(self.task.updated_at, self.task.created_at)
+        self.assertFalse(Task.objects.filter(id=doomed.id).exists())
+        self.assertTrue(Task.objects.filter(project=self.project, title='New').exists())
+
+    def test_any_invalid_item_rejects_the_whole_batch(self):
+        response = self.client.post(self.url, {
+            'create': [
+                {'title': 'Valid', 'description': 'Imported', 'status': 'To Do', 'priority': 'High'},
+                {'title': 'Invalid', 'description': 'Imported', 'status': 'Nope', 'priority': 'High'},
+            ],
+            'update': [{'id': self.foreign.id, 'status': 'Done'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['create'][0], {})
+        self.assertIn('status', response.data['create'][1])
+        self.assertIn('id', response.data['update'][0])
+        self.assertFalse(Task.objects.filter(title='Valid').exists())
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, 'To Do')
+
+    def test_rejects_duplicate_and_malformed_ids(self):
+        for payload in [
+            {'delete': [self.task.id, self.task.id]},
+            {'update': [{'id': self.task.id, 'status': 'Done'}, {'id': self.task.id, 'status': 'Done'}]},
+            {'update': [{'id': [self.task.id], 'status': 'Done'}]},
+            {'update': [{'status': 'Done'}]},
+        ]:
+            with self.subTest(payload=payload):
+                self.assertEqual(self.client.post(self.url, payload, format='json').status_code, 400)
+        self.assertTrue(Task.objects.filter(id=self.task.id, status='To Do').exists())
+        self.assertEqual(get_project_stats(self.project.id)['tasks']['total'], 1)
+
+
+class ProjectPermissionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.member = MyUser.objects.create_user(email='member@example.com', username='member', password='pass')
+        cls.outsider = MyUser.objects.create_user(email='outsider@example.com', username='outsider', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.owner)
+        cls.membership = ProjectMember.objects.create(project=cls.project, user=cls.member, role='Member')
+        cls.task = Task.objects.create(title='Task', description='', status='To Do', priority='Low', project=cls.project)
+        cls.comment = Comment.objects.create(content='Comment', user=cls.owner, task=cls.task)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def test_outsiders_are_rejected(self):
+        self.client.force_authenticate(self.outsider)
+        for url in [
+            f'/api/projects/{self.project.id}/tasks/',
+            f'/api/tasks/{self.task.id}/',
+            f'/api/tasks/{self.task.id}/comments/',
+            f'/api/comments/{self.comment.id}/',
+            f'/api/projects/{self.project.id}/members/',
+            f'/api/members/{self.membership.id}/',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_only_admins_manage_members(self):
+        url = f'/api/projects/{self.project.id}/members/'
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url, {'user': self.outsider.id, 'role': 'Member'}).status_code, 403)
+        self.client.force_authenticate(self.owner)
+        self.assertEqual(self.client.post(url, {'user': self.outsider.id, 'role': 'Member'}).status_code, 201)
+
+    def test_updates_cannot_move_objects_to_another_project(self):
+        foreign = Project.objects.create(name='Foreign', description='', owner=self.outsider)
+        admin = ProjectMember.objects.create(project=self.project, user=self.outsider, role='Admin')
+        self.client.force_authenticate(self.outsider)
+        response = self.client.patch(f'/api/members/{admin.id}/', {'project': foreign.id, 'role': 'Member'})
+        self.assertEqual((response.status_code, response.data['project']), (200, self.project.id))
+        response = self.client.patch(f'/api/tasks/{self.task.id}/', {'project': foreign.id, 'title': 'Moved'})
+        self.assertEqual((response.status_code, response.data['project']), (200, self.project.id))
+        other_task = Task.objects.create(title='Other', description='', status='To Do', priority='Low', project=foreign)
+        response = self.client.patch(f'/api/comments/{self.comment.id}/', {'task': other_task.id, 'user': self.outsider.id})
+        self.assertEqual(response.status_code, 200)
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.task_id, self.comment.user_id), (self.task.id, self.owner.id))
+        self.assertEqual(Task.objects.get(id=self.task.id).project_id, self.project.id)
+        self.assertEqual(ProjectMember.objects.get(id=admin.id).project_id, self.project.id)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_warm_role_lookup_runs_no_query(self):
+        self.client.force_authenticate(self.member)
+        url = f'/api/tasks/{self.task.id}/'
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_roles_cached_before_commit_are_forgotten_on_commit(self):
+        role_key = f'project-role:{self.project.id}:{self.member.id}'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.delete()
+            # A concurrent request still sees the membership and caches it.
+            cache.set(role_key, 'Member')
+        self.assertIsNone(cache.get(role_key))
+        self.client.force_authenticate(self.member)
+        self.assertEqual(self.client.get(f'/api/tasks/{self.task.id}/').status_code, 403)
+
+    def test_membership_changes_invalidate_cached_role(self):
+        self.client.force_authenticate(self.member)
+        url = f'/api/tasks/{self.task.id}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.membership.delete()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        ProjectMember.objects.create(project=self.project, user=self.member, role='Member')
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class ProjectStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.other = Project.objects.create(name='Other', description='', owner=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stats(self):
+        response = self.client.get(f'/api/projects/{self.project.id}/stats/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counters_follow_writes(self):
+        tasks_url = f'/api/projects/{self.project.id}/tasks/'
+        task_id = self.client.post(tasks_url, {
+            'title': 'A', 'description': 'A', 'status': 'To Do', 'priority': 'High',
+        }).data['id']
+        self.client.post(tasks_url, {'title': 'B', 'description': 'B', 'status': 'Done', 'priority': 'Low'})
+        self.client.post(f'/api/tasks/{task_id}/comments/', {'content': 'First'})
+        self.client.post(f'/api/tasks/{task_id}/comments/', {'content': 'Second'})
+        self.client.patch(f'/api/tasks/{task_id}/', {'status': 'In Progress'})
+
+        stats = self.stats()
+        self.assertEqual(stats['tasks']['total'], 2)
+        self.assertEqual(stats['tasks']['by_status'], {'To Do': 0, 'In Progress': 1, 'Done': 1})
+        self.assertEqual(stats['tasks']['by_priority'], {'Low': 1, 'Medium': 0, 'High': 1})
+        self.assertEqual(stats['comments'], 2)
+
+        self.client.post(f'/api/projects/{self.project.id}/tasks/bulk/', {
+            'create': [{'title': 'C', 'description': 'C', 'status': 'To Do', 'priority': 'Medium'}],
+            'update': [{'id': task_id, 'status': 'Done'}],
+        }, format='json')
+        self.assertEqual(self.stats()['tasks']['by_status'], {'To Do': 1, 'In Progress': 0, 'Done': 2})
+
+        self.client.delete(f'/api/tasks/{task_id}/')
+        stats = self.stats()
+        self.assertEqual(stats['tasks']['total'], 2)
+        self.assertEqual(stats['comments'], 0)
+        self.assertEqual(diff_counters(), [])
+
+    def test_moving_a_task_moves_its_counts(self):
+        task = Task.objects.create(title='A', description='A', status='To Do', priority='Low', project=self.project)
+        Comment.objects.create(content='Hi', user=self.user, task=task)
+        task.project = self.other
+        task.save()
+        self.assertEqual(self.stats()['tasks']['total'], 0)
+        self.assertEqual(self.stats()['comments'], 0)
+        self.assertEqual(diff_counters(), [])
+
+    def test_interleaved_saves_of_one_task_keep_counters_exact(self):
+        task = Task.objects.create(title='A', description='A', status='To Do', priority='Low', project=self.project)
+        first, second = Task.objects.get(pk=task.pk), Task.objects.get(pk=task.pk)
+        first.status = 'Done'
+        first.save()
+        # `second` was loaded before `first` saved: it must not undo 'To Do' again.
+        second.status, second.priority = 'In Progress', 'High'
+        second.save()
+        stats = self.stats()
+        self.assertEqual(stats['tasks']['by_status'], {'To Do': 0, 'In Progress': 1, 'Done': 0})
+        self.assertEqual(stats['tasks']['by_priority'], {'Low': 0, 'Medium': 0, 'High': 1})
+        self.assertEqual(diff_counters(), [])
+
+    def test_rebuild_command_repairs_counters(self):
+        Task.objects.bulk_create([
+            Task(title='A', description='A', status='To Do', priority='Low', project=self.project),
+        ])
+        self.assertNotEqual(diff_counters(), [])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_project_stats', '--check', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_project_stats', stdout=StringIO())
+        self.assertEqual(diff_counters(), [])
+        self.assertEqual(self.stats()['tasks']['total'], 1)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='Task', description='', status='To Do', priority='Low', project=cls.project)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_revalidates_until_a_task_changes(self):
+        url = f'/api/projects/{self.project.id}/tasks/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        doomed = Task.objects.create(title='Doomed', description='', status='To Do', priority='Low', project=self.project)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        doomed.delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pages_have_distinct_etags(self):
+        url = f'/api/projects/{self.project.id}/tasks/'
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url + '?page_size=1')['ETag'])
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_detail_returns_304_without_serializing(self):
+        url = f'/api/tasks/{self.task.id}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.content, b'')
+        self.client.patch(url, {'status': 'Done'})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_project_and_comment_endpoints_send_validators(self):
+        for url in ['/api/projects/', f'/api/projects/{self.project.id}/', f'/api/tasks/{self.task.id}/comments/',
+                    f'/api/projects/{self.project.id}/members/']:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='Task', description='', status='To Do', priority='Low', project=cls.project)
+
+    def setUp(self):
+        super().setUp()
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_second_read_is_served_from_cache(self):
+        url = f'/api/projects/{self.project.id}/tasks/'
+        first = self.client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_writes_invalidate_the_project(self):
+        tasks_url = f'/api/projects/{self.project.id}/tasks/'
+        comments_url = f'/api/tasks/{self.task.id}/comments/'
+        members_url = f'/api/projects/{self.project.id}/members/'
+        for url in [tasks_url, comments_url, members_url]:
+            self.client.get(url)
+
+        self.client.post(comments_url, {'content': 'New'})
+        for url in [tasks_url, comments_url, members_url]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        self.assertEqual(len(self.client.get(comments_url).data['results']), 1)
+
+        self.client.patch(f'/api/tasks/{self.task.id}/', {'status': 'Done'})
+        response = self.client.get(f'/api/tasks/{self.task.id}/')
+        self.assertEqual((response['X-Cache'], response.data['status']), ('MISS', 'Done'))
+
+    def test_other_projects_stay_cached(self):
+        other = Project.objects.create(name='Other', description='', owner=self.user)
+        url = f'/api/projects/{self.project.id}/tasks/'
+        self.client.get(url)
+        Task.objects.create(title='Elsewhere', description='', status='To Do', priority='Low', project=other)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_assigned_to_me_is_cached_per_caller(self):
+        other = MyUser.objects.create_user(email='other@example.com', username='other', password='pass')
+        ProjectMember.objects.create(project=self.project, user=other, role='Member')
+        Task.objects.filter(id=self.task.id).update(assigned_to=self.user)
+        url = f'/api/projects/{self.project.id}/tasks/?assigned_to=me'
+        mine = self.client.get(url)
+        self.assertEqual(len(mine.data['results']), 1)
+        self.client.force_authenticate(other)
+        theirs = self.client.get(url)
+        self.assertEqual((theirs['X-Cache'], theirs.data['results']), ('MISS', []))
+        self.assertNotEqual(theirs['ETag'], mine['ETag'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=mine['ETag']).status_code, 200)
+
+    def test_cached_etag_answers_conditional_requests(self):
+        url = f'/api/tasks/{self.task.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors_are_not_cached(self):
+        url = f'/api/projects/{self.project.id}/tasks/?page_size=x&cursor=bogus'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertNotIn('X-Cache', self.client.get(url))
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.client.get(f'/api/tasks/{self.task.id}/')
+        self.client.get(f'/api/tasks/{self.task.id}/')
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get('/api/cache/stats/').data
+        self.assertEqual(set(stats), {'hits', 'misses', 'coalesced'})
+        self.assertGreaterEqual(stats['hits'], 1)
+
+    def test_concurrent_misses_compute_once(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(get_or_compute('key', compute, 60)))
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(get_or_compute('key', compute, 60)))
+                     for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader, *followers]:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ['value'] * 4)
+
+    async def test_concurrent_async_misses_compute_once(self):
+        release, calls = asyncio.Event(), []
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return 'value'
+
+        pending = [asyncio.create_task(aget_or_compute('akey', compute, 60)) for _ in range(4)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*pending)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([value for value, _ in results], ['value'] * 4)
+        self.assertEqual([hit for _, hit in results], [False, True, True, True])
+
+
+class ProjectExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.outsider = MyUser.objects.create_user(email='outsider@example.com', username='outsider', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.tasks = [
+            Task.objects.create(title=f'Task {i}', description='Line one\nline "two"', status='To Do',
+                                priority='Low', project=cls.project)
+            for i in range(5)
+        ]
+        for i in range(2):
+            Comment.objects.create(content=f'Comment {i}', user=cls.user, task=cls.tasks[0])
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/projects/{self.project.id}/export/'
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_nests_comments(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        records = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual([record['id'] for record in records], [task.id for task in self.tasks])
+        self.assertEqual([comment['content'] for comment in records[0]['comments']], ['Comment 0', 'Comment 1'])
+        self.assertEqual(records[1]['comments'], [])
+        self.assertEqual(records[0]['description'], 'Line one\nline "two"')
+
+    def test_csv_has_one_row_per_comment(self):
+        response = self.client.get(self.url + '?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(self.read(response))))
+        self.assertEqual(len(rows), 2 + 4)
+        self.assertEqual([row['comment_content'] for row in rows[:2]], ['Comment 0', 'Comment 1'])
+        self.assertEqual(rows[2]['comment_id'], '')
+        self.assertEqual(rows[0]['description'], 'Line one\nline "two"')
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_reads_in_bounded_chunks(self):
+        response = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as ctx:
+            chunks = list(response.streaming_content)
+        # Two queries (tasks, then their comments) per chunk of at most two tasks.
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(ctx.captured_queries), 3 * 2)
+
+    def test_access(self):
+        self.assertEqual(self.client.get(self.url + '?format=xml').status_code, 404)
+        self.assertEqual(self.client.get('/api/projects/0/export/').status_code, 404)
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class ImportProjectTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.source = Project.objects.create(name='Source', description='', owner=cls.user)
+        cls.target = Project.objects.create(name='Target', description='', owner=cls.user)
+        for i in range(5):
+            task = Task.objects.create(title=f'Task {i}', description='Imported', status='Done', priority='High',
+                                       project=cls.source, assigned_to=cls.user if i % 2 else None)
+            for j in range(i):
+                Comment.objects.create(content=f'Comment {j}', user=cls.user, task=task)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def write_input(self, content, suffix):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', newline='') as fh:
+            fh.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def export(self, fmt):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/projects/{self.source.id}/export/?format={fmt}')
+        return self.write_input(b''.join(response.streaming_content).decode(), f'.{fmt}')
+
+    def import_project(self, path, *args):
+        out = StringIO()
+        call_command('import_project', path, '--project', str(self.target.id), *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def imported(self):
+        return [
+            (task.title, task.assigned_to_id, [comment.content for comment in task.comment_set.order_by('id')])
+            for task in Task.objects.filter(project=self.target).order_by('id')
+        ]
+
+    def test_round_trips_both_formats(self):
+        expected = [
+            (f'Task {i}', self.user.id if i % 2 else None, [f'Comment {j}' for j in range(i)]) for i in range(5)
+        ]
+        for fmt in ['ndjson', 'csv']:
+            with self.subTest(fmt=fmt):
+                Task.objects.filter(project=self.target).delete()
+                output = self.import_project(self.export(fmt), '--batch-size', '2')
+                self.assertIn('rows/sec', output)
+                self.assertEqual(self.imported(), expected)
+                self.assertEqual(diff_counters(), [])
+
+    def test_batch_queries_do_not_grow_with_rows(self):
+        lines = ''.join(
+            json.dumps({'title': f'T{i}', 'description': 'd', 'status': 'To Do', 'priority': 'Low',
+                        'assigned_to': 'owner', 'comments': [{'content': 'c', 'user': 'owner@example.com'}]}) + '\n'
+            for i in range(200)
+        )
+        path = self.write_input(lines, '.ndjson')
+        with CaptureQueriesContext(connection) as ctx:
+            self.import_project(path, '--batch-size', '200')
+        self.assertEqual(Task.objects.filter(project=self.target).count(), 200)
+        self.assertLessEqual(len(ctx.captured_queries), 17)
+
+    def test_resumes_after_invalid_input(self):
+        records = [{'title': f'T{i}', 'description': 'd', 'status': 'To Do', 'priority': 'Low'} for i in range(5)]
+        records[3]['status'] = 'Unknown'
+        path = self.write_input(''.join(json.dumps(record) + '\n' for record in records), '.ndjson')
+        with self.assertRaises(CommandError):
+            self.import_project(path, '--batch-size', '2')
+        self.assertEqual(Task.objects.filter(project=self.target).count(), 2)
+
+        records[3]['status'] = 'Done'
+        with open(path, 'w') as fh:
+            fh.write(''.join(json.dumps(record) + '\n' for record in records))
+        self.import_project(path, '--batch-size', '2')
+        titles = list(Task.objects.filter(project=self.target).order_by('id').values_list('title', flat=True))
+        self.assertEqual(titles, [f'T{i}' for i in range(5)])
+
+    def test_skip_invalid(self):
+        records = [
+            {'title': 'Good', 'description': 'd', 'status': 'To Do', 'priority': 'Low',
+             'comments': [{'content': 'kept', 'user': self.user.id}, {'content': 'dropped', 'user': 'nobody'}]},
+            {'title': '', 'description': 'd', 'status': 'To Do', 'priority': 'Low'},
+        ]
+        path = self.write_input(''.join(json.dumps(record) + '\n' for record in records), '.ndjson')
+        self.import_project(path, '--skip-invalid')
+        self.assertEqual(self.imported(), [('Good', None, ['kept'])])
+
+
+class RowSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='ówner "1"', password='pass')
+        cls.project = Project.objects.create(name='Prøject\n"quoted"', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='Täsk', description='Line\ttab', status='In Progress', priority='High',
+                                       project=cls.project, assigned_to=cls.user)
+        Task.objects.create(title='Unassigned', description='x', status='To Do', priority='Low', project=cls.project)
+        Comment.objects.create(content='Emoji 🎉', user=cls.user, task=cls.task)
+        ProjectMember.objects.create(project=cls.project, user=cls.user, role='Admin')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        return self.client.get(url)
+
+    def test_list_output_is_byte_for_byte_identical(self):
+        urls = [
+            '/api/projects/', f'/api/projects/{self.project.id}/tasks/', f'/api/projects/{self.project.id}/tasks/?page_size=1',
+            f'/api/tasks/{self.task.id}/comments/', f'/api/projects/{self.project.id}/members/',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(API_FAST_LISTS=False):
+                    slow = self.get(url)
+                fast = self.get(url)
+                self.assertEqual(fast.status_code, 200)
+                self.assertEqual(fast.content, slow.content)
+                self.assertEqual(fast['ETag'], slow['ETag'])
+
+    def test_fast_path_joins_owner_in_sql(self):
+        with self.assertNumQueries(2):
+            response = self.get('/api/projects/')
+        self.assertEqual(response.data['results'][0]['owner'], 'ówner "1"')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.outsider = MyUser.objects.create_user(email='outsider@example.com', username='outsider', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.other = Project.objects.create(name='Other', description='', owner=cls.user)
+        cls.titled = Task.objects.create(title='Database migration', description='Move tables', status='To Do',
+                                         priority='Low', project=cls.project)
+        cls.described = Task.objects.create(title='Cleanup', description='Drop the old database', status='To Do',
+                                            priority='Low', project=cls.project)
+        cls.comment = Comment.objects.create(content='Is the database backed up?', user=cls.user, task=cls.described)
+        Task.objects.create(title='Database elsewhere', description='x', status='To Do', priority='Low', project=cls.other)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/projects/{self.project.id}/search/'
+
+    def hits(self, query, **params):
+        response = self.client.get(self.url, {'q': query, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [(hit['type'], hit['id']) for hit in response.data['results']]
+
+    def test_ranks_title_matches_first_within_the_project(self):
+        hits = self.hits('database')
+        self.assertEqual(hits[0], ('task', self.titled.id))
+        self.assertCountEqual(hits, [('task', self.titled.id), ('task', self.described.id), ('comment', self.comment.id)])
+
+    def test_prefix_and_all_words(self):
+        self.assertEqual(self.hits('migr*'), [('task', self.titled.id)])
+        self.assertEqual(self.hits('database backed'), [('comment', self.comment.id)])
+        self.assertEqual(self.hits('database nowhere'), [])
+
+    def test_index_follows_writes(self):
+        self.client.patch(f'/api/tasks/{self.described.id}/', {'title': 'Renamed', 'description': 'Nothing here'})
+        Comment.objects.filter(pk=self.comment.pk).update(content='Backup done')
+        self.assertEqual(self.hits('database'), [('task', self.titled.id)])
+        self.assertEqual(self.hits('renamed'), [('task', self.described.id)])
+
+        self.described.project = self.other
+        self.described.save()
+        self.assertEqual(self.hits('backup'), [])
+        Task.objects.bulk_create([
+            Task(title='Bulk database task', description='x', status='To Do', priority='Low', project=self.project),
+        ])
+        self.assertEqual(len(self.hits('database')), 2)
+        self.titled.delete()
+        self.assertEqual(len(self.hits('database')), 1)
+
+    def test_pagination(self):
+        first = self.client.get(self.url, {'q': 'database', 'page_size': 2}).data
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        self.assertEqual(len(second['results']), 1)
+        self.assertIsNone(second['next'])
+        self.assertIsNotNone(second['previous'])
+        self.assertEqual(self.client.get(self.url, {'q': 'database', 'page': 0}).status_code, 404)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get(self.url, {'q': '  '}).status_code, 400)
+        self.assertEqual(self.hits('"* AND ( NEAR'), [])
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url, {'q': 'database'}).status_code, 403)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM app_search')
+        self.assertEqual(self.hits('database'), [])
+        call_command('rebuild_search_index', '--project', str(self.project.id), stdout=StringIO())
+        self.assertEqual(len(self.hits('database')), 3)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.hits('database')), 3)
+
+
+class TaskListFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.other = MyUser.objects.create_user(email='other@example.com', username='other', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.mine = Task.objects.create(title='Mine', description='x', status='In Progress', priority='High',
+                                       project=cls.project, assigned_to=cls.user)
+        cls.theirs = Task.objects.create(title='Theirs', description='x', status='In Progress', priority='High',
+                                         project=cls.project, assigned_to=cls.other)
+        cls.done = Task.objects.create(title='Done', description='x', status='Done', priority='Low',
+                                       project=cls.project, assigned_to=cls.user)
+        Task.objects.filter(pk=cls.done.pk).update(updated_at=timezone.now() - datetime.timedelta(days=10))
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/projects/{self.project.id}/tasks/'
+
+    def titles(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [task['title'] for task in response.data['results']]
+
+    def test_filters(self):
+        self.assertEqual(self.titles(assigned_to='me', status='In Progress', priority='High'), ['Mine'])
+        self.assertEqual(self.titles(status='In Progress'), ['Mine', 'Theirs'])
+        self.assertEqual(self.titles(assigned_to=self.other.id), ['Theirs'])
+        self.assertEqual(self.titles(status='In Progress', priority='Low'), [])
+        since = (timezone.now() - datetime.timedelta(days=1)).isoformat()
+        self.assertEqual(self.titles(updated_since=since), ['Mine', 'Theirs'])
+
+    def test_ordering(self):
+        self.assertEqual(self.titles(ordering='-created_at'), ['Done', 'Theirs', 'Mine'])
+        self.assertEqual(self.titles(ordering='updated_at'), ['Done', 'Mine', 'Theirs'])
+        first = self.client.get(self.url, {'ordering': '-updated_at', 'page_size': 2}).data
+        self.assertEqual([task['title'] for task in self.client.get(first['next']).data['results']], ['Done'])
+
+    def test_pages_through_tasks_created_in_the_same_instant(self):
+        created = timezone.now()
+        Task.objects.bulk_create([
+            Task(title=f'Same {i}', description='x', status='To Do', priority='Low', project=self.project,
+                 created_at=created)
+            for i in range(7)
+        ])
+        expected = {
+            'created_at': [task.title for task in Task.objects.filter(project=self.project).order_by('created_at', 'id')],
+            '-created_at': [task.title for task in Task.objects.filter(project=self.project).order_by('-created_at', '-id')],
+        }
+        for ordering, titles in expected.items():
+            with self.subTest(ordering=ordering):
+                pages, url = [], f'{self.url}?ordering={ordering}&page_size=2'
+                while url:
+                    with CaptureQueriesContext(connection) as ctx:
+                        page = self.client.get(url).data
+                    self.assertFalse(any('OFFSET' in query['sql'] for query in ctx.captured_queries))
+                    pages.append(page)
+                    url = page['next']
+                self.assertEqual([task['title'] for page in pages for task in page['results']], titles)
+                backwards, url = [], pages[-1]['previous']
+                while url:
+                    page = self.client.get(url).data
+                    backwards[:0] = [task['title'] for task in page['results']]
+                    url = page['previous']
+                self.assertEqual(backwards, titles[:-len(pages[-1]['results'])])
+
+    def test_rejects_malformed_cursor_positions(self):
+        for position in ['yesterday|1', f'{timezone.now().isoformat()}|x', '|1', 'none']:
+            with self.subTest(position=position):
+                cursor = base64.b64encode(urlencode({'p': position}).encode()).decode()
+                self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404)
+
+    def test_rejects_invalid_and_unindexed_requests(self):
+        for params in [
+            {'status': 'Blocked'}, {'assigned_to': 'someone'}, {'updated_since': 'yesterday'},
+            {'ordering': 'title'}, {'updated_since': '2024-01-01T00:00:00Z', 'ordering': 'created_at'},
+            {'priority': 'High'}, {'assigned_to': 'me', 'priority': 'High'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+
+@override_settings(RESPONSE_CACHE_ENABLED=False)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset(projects=2, members=2, tasks=3, comments=2)
+        cls.outsider = MyUser.objects.create_user(email='out@example.com', username='out', password='pass')
+        cls.project = Project.objects.order_by('id').first()
+        cls.task = Task.objects.filter(project=cls.project).order_by('id').first()
+        cls.comment = Comment.objects.filter(task=cls.task).order_by('id').first()
+
+    def setUp(self):
+        super().setUp()
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_reads_match_the_sync_views(self):
+        for path in [
+            f'projects/{self.project.id}/tasks/',
+            f'projects/{self.project.id}/tasks/?status=Done&ordering=-updated_at',
+            f'projects/{self.project.id}/tasks/?page_size=2',
+            f'tasks/{self.task.id}/',
+            f'tasks/{self.task.id}/comments/',
+            f'comments/{self.comment.id}/',
+            'tasks/0/',
+            f'projects/{self.project.id}/tasks/?status=Blocked',
+        ]:
+            with self.subTest(path=path):
+                expected = self.client.get(f'/api/{path}')
+                response = self.client.get(f'/api/async/{path}')
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    def test_reads_share_the_response_cache_and_its_invalidation(self):
+        url = f'/api/async/tasks/{self.task.id}/'
+        first = self.client.get(url)
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.client.patch(f'/api/tasks/{self.task.id}/', {'title': 'Renamed'}, format='json')
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.json()['title']), ('MISS', 'Renamed'))
+
+    def test_conditional_get(self):
+        url = f'/api/async/tasks/{self.task.id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_writes(self):
+        response = self.client.post(f'/api/async/projects/{self.project.id}/tasks/',
+                                    {'title': 'New', 'description': 'x', 'status': 'To Do', 'priority': 'Low'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        task_id = response.json()['id']
+        response = self.client.patch(f'/api/async/tasks/{task_id}/', {'status': 'Done'}, format='json')
+        self.assertEqual(response.json()['status'], 'Done')
+        self.assertEqual(self.client.patch(f'/api/async/tasks/{task_id}/', {'status': 'Nope'}, format='json').status_code, 400)
+        response = self.client.post(f'/api/async/tasks/{task_id}/comments/', {'content': 'Hi'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['user'], self.user.id)
+        self.assertEqual(self.client.delete(f'/api/async/comments/{response.json()["id"]}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/async/tasks/{task_id}/').status_code, 204)
+        self.assertFalse(Task.objects.filter(id=task_id).exists())
+
+    def test_permissions(self):
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(f'/api/async/tasks/{self.task.id}/').status_code, 403)
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/tasks/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(f'/api/async/tasks/{self.task.id}/').status_code,
+                         self.client.get(f'/api/tasks/{self.task.id}/').status_code)
+        self.assertEqual(self.client.put(f'/api/async/projects/{self.project.id}/tasks/').status_code, 405)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=True)
+    async def test_served_through_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for expected in ['MISS', 'HIT']:
+            response = await self.async_client.get(f'/api/async/tasks/{self.task.id}/comments/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 2)
+            self.assertEqual(response['X-Cache'], expected)
+
+
+class ReplicaRouterTests(TestCase):
+    def route(self, method, path, view):
+        """Run `view` inside the middleware for a request and return what it returns."""
+        request = getattr(RequestFactory(), method)(path)
+        return ReplicaRoutingMiddleware(lambda request: view())(request)
+
+    @override_settings(DATABASE_READ_REPLICAS=['replica1'])
+    def test_safe_api_requests_read_from_a_replica_until_they_write(self):
+        def view():
+            reads = [router.db_for_read(Task)]
+            self.assertEqual(router.db_for_write(Task), 'default')
+            return reads + [router.db_for_read(Task), router.db_for_read(Task, instance=Task(id=1))]
+
+        self.assertEqual(self.route('get', '/api/tasks/1/', view), ['replica1', 'default', 'default'])
+        self.assertEqual(self.route('post', '/api/tasks/1/', view), ['default', 'default', 'default'])
+        self.assertEqual(self.route('get', '/admin/', view), ['default', 'default', 'default'])
+        self.assertEqual(router.db_for_read(Task), 'default')
+
+    def test_replica_reads_do_not_fill_shared_caches(self):
+        cache.clear()
+        user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        project = Project.objects.create(name='Project', description='', owner=user)
+        task = Task.objects.create(title='Task', description='', status='To Do', priority='Low', project=project)
+        client = APIClient()
+        client.force_authenticate(user)
+        role_key = f'project-role:{project.id}:{user.id}'
+        # The primary stands in for a replica, so reads work but are routed as replica reads.
+        with override_settings(DATABASE_READ_REPLICAS=['default']):
+            for _ in range(2):
+                self.assertEqual(client.get(f'/api/tasks/{task.id}/')['X-Cache'], 'MISS')
+            self.assertIsNone(cache.get(role_key))
+        self.assertEqual(client.get(f'/api/tasks/{task.id}/')['X-Cache'], 'MISS')
+        self.assertIsNotNone(cache.get(role_key))
+        with override_settings(DATABASE_READ_REPLICAS=['default']):
+            self.assertEqual(client.get(f'/api/tasks/{task.id}/')['X-Cache'], 'HIT')
+
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.route('get', '/api/tasks/1/', lambda: router.db_for_read(Task)), 'default')
+
+    def test_sqlite_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -settings.SQLITE_CACHE_SIZE_KB)
+
+
+class ChangeFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.other_user = MyUser.objects.create_user(email='other@example.com', username='other', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.other = Project.objects.create(name='Other', description='', owner=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed(self, since=0, project=None, **params):
+        response = self.client.get(f'/api/projects/{(project or self.project).id}/changes/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def summary(self, page):
+        return [(change['type'], change['id'], change['deleted']) for change in page['changes']]
+
+    def test_reports_only_what_changed_since_the_cursor(self):
+        task = Task.objects.create(title='A', description='', status='To Do', priority='Low', project=self.project)
+        comment = Comment.objects.create(content='c', user=self.user, task=task)
+        member = ProjectMember.objects.create(project=self.project, user=self.other_user, role='Member')
+        first = self.feed()
+        self.assertEqual(self.summary(first), [('task', task.id, False), ('comment', comment.id, False), ('member', member.id, False)])
+        self.assertEqual(first['changes'][0]['data']['title'], 'A')
+        self.assertFalse(first['has_more'])
+        self.assertEqual(self.summary(self.feed(first['cursor'])), [])
+
+        task.status = 'Done'
+        task.save()
+        second = self.feed(first['cursor'])
+        self.assertEqual(self.summary(second), [('task', task.id, False)])
+        self.assertEqual(second['changes'][0]['data']['status'], 'Done')
+
+        self.client.delete(f'/api/comments/{comment.id}/')
+        self.client.delete(f'/api/members/{member.id}/')
+        self.assertEqual(self.summary(self.feed(second['cursor'])), [('comment', comment.id, True), ('member', member.id, True)])
+
+    def test_tombstones_and_moves(self):
+        task = Task.objects.create(title='A', description='', status='To Do', priority='Low', project=self.project)
+        comment = Comment.objects.create(content='c', user=self.user, task=task)
+        cursor = self.feed()['cursor']
+        other_cursor = self.feed(project=self.other)['cursor']
+        task.project = self.other
+        task.save()
+        self.assertEqual(self.summary(self.feed(cursor)), [('task', task.id, True)])
+        self.assertEqual(
+            self.summary(self.feed(other_cursor, project=self.other)), [('task', task.id, False), ('comment', comment.id, False)],
+        )
+        self.assertEqual(self.client.delete(f'/api/tasks/{task.id}/').status_code, 204)
+        # A tombstone stands for the task's comments; entries of objects that are gone read as deleted too.
+        self.assertEqual(self.summary(self.feed(cursor)), [('task', task.id, True)])
+        self.assertEqual(
+            self.summary(self.feed(other_cursor, project=self.other)), [('comment', comment.id, True), ('task', task.id, True)],
+        )
+
+    def test_member_save_and_its_feed_entry_commit_together(self):
+        with mock.patch('app.changes.record_changes', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ProjectMember.objects.create(project=self.project, user=self.other_user, role='Member')
+        self.assertFalse(ProjectMember.objects.filter(project=self.project, user=self.other_user).exists())
+
+    def test_pages_through_the_sequence(self):
+        tasks = [Task.objects.create(title=f'T{i}', description='', status='To Do', priority='Low', project=self.project) for i in range(5)]
+        tasks[0].save()
+        seen, cursor, has_more = [], 0, True
+        while has_more:
+            page = self.feed(cursor, page_size=2)
+            seen += [change['id'] for change in page['changes']]
+            self.assertGreater(page['cursor'], cursor)
+            cursor, has_more = page['cursor'], page['has_more']
+        self.assertEqual(seen, [task.id for task in tasks] + [tasks[0].id])
+
+    def test_compaction_keeps_the_latest_entry_per_object(self):
+        task = Task.objects.create(title='A', description='', status='To Do', priority='Low', project=self.project)
+        cursor = self.feed()['cursor']
+        for status in ['In Progress', 'Done']:
+            task.status = status
+            task.save()
+        before = self.feed(cursor)
+        self.assertEqual(compact_changes(), 2)
+        self.assertEqual(self.feed(cursor), before)
+        self.assertEqual(self.summary(self.feed()), [('task', task.id, False)])
+
+    def test_validation_and_permissions(self):
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/changes/', {'since': 'x'}).status_code, 400)
+        self.client.force_authenticate(self.other_user)
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/changes/').status_code, 403)
+
+
+class EventStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.outsider = MyUser.objects.create_user(email='out@example.com', username='out', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='A', description='', status='To Do', priority='Low', project=cls.project)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = f'/api/projects/{self.project.id}/events/'
+
+    def save_task(self, **fields):
+        # Events are published on commit, which TestCase transactions never reach.
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.filter(pk=self.task.pk).update(**fields)
+            task = Task.objects.get(pk=self.task.pk)
+            task.save()
+
+    async def open_stream(self, **params):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), f'retry: {settings.EVENTS_RETRY_MS}\n\n'.encode())
+        return stream
+
+    async def next_event(self, stream):
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        if chunk.startswith(':'):
+            return chunk
+        lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        return int(lines['id']), lines['event'], json.loads(lines['data'])
+
+    async def test_replays_then_streams_committed_changes(self):
+        stream = await self.open_stream(since=0)
+        seq, kind, data = await self.next_event(stream)
+        self.assertEqual((kind, data['id'], data['deleted']), ('task', self.task.id, False))
+        await sync_to_async(self.save_task)(status='Done')
+        live = await self.next_event(stream)
+        self.assertGreater(live[0], seq)
+        self.assertEqual(live[2], {'seq': live[0], 'type': 'task', 'id': self.task.id, 'deleted': False})
+        await stream.aclose()
+
+    async def test_closing_the_stream_unsubscribes(self):
+        broker = event_backend().broker
+        open_streams = broker.stats()['subscribers']
+        stream = event_stream(self.project.id, 0)
+        await anext(stream)
+        self.assertEqual(broker.stats()['subscribers'], open_streams + 1)
+        await stream.aclose()
+        self.assertEqual(broker.stats()['subscribers'], open_streams)
+
+    @override_settings(EVENTS_KEEPALIVE=0.01)
+    async def test_keep_alive(self):
+        stream = await self.open_stream()
+        self.assertEqual(await self.next_event(stream), ': keep-alive\n\n')
+        await stream.aclose()
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    async def test_overflowed_stream_catches_up_from_the_feed(self):
+        stream = await self.open_stream()
+        for priority in ['Medium', 'High', 'Low', 'Medium']:
+            await sync_to_async(self.save_task)(priority=priority)
+        await asyncio.sleep(0)
+        events = [await self.next_event(stream) for _ in range(4)]
+        self.assertEqual([data['id'] for _, _, data in events], [self.task.id] * 4)
+        self.assertEqual([seq for seq, _, _ in events], sorted({seq for seq, _, _ in events}))
+        self.assertEqual(event_backend().broker.stats()['overflows'], 1)
+        await stream.aclose()
+
+    async def test_rejects_outsiders_and_bad_cursors(self):
+        await self.async_client.aforce_login(self.outsider)
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 403)
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.async_client.get(self.url, {'since': 'x'})).status_code, 400)
+        with override_settings(EVENTS_MAX_SUBSCRIBERS=0):
+            self.assertEqual((await self.async_client.get(self.url)).status_code, 503)
+
+    async def test_change_feed_backend_polls_for_other_processes_writes(self):
+        with override_settings(EVENTS_BACKEND='app.events.ChangeFeedBackend', EVENTS_POLL_INTERVAL=0.01):
+            stream = await self.open_stream()
+            await asyncio.sleep(0.05)  # let the poller take its starting point
+            await sync_to_async(record_changes)([(self.project.id, 'task', self.task.id, True)])
+            seq, kind, data = await self.next_event(stream)
+            self.assertEqual((kind, data['deleted']), ('task', True))
+            await stream.aclose()
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.task = Task.objects.create(title='A', description='', status='To Do', priority='Low', project=cls.project)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        reset_metrics()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    @staticmethod
+    def key(name, **labels):
+        return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels.items()) + '}'
+
+    def test_records_status_latency_queries_and_size_per_route(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/tasks/{self.task.id}/')
+        # Read before the next request resets the query log.
+        query_count = len(queries)
+        self.assertGreater(query_count, 0)
+        self.client.get('/api/nowhere/')
+        samples = self.scrape()
+
+        route = {'route': '/api/tasks/<int:pk>/', 'method': 'GET'}
+        self.assertEqual(samples[self.key('app_http_requests_total', **route, status=200)], 1)
+        self.assertEqual(samples[self.key('app_http_request_duration_seconds_count', **route)], 1)
+        self.assertEqual(samples[self.key('app_http_request_duration_seconds_bucket', **route, le='+Inf')], 1)
+        self.assertEqual(samples[self.key('app_http_request_db_queries_sum', **route)], query_count)
+        self.assertGreater(samples[self.key('app_http_request_db_seconds_total', **route)], 0)
+        self.assertEqual(samples[self.key('app_http_response_size_bytes_sum', **route)], len(response.content))
+        self.assertEqual(samples[self.key('app_http_requests_total', route='unmatched', method='GET', status=404)], 1)
+        self.assertIn(self.key('app_response_cache_total', result='misses'), samples)
+
+    def test_streaming_responses_have_no_size(self):
+        response = self.client.get(f'/api/projects/{self.project.id}/export/')
+        b''.join(response.streaming_content)
+        samples = self.scrape()
+        route = {'route': '/api/projects/(?P<pk>[^/.]+)/export/', 'method': 'GET'}
+        self.assertEqual(samples[self.key('app_http_requests_total', **route, status=200)], 1)
+        self.assertEqual(samples[self.key('app_http_response_size_bytes_count', **route)], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+
+
+class SlowQueryLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        Task.objects.create(title='A', description='', status='To Do', priority='Low', project=cls.project)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        reset_slow_queries()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_normalizes_literals_and_value_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM t WHERE a IN (%s, %s,  %s) AND b = 'x''y' AND c > 10 LIMIT 21"),
+            'SELECT * FROM t WHERE a IN (...) AND b = ? AND c > ? LIMIT ?',
+        )
+        self.assertEqual(normalize_sql('INSERT INTO t2 (a, b) VALUES (%s, %s), (%s, %s)'),
+                         'INSERT INTO t2 (a, b) VALUES (...)')
+
+    @override_settings(SLOW_QUERY_MS=1e-9)
+    def test_records_sql_call_site_and_plan(self):
+        self.client.get(f'/api/projects/{self.project.id}/members/')
+        list(Task.objects.filter(project=self.project))
+        entries = slow_queries()
+        self.assertTrue(any(entry['call_site'].startswith('app/api/') for entry in entries))
+        own = entries[-1]
+        self.assertTrue(own['call_site'].startswith('app/tests.py:'))
+        self.assertIn('"app_task"."project_id" = ?', own['sql'])
+        self.assertTrue(own['plan'])
+        self.assertGreater(own['duration_ms'], 0)
+
+    def test_fast_queries_are_not_recorded(self):
+        list(Task.objects.all())
+        self.assertEqual(slow_queries(), [])
+
+    @override_settings(SLOW_QUERY_MS=1e-9)
+    def test_command_aggregates_the_log_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.jsonl')
+            with override_settings(SLOW_QUERY_LOG_FILE=path):
+                for _ in range(3):
+                    Task.objects.filter(description='x').count()
+            out = StringIO()
+            call_command('slow_queries', '--file', path, '--json', stdout=out)
+        offenders = json.loads(out.getvalue())
+        count = next(offender for offender in offenders if 'COUNT(*)' in offender['sql'])
+        self.assertEqual(count['count'], 3)
+        self.assertEqual(count['full_scans'], ['app_task'])
+        with self.assertRaises(CommandError):
+            call_command('slow_queries', '--file', path, stdout=StringIO())
+
+    @override_settings(SLOW_QUERY_MS=1e-9)
+    def test_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/slow-queries/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        offenders = self.client.get('/api/slow-queries/').data
+        self.assertTrue(offenders)
+        self.assertEqual(set(offenders[0]), {'sql', 'call_site', 'count', 'total_ms', 'mean_ms', 'max_ms', 'plan', 'full_scans'})
+
+
+class SeedBenchTests(TestCase):
+    def seed(self, **options):
+        options = {'users': 6, 'projects': 3, 'members': 3, 'tasks': 4, 'comments': 2, 'batch_size': 5, **options}
+        call_command('seed_bench', stdout=StringIO(), **options)
+
+    def test_generates_a_consistent_dataset(self):
+        self.seed()
+        self.assertEqual(MyUser.objects.filter(username__startswith='bench-user').count(), 6)
+        self.assertEqual(ProjectMember.objects.count(), 9)
+        self.assertEqual(ProjectMember.objects.filter(role='Admin').count(), 3)
+        self.assertEqual(Task.objects.count(), 12)
+        self.assertEqual(Comment.objects.count(), 24)
+        self.assertFalse(Comment.objects.filter(created_at__lt=F('task__created_at')).exists())
+        self.assertEqual(diff_counters(), [])
+        self.assertEqual(ProjectChange.objects.count(), 9 + 12 + 24)
+        response = self.client.post('/api/users/login/', {'username': 'bench-user0', 'password': 'bench-pass'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_is_reproducible_and_refuses_existing_users(self):
+        self.seed()
+        first = list(Task.objects.order_by('id').values_list('title', 'status', 'priority'))
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed(prefix='again')
+        self.assertEqual(list(Task.objects.order_by('id').values_list('title', 'status', 'priority'))[12:], first)
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_reports_latency_per_route(self):
+        call_command('seed_bench', users=3, projects=2, members=2, tasks=5, comments=1, stdout=StringIO())
+        out = StringIO()
+        call_command('loadtest', url=self.live_server_url, users=2, concurrency=1, requests=60, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['requests'], 60)
+        self.assertEqual(report['errors'], 0)
+        served = {name: route for name, route in report['routes'].items() if route['requests']}
+        self.assertIn('task-list', served)
+        for route in served.values():
+            self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+            self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+
+    def test_waits_for_the_login_throttle(self):
+        call_command('seed_bench', users=3, projects=2, members=3, tasks=2, comments=0, stdout=StringIO())
+        rates = dict(settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **{'login-ip': '1/s'})
+        with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)):
+            out, err = StringIO(), StringIO()
+            call_command('loadtest', url=self.live_server_url, users=3, concurrency=1, requests=3, read_only=True,
+                         stdout=out, stderr=err)
+        self.assertIn('exceeds the login-ip throttle of 1 per 1s', err.getvalue())
+        self.assertIn('Logged in 3 users', err.getvalue())
+        self.assertEqual(json.loads(out.getvalue())['errors'], 0)
+
+    def test_read_only_mix(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='task-update=1', read_only=True, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='nowhere=1', stdout=StringIO())
+
+
+class SoftDeleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.member = MyUser.objects.create_user(email='member@example.com', username='member', password='pass')
+        cls.admin = MyUser.objects.create_superuser(email='admin@example.com', username='admin', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        cls.other = Project.objects.create(name='Other', description='', owner=cls.user)
+        ProjectMember.objects.create(project=cls.project, user=cls.user, role='Admin')
+        ProjectMember.objects.create(project=cls.project, user=cls.member, role='Member')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_task(self, project, comments=2, title='Findable'):
+        task = Task.objects.create(title=title, description='', status='To Do', priority='High', project=project)
+        for i in range(comments):
+            Comment.objects.create(content=f'comment {i}', user=self.user, task=task)
+        return task
+
+    def test_deleted_task_is_hidden_and_uncounted(self):
+        task, kept = self.make_task(self.project), self.make_task(self.project)
+        comment = Comment.objects.filter(task=task).first()
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/').status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/tasks/{task.id}/').status_code, 204)
+
+        self.assertTrue(Task.all_objects.filter(pk=task.pk, deleted_at__isnull=False).exists())
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/comments/{comment.id}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/tasks/{task.id}/').status_code, 404)
+        listed = self.client.get(f'/api/projects/{self.project.id}/tasks/').data['results']
+        self.assertEqual([row['id'] for row in listed], [kept.id])
+        hits = self.client.get(f'/api/projects/{self.project.id}/search/', {'q': 'findable'}).data['results']
+        self.assertEqual({hit['task'] for hit in hits}, {kept.id})
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/stats/').data['comments'], 2)
+        self.assertEqual(diff_counters(), [])
+
+    def test_repeated_deletes_run_the_handlers_once(self):
+        task, kept = self.make_task(self.project), self.make_task(self.project)
+        stale = Task.objects.get(pk=task.pk)
+        cursor = ProjectChange.objects.latest('id').id
+        self.assertEqual(soft_delete_tasks([task]), [task])
+        self.assertEqual(soft_delete_tasks([stale, kept]), [kept])
+        self.assertEqual(diff_counters(), [])
+        self.assertEqual(
+            sorted(ProjectChange.objects.filter(id__gt=cursor).values_list('object_id', flat=True)), [task.id, kept.id],
+        )
+        self.assertTrue(soft_delete_project(self.project))
+        self.assertFalse(soft_delete_project(self.project))
+
+    def test_deleted_project_is_gone_for_everyone(self):
+        task = self.make_task(self.project)
+        comment = Comment.objects.filter(task=task).first()
+        self.client.get(f'/api/tasks/{task.id}/')  # warm the role caches
+        self.assertEqual(self.client.delete(f'/api/projects/{self.project.id}/').status_code, 204)
+        self.assertTrue(Project.all_objects.filter(pk=self.project.pk).exists())
+
+        for user in (self.user, self.member, self.admin):
+            self.client.force_authenticate(user)
+            for url in (f'/api/projects/{self.project.id}/', f'/api/projects/{self.project.id}/tasks/',
+                        f'/api/tasks/{task.id}/', f'/api/comments/{comment.id}/'):
+                with self.subTest(user=user.username, url=url):
+                    self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual([row['id'] for row in self.client.get('/api/projects/').data['results']], [self.other.id])
+
+    def test_purge_deletes_in_batches_and_resumes(self):
+        deleted_task, kept = self.make_task(self.other), self.make_task(self.other)
+        self.make_task(self.project, comments=3)
+        self.client.delete(f'/api/tasks/{deleted_task.id}/')
+        self.client.delete(f'/api/projects/{self.project.id}/')
+
+        def interrupt(label, rows):
+            self.assertLessEqual(rows, 1)
+            if label == 'tasks':
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            purge_deleted(batch_size=1, progress=interrupt)
+        self.assertFalse(Comment.all_objects.filter(task=deleted_task).exists())
+
+        out = StringIO()
+        call_command('purge_deleted', batch_size=2, stdout=out)
+        self.assertIn('Purged', out.getvalue())
+        self.assertFalse(Project.all_objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(list(Task.all_objects.values_list('id', flat=True)), [kept.id])
+        self.assertEqual(Comment.all_objects.count(), 2)
+        self.assertFalse(ProjectChange.objects.filter(project=self.project).exists())
+        self.assertEqual(diff_counters(), [])
+        self.assertFalse(any(purge_deleted().values()))
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.outsider = MyUser.objects.create_user(email='outsider@example.com', username='outsider', password='pass')
+        cls.project = Project.objects.create(name='Project', description='', owner=cls.user)
+        ProjectMember.objects.create(project=cls.project, user=cls.user, role='Admin')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        long_ago = timezone.now() - datetime.timedelta(days=200)
+        self.old_done = [self.make_task('Shipped', 'Done', comments=2) for _ in range(3)]
+        self.recent_done = self.make_task('Recent', 'Done')
+        self.old_open = self.make_task('Open', 'To Do')
+        Task.objects.filter(id__in=[task.id for task in self.old_done + [self.old_open]]).update(updated_at=long_ago)
+
+    def make_task(self, title, status, comments=0):
+        task = Task.objects.create(title=title, description='', status=status, priority='Low', project=self.project)
+        for i in range(comments):
+            Comment.objects.create(content=f'note {i}', user=self.user, task=task)
+        return task
+
+    def archive(self):
+        call_command('archive_tasks', days=90, batch_size=2, stdout=StringIO())
+
+    def test_moves_old_done_tasks_and_their_comments(self):
+        cursor = ProjectChange.objects.latest('id').id
+        self.archive()
+        archived = sorted(task.id for task in self.old_done)
+        self.assertEqual(sorted(ArchivedTask.objects.values_list('id', flat=True)), archived)
+        self.assertEqual(ArchivedComment.objects.count(), 6)
+        self.assertEqual(sorted(Task.objects.values_list('id', flat=True)), [self.recent_done.id, self.old_open.id])
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertEqual(diff_counters(), [])
+        self.assertEqual(
+            sorted(ProjectChange.objects.filter(id__gt=cursor).values_list('object_id', 'deleted')),
+            [(task_id, True) for task_id in archived],
+        )
+        self.assertEqual(self.client.get(f'/api/projects/{self.project.id}/search/', {'q': 'shipped'}).data['results'], [])
+
+    def test_include_archived_reads(self):
+        self.archive()
+        url = f'/api/projects/{self.project.id}/tasks/'
+        task = self.old_done[0]
+        with CaptureQueriesContext(connection) as ctx:
+            active = self.client.get(url).data['results']
+        self.assertFalse(any('app_archived' in query['sql'] for query in ctx.captured_queries))
+        self.assertEqual(len(active), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            everything = self.client.get(url, {'include_archived': 'true'}).data['results']
+        for query in ctx.captured_queries:
+            self.assertEqual(full_table_scans(query['sql']), [], query['sql'])
+        self.assertEqual([row['id'] for row in everything], [*(t.id for t in self.old_done), self.recent_done.id, self.old_open.id])
+        self.assertIsNotNone(everything[0]['archived_at'])
+        self.assertIsNone(everything[-1]['archived_at'])
+        done = self.client.get(url, {'include_archived': '1', 'status': 'Done'}).data['results']
+        self.assertEqual(len(done), 4)
+        self.assertEqual(self.client.get(url, {'include_archived': 'maybe'}).status_code, 400)
+
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/').status_code, 404)
+        response = self.client.get(f'/api/tasks/{task.id}/', {'include_archived': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['title'], 'Shipped')
+        comments = self.client.get(f'/api/tasks/{task.id}/comments/', {'include_archived': 'true'}).data['results']
+        self.assertEqual([comment['content'] for comment in comments], ['note 0', 'note 1'])
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get(f'/api/tasks/{task.id}/', {'include_archived': 'true'}).status_code, 403)
+
+    def test_restore(self):
+        self.archive()
+        task = self.old_done[0]
+        self.assertEqual(self.client.post(f'/api/tasks/{self.recent_done.id}/restore/').status_code, 404)
+        response = self.client.post(f'/api/tasks/{task.id}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], task.id)
+        self.assertEqual(Comment.objects.filter(task_id=task.id).count(), 2)
+        self.assertFalse(ArchivedTask.objects.filter(id=task.id).exists())
+        self.assertEqual(diff_counters(), [])
+        hits = self.client.get(f'/api/projects/{self.project.id}/search/', {'q': 'shipped'}).data['results']
+        self.assertEqual({hit['task'] for hit in hits}, {task.id})
+        # Restored tasks count as just updated, so the next run leaves them alone.
+        self.archive()
+        self.assertTrue(Task.objects.filter(id=task.id).exists())
+
+    def test_async_views_match_the_sync_views(self):
+        self.archive()
+        task = self.old_done[0]
+        for path in [
+            f'projects/{self.project.id}/tasks/?include_archived=true',
+            f'projects/{self.project.id}/tasks/?include_archived=1&status=Done',
+            f'projects/{self.project.id}/tasks/?include_archived=maybe',
+            f'tasks/{task.id}/',
+            f'tasks/{task.id}/?include_archived=true',
+            f'tasks/{task.id}/comments/?include_archived=true',
+        ]:
+            with self.subTest(path=path):
+                expected = self.client.get(f'/api/{path}')
+                response = self.client.get(f'/api/async/{path}')
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content.replace(b'/api/async/', b'/api/'), expected.content)
+
+        self.assertEqual(self.client.post(f'/api/async/tasks/{self.recent_done.id}/restore/').status_code, 404)
+        response = self.client.post(f'/api/async/tasks/{task.id}/restore/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, self.client.get(f'/api/tasks/{task.id}/').content)
+        self.assertEqual(Comment.objects.filter(task_id=task.id).count(), 2)
+        self.assertEqual(diff_counters(), [])
+        self.assertEqual(self.client.post(f'/api/tasks/{task.id}/restore/').status_code, 404)
+
+
+class MyTaskTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = MyUser.objects.create_user(email='owner@example.com', username='owner', password='pass')
+        cls.user = MyUser.objects.create_user(email='user@example.com', username='user', password='pass')
+        cls.projects = [Project.objects.create(name=f'Project {i}', description='', owner=cls.owner) for i in range(4)]
+        for project in cls.projects:
+            ProjectMember.objects.create(project=project, user=cls.user, role='Member')
+        cls.own = Project.objects.create(name='Own', description='', owner=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_task(self, project, status='To Do', priority='Low', assigned_to=None, comments=0):
+        task = Task.objects.create(
+            title='Task', description='', status=status, priority=priority, project=project,
+            assigned_to=assigned_to or self.user,
+        )
+        for i in range(comments):
+            Comment.objects.create(content=f'note {i}', user=self.owner, task=task)
+        return task
+
+    def test_lists_assigned_tasks_across_projects(self):
+        first = self.make_task(self.projects[0], comments=2)
+        second = self.make_task(self.projects[1], status='Done', priority='High')
+        own = self.make_task(self.own, priority='High', comments=1)
+        self.make_task(self.projects[0], assigned_to=self.owner)
+        soft_delete_tasks([self.make_task(self.projects[1])])
+        self.make_task(self.projects[2])
+        soft_delete_project(self.projects[2])
+        self.make_task(self.projects[3])
+        ProjectMember.objects.filter(project=self.projects[3], user=self.user).delete()
+
+        response = self.client.get('/api/users/me/tasks/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['id'], row['project_name'], row['comment_count']) for row in response.data['results']],
+            [(first.id, 'Project 0', 2), (second.id, 'Project 1', 0), (own.id, 'Own', 1)],
+        )
+
+        rows = self.client.get('/api/users/me/tasks/', {'priority': 'High', 'status': 'To Do'}).data['results']
+        self.assertEqual([row['id'] for row in rows], [own.id])
+        rows = self.client.get('/api/users/me/tasks/', {'status': 'Done', 'ordering': '-updated_at'}).data['results']
+        self.assertEqual([row['id'] for row in rows], [second.id])
+        # Other people's assignments cannot be asked for.
+        rows = self.client.get('/api/users/me/tasks/', {'assigned_to': self.owner.id}).data['results']
+        self.assertEqual(len(rows), 3)
+
+    def test_pages_and_rejects_unindexed_filters(self):
+        tasks = [self.make_task(self.projects[i % 2]) for i in range(5)]
+        page = self.client.get('/api/users/me/tasks/', {'page_size': 3}).data
+        rest = self.client.get(page['next']).data
+        self.assertEqual([row['id'] for row in page['results'] + rest['results']], [task.id for task in tasks])
+        self.assertEqual(self.client.get('/api/users/me/tasks/', {'priority': 'Low'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/users/me/tasks/').status_code, 401)
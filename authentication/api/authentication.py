@@ -0,0 +1,80 @@
+"""
+JWT authentication that resolves users through a cache.
+
+Tokens issued by `ClaimsRefreshToken` (the login endpoint) carry the
+`is_active`, `is_staff` and `is_superuser` flags of the user. Requests are
+authenticated against a cached copy of the user, so a warm request runs no
+query; `authentication.signals` drops the copy whenever the user is saved or
+deleted. A token whose flags no longer match the user (privileges changed or
+account deactivated since it was issued) is rejected, as is any token issued
+before a password change, and the client has to log in again.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from app.db import reads_from_replica
+from authentication.models import MyUser
+
+USER_CLAIMS = ('is_active', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def forget_cached_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def get_cached_user(user_id):
+    """
+    Return the user with this id from the cache or the database, or None.
+    Only users read from the primary are cached.
+    """
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = MyUser.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None and not reads_from_replica():
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token that also carries `USER_CLAIMS`; access tokens derived from it copy them."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """`JWTAuthentication` with the user looked up through `get_cached_user`."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if any(claim in validated_token and validated_token[claim] != getattr(user, claim) for claim in USER_CLAIMS):
+            raise AuthenticationFailed(_("The user's permissions have changed."), code="claims_changed")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from authentication.models import MyUser
 from django.contrib.auth import get_user_model
-from rest_framework_simplejwt.tokens import RefreshToken
+from authentication.api.authentication import ClaimsRefreshToken
+from authentication.hashing import check_password, make_password
 
 class MyUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -35,9 +36,9 @@ class MyUserLoginSerializers(serializers.ModelSerializer):
         except user.DoesNotExist:
             raise serializers.ValidationError({"user": "User with this Email does not exist."})
         
-        if not user.check_password(password):
+        if not check_password(user, password):
             raise serializers.ValidationError({"password": "Invalid password."})
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         # Include only serializable data
         return {
             'username': user.username,
@@ -70,6 +71,6 @@ class MyUserCreateSerializer(serializers.ModelSerializer):
             email=validated_data['email'],
             first_name=validated_data['first_name'],
             last_name=validated_data['last_name'],
-            password=validated_data['password']
+            password_hash=make_password(validated_data['password']),
         )
         return user
@@ -0,0 +1,80 @@
+"""
+Token-bucket throttles for the login and registration endpoints.
+
+Each scope in `REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']` ("10/min") is a
+bucket of that many tokens that refills evenly over the period, so a client
+may burst up to the full rate and then gets one attempt per refill
+interval. Buckets live in the local cache of the serving process and are
+keyed by client IP or by the submitted username.
+"""
+import threading
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+_lock = threading.Lock()
+_rejected = {}
+
+
+def throttle_stats():
+    """Attempts rejected per throttle scope in this process since it started."""
+    with _lock:
+        return dict(_rejected)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    def get_rate(self):
+        # Read at call time rather than import time, so rate changes apply.
+        self.THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+        return super().get_rate()
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        refill = self.num_requests / self.duration
+        with _lock:
+            now = self.timer()
+            tokens, stamp = self.cache.get(self.key, (self.num_requests, now))
+            tokens = min(self.num_requests, tokens + (now - stamp) * refill)
+            if tokens < 1:
+                self.retry_after = (1 - tokens) / refill
+                _rejected[self.scope] = _rejected.get(self.scope, 0) + 1
+                return False
+            self.cache.set(self.key, (tokens - 1, now), self.duration)
+        return True
+
+    def wait(self):
+        return self.retry_after
+
+
+class IPThrottle(TokenBucketThrottle):
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    def get_cache_key(self, request, view):
+        username = request.data.get('username')
+        if not isinstance(username, str) or not username:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': username.strip().lower()}
+
+
+class LoginIPThrottle(IPThrottle):
+    scope = 'login-ip'
+
+
+class LoginUsernameThrottle(UsernameThrottle):
+    scope = 'login-username'
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register-ip'
+
+
+class RegisterUsernameThrottle(UsernameThrottle):
+    scope = 'register-username'
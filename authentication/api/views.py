@@ -1,7 +1,7 @@
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.generics import RetrieveUpdateDestroyAPIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.schemas import AutoSchema
@@ -11,12 +11,20 @@ from rest_framework.views import APIView
 
 User = get_user_model()
 
+from authentication.api.throttling import (
+    LoginIPThrottle, LoginUsernameThrottle, RegisterIPThrottle, RegisterUsernameThrottle, throttle_stats,
+)
+from authentication.hashing import password_hash_pool
 from authentication.api.serializers import MyUserCreateSerializer, MyUserLoginSerializers, MyUserSerializer
 from authentication.models import MyUser
 
 class LoginAPIView(APIView):
     schema = AutoSchema()  # Attach DRF's built-in schema generator
     permission_classes = [AllowAny]
+    # Credentials come in the body; a stale token in the header must not block logging in again.
+    authentication_classes = []
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
     def get_serializer(self, *args, **kwargs):
         return MyUserLoginSerializers(*args, **kwargs)
     
@@ -28,6 +36,8 @@ class LoginAPIView(APIView):
     
 class MyUserCreateView(APIView):
     schema = AutoSchema()  # Attach DRF's built-in schema generator
+    authentication_classes = []
+    throttle_classes = [RegisterIPThrottle, RegisterUsernameThrottle]
 
     def get_serializer(self, *args, **kwargs):
         return MyUserCreateSerializer(*args, **kwargs)
@@ -58,12 +68,8 @@ class UserDetailView(RetrieveUpdateDestroyAPIView):
         if not id:
             return MyUser.objects.none()
 
-        user_to_get = MyUser.objects.filter(id=id)
-        if not user_to_get.exists():
-            return MyUser.objects.none()
-        
-        if user.is_superuser or user == user_to_get.first():
-            return user_to_get
+        if user.is_superuser or user.id == id:
+            return MyUser.objects.filter(id=id)
         return MyUser.objects.none()
 
     def perform_update(self, serializer):
@@ -96,3 +102,11 @@ class UserDetailView(RetrieveUpdateDestroyAPIView):
         return Response({"detail": "You do not have permission to delete."}, status=status.HTTP_403_FORBIDDEN)
 
         
+
+
+class AuthStatsView(APIView):
+    """Throttle rejections and password hashing pool usage in this process."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'throttled': throttle_stats(), 'password_hashing': password_hash_pool().stats()})
@@ -0,0 +1,93 @@
+"""
+Password hashing on a bounded pool of worker threads.
+
+Hashing a password is deliberately slow. Running it on at most
+`PASSWORD_HASH_WORKERS` threads caps the CPU a burst of logins and
+registrations can take from the rest of the API, and once
+`PASSWORD_HASH_QUEUE` more requests are waiting for a worker, further ones
+are turned away with a 503 instead of piling up.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import APIException
+
+
+class PasswordHashingBusy(APIException):
+    status_code = 503
+    default_detail = 'Too many sign-in attempts are in progress, try again shortly.'
+    default_code = 'password_hashing_busy'
+
+
+class PasswordHashPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def run(self, func, *args):
+        """Call `func(*args)` on a worker and return its result, or raise `PasswordHashingBusy`."""
+        with self._lock:
+            if self._pending >= self.capacity:
+                self._rejected += 1
+                raise PasswordHashingBusy()
+            self._pending += 1
+        try:
+            return self._executor.submit(func, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'capacity': self.capacity,
+                'in_progress': min(self._pending, self.workers),
+                'queue_depth': max(self._pending - self.workers, 0),
+                'completed': self._completed,
+                'rejected': self._rejected,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def password_hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE)
+        return _pool
+
+
+def make_password(raw_password):
+    return password_hash_pool().run(hashers.make_password, raw_password)
+
+
+def check_password(user, raw_password):
+    """
+    Verify `raw_password` against `user` like `user.check_password()`, and
+    likewise store a re-hashed password when the hasher settings changed.
+    """
+    upgraded = []
+
+    def verify():
+        return hashers.check_password(
+            raw_password, user.password, lambda raw: upgraded.append(hashers.make_password(raw)),
+        )
+
+    valid = password_hash_pool().run(verify)
+    if valid and upgraded:
+        # Saved here, on the request's own database connection.
+        user.password = upgraded[0]
+        user.save(update_fields=['password'])
+    return valid
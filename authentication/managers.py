@@ -1,7 +1,8 @@
 from django.contrib.auth.models import BaseUserManager
 
 class MyUserManager(BaseUserManager):
-    def create_user(self, email, username, password=None, first_name='', last_name=''):
+    def create_user(self, email, username, password=None, first_name='', last_name='', password_hash=None):
+        """Pass `password_hash` instead of `password` when the password has already been hashed."""
         if not email:
             raise ValueError("Users must have an email address")
         if not username:
@@ -14,7 +15,10 @@ class MyUserManager(BaseUserManager):
             last_name=last_name,
         )
 
-        user.set_password(password)
+        if password_hash is not None:
+            user.password = password_hash
+        else:
+            user.set_password(password)
         user.save(using=self._db)
         return user
 
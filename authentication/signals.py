@@ -0,0 +1,15 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.api.authentication import forget_cached_user
+from authentication.models import MyUser
+
+
+@receiver(post_save, sender=MyUser)
+@receiver(post_delete, sender=MyUser)
+def forget_authenticated_user(sender, instance, **kwargs):
+    # Once now and once on commit, so a request racing the transaction cannot
+    # re-cache the old row for the whole timeout.
+    forget_cached_user(instance.pk)
+    transaction.on_commit(lambda: forget_cached_user(instance.pk))
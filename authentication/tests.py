@@ -1,3 +1,224 @@
-from django.test import TestCase
+import os
+import threading
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from app.testing import RouteBudgetMixin, seed_dataset
+from authentication.api.throttling import LoginIPThrottle
+from authentication.hashing import PasswordHashingBusy, PasswordHashPool
+from authentication.models import MyUser
+
+
+class RouteBudgetTests(RouteBudgetMixin, TestCase):
+    """Query-count budgets and wall-time baselines for every route in authentication/api/urls.py."""
+    baseline_path = os.path.join(os.path.dirname(__file__), 'perf_baseline.json')
+    urlconf = 'authentication.api.urls'
+    route_budgets = {
+        'register': ['register'],
+        'login': ['login'],
+        'token_refresh': ['token-refresh'],
+        'user_detail': ['user-retrieve', 'user-update', 'user-destroy'],
+        'auth_stats': ['auth-stats'],
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed_dataset()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_register(self):
+        self.assertRouteBudget(
+            'register',
+            lambda: self.client.post('/api/users/register/', {
+                'username': 'newcomer', 'email': 'newcomer@example.com', 'first_name': 'New',
+                'last_name': 'Comer', 'password': 'secret', 'password2': 'secret',
+            }),
+            queries=3, status_code=201, repeat=1,
+        )
+
+    def test_login(self):
+        self.assertRouteBudget(
+            'login',
+            lambda: self.client.post('/api/users/login/', {'username': 'owner', 'password': 'pass'}),
+            queries=1, repeat=1,
+        )
+
+    def test_token_refresh(self):
+        refresh = str(RefreshToken.for_user(self.user))
+        self.assertRouteBudget(
+            'token-refresh', lambda: self.client.post('/api/users/token-refresh/', {'refresh': refresh}), queries=0,
+        )
+
+    def test_user_detail_routes(self):
+        self.client.force_authenticate(self.user)
+        url = f'/api/users/{self.user.id}/'
+        self.assertRouteBudget('user-retrieve', lambda: self.client.get(url), queries=1)
+        self.assertRouteBudget('user-update', lambda: self.client.patch(url, {'first_name': 'Changed'}), queries=2)
+        doomed = MyUser.objects.create_user(email='doomed@example.com', username='doomed', password='pass')
+        self.user.is_superuser = True
+        self.user.save()
+        # Two of these clear the user's archived tasks and comments.
+        self.assertRouteBudget(
+            'user-destroy', lambda: self.client.delete(f'/api/users/{doomed.id}/'),
+            queries=10, status_code=204, repeat=1,
+        )
+
+    def test_auth_stats(self):
+        self.client.force_authenticate(
+            MyUser.objects.create_superuser(email='admin@example.com', username='admin', password='pass'),
+        )
+        self.assertRouteBudget('auth-stats', lambda: self.client.get('/api/users/auth-stats/'), queries=0)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='jwt@example.com', username='jwt', password='pass')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+        self.url = f'/api/users/{self.user.id}/'
+
+    def login(self):
+        response = self.client.post('/api/users/login/', {'username': 'jwt', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['tokens']
+
+    def authenticate(self, tokens):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+    def test_tokens_carry_user_claims(self):
+        access = AccessToken(self.login()['access'])
+        self.assertEqual((access['is_active'], access['is_staff'], access['is_superuser']), (True, False, False))
+
+    def test_warm_requests_run_no_authentication_query(self):
+        self.authenticate(self.login())
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_user_changes_invalidate_tokens(self):
+        tokens = self.login()
+        self.authenticate(tokens)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['first_name'], 'Renamed')
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.authenticate(self.login())
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        self.user.set_password('changed')
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_deactivated_and_deleted_users_are_rejected(self):
+        self.authenticate(self.login())
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_tokens_without_claims_are_accepted(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class LoginProtectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = MyUser.objects.create_user(email='login@example.com', username='login', password='pass')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, username='login', password='wrong'):
+        return self.client.post('/api/users/login/', {'username': username, 'password': password})
+
+    @throttle_rates(**{'login-username': '2/min'})
+    def test_username_bucket(self):
+        self.assertEqual([self.login().status_code for _ in range(3)], [400, 400, 429])
+        self.assertEqual(self.login('LOGIN').status_code, 429)
+        self.assertGreater(int(self.login()['Retry-After']), 0)
+        self.assertEqual(self.login('someone-else').status_code, 400)
+
+    @throttle_rates(**{'register-ip': '1/hour'})
+    def test_register_ip_bucket(self):
+        self.assertEqual(self.client.post('/api/users/register/', {}).status_code, 400)
+        self.assertEqual(self.client.post('/api/users/register/', {}).status_code, 429)
+
+    @throttle_rates(**{'login-ip': '2/min'})
+    def test_bucket_refills(self):
+        now = [1000.0]
+        throttle = LoginIPThrottle()
+        throttle.timer = lambda: now[0]
+        request = APIClient().get('/').wsgi_request
+        self.assertEqual([throttle.allow_request(request, None) for _ in range(3)], [True, True, False])
+        self.assertEqual(throttle.wait(), 30)
+        now[0] += 30
+        self.assertEqual([throttle.allow_request(request, None) for _ in range(2)], [True, False])
+
+    def test_login_still_verifies_passwords(self):
+        self.assertEqual(self.login(password='pass').status_code, 200)
+        self.assertEqual(self.login().status_code, 400)
+
+    def test_pool_rejects_beyond_capacity(self):
+        pool = PasswordHashPool(workers=1, queue_size=0)
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        worker = threading.Thread(target=pool.run, args=(slow,))
+        worker.start()
+        started.wait(5)
+        self.assertEqual(pool.stats()['in_progress'], 1)
+        with self.assertRaises(PasswordHashingBusy):
+            pool.run(slow)
+        release.set()
+        worker.join()
+        self.assertEqual(pool.run(lambda: 'ok'), 'ok')
+        self.assertEqual(
+            pool.stats(),
+            {'workers': 1, 'capacity': 1, 'in_progress': 0, 'queue_depth': 0, 'completed': 2, 'rejected': 1},
+        )
+
+    @throttle_rates(**{'login-username': '1/min'})
+    def test_stats(self):
+        self.login()
+        self.login()
+        admin = MyUser.objects.create_superuser(email='admin@example.com', username='admin', password='pass')
+        self.client.force_authenticate(admin)
+        response = self.client.get('/api/users/auth-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreaterEqual(response.data['throttled']['login-username'], 1)
+        self.assertIn('queue_depth', response.data['password_hashing'])
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/users/auth-stats/').status_code, 403)
@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -31,7 +31,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'app.db.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -61,27 +63,159 @@ TEMPLATES = [
 WSGI_APPLICATION = 'projects_tech_foring.wsgi.application'
 
 REST_FRAMEWORK = {
-    # 'DEFAULT_AUTHENTICATION_CLASSES': (
-    #     'rest_framework_simplejwt.authentication.JWTAuthentication',
-    #     'rest_framework.authentication.TokenAuthentication',
-    # ),
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'authentication.api.authentication.CachedJWTAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.BasicAuthentication',
+    ),
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated',
     # ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema',
+    # Token buckets for the login and registration endpoints: "N/period" allows
+    # a burst of N attempts, refilled evenly over the period.
+    'DEFAULT_THROTTLE_RATES': {
+        'login-ip': config('THROTTLE_LOGIN_IP', default='30/min'),
+        'login-username': config('THROTTLE_LOGIN_USERNAME', default='10/min'),
+        'register-ip': config('THROTTLE_REGISTER_IP', default='10/hour'),
+        'register-username': config('THROTTLE_REGISTER_USERNAME', default='5/hour'),
+    },
+}
+
+SIMPLE_JWT = {
+    # Tokens carry a hash of the password hash; changing the password revokes them.
+    'CHECK_REVOKE_TOKEN': True,
 }
+# How long (seconds) CachedJWTAuthentication keeps a user; saves and deletes
+# of the user invalidate it immediately.
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# Password hashing runs on at most PASSWORD_HASH_WORKERS threads; beyond
+# PASSWORD_HASH_QUEUE waiting requests, logins and registrations get a 503.
+PASSWORD_HASH_WORKERS = config('PASSWORD_HASH_WORKERS', default=2, cast=int)
+PASSWORD_HASH_QUEUE = config('PASSWORD_HASH_QUEUE', default=16, cast=int)
+
+# Live project events (app/events.py): EVENTS_BACKEND carries committed
+# changes to the event streams; LocalBackend reaches the streams of the
+# writing process only, ChangeFeedBackend those of every process by polling
+# the change feed every EVENTS_POLL_INTERVAL seconds. A stream more than
+# EVENTS_QUEUE_SIZE events behind catches up from the change feed instead.
+EVENTS_BACKEND = config('EVENTS_BACKEND', default='app.events.LocalBackend')
+EVENTS_POLL_INTERVAL = config('EVENTS_POLL_INTERVAL', default=0.5, cast=float)
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=256, cast=int)
+EVENTS_MAX_SUBSCRIBERS = config('EVENTS_MAX_SUBSCRIBERS', default=10000, cast=int)
+EVENTS_KEEPALIVE = config('EVENTS_KEEPALIVE', default=15, cast=float)
+EVENTS_RETRY_MS = config('EVENTS_RETRY_MS', default=3000, cast=int)
+
+# Per-route request metrics served at /metrics (app/metrics.py). Set
+# METRICS_TOKEN to require `Authorization: Bearer <token>` from scrapers.
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+METRICS_SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+METRICS_QUERY_BUCKETS = [0, 1, 2, 3, 5, 8, 13, 21, 50, 100]
+
+# Slow-query log (app/slow_queries.py): queries taking at least SLOW_QUERY_MS
+# milliseconds (0 turns the log off) are kept, with their EXPLAIN QUERY PLAN,
+# in a ring buffer of the last SLOW_QUERY_LOG_SIZE, and appended as JSON lines
+# to SLOW_QUERY_LOG_FILE when set.
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=float)
+SLOW_QUERY_LOG_SIZE = config('SLOW_QUERY_LOG_SIZE', default=500, cast=int)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default='')
+
+# Cursor pagination for list endpoints; clients may ask for up to
+# API_MAX_PAGE_SIZE rows with ?page_size=
+API_PAGE_SIZE = config('API_PAGE_SIZE', default=50, cast=int)
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+# Serialize list pages from values() rows with precompiled field encoders
+# (app/api/rows.py) instead of model instances; the output is identical.
+API_FAST_LISTS = config('API_FAST_LISTS', default=True, cast=bool)
+
+# Upper bound on creates + updates + deletes in one projects/<id>/tasks/bulk/ call
+TASK_BULK_MAX_ITEMS = config('TASK_BULK_MAX_ITEMS', default=1000, cast=int)
+
+# Tasks read per query by the streaming project export; bounds its memory use.
+EXPORT_CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=500, cast=int)
+
+# `manage.py archive_tasks` moves Done tasks not updated for ARCHIVE_AFTER_DAYS
+# days, with their comments, into the archive tables, ARCHIVE_BATCH_SIZE tasks
+# per transaction.
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=90, cast=int)
+ARCHIVE_BATCH_SIZE = config('ARCHIVE_BATCH_SIZE', default=500, cast=int)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds. Reads of safe
+# API requests go to the DATABASE_REPLICAS (comma-separated database files,
+# copies of the primary kept up to date externally), see app/db.py.
+# Transactions take SQLite's write lock when they begin (IMMEDIATE): a
+# transaction that reads before writing would otherwise fail with "database
+# is locked" when another connection wrote in between, instead of waiting.
+_database = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+    'CONN_MAX_AGE': config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': config('DATABASE_TIMEOUT', default=20, cast=int),
+        'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+    },
+}
+DATABASES = {'default': _database}
+for _number, _name in enumerate(config('DATABASE_REPLICAS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica{_number}'] = {**_database, 'NAME': _name, 'TEST': {'MIRROR': 'default'}}
+DATABASE_READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_REPLICA_PATH_PREFIX = '/api/'
+DATABASE_REPLICA_APPS = ['app', 'authentication']
+DATABASE_ROUTERS = ['app.db.ReplicaRouter']
+
+# Pragmas applied to every SQLite connection, on top of WAL journaling;
+# cache_size is per connection.
+SQLITE_SYNCHRONOUS = config('SQLITE_SYNCHRONOUS', default='NORMAL')
+SQLITE_CACHE_SIZE_KB = config('SQLITE_CACHE_SIZE_KB', default=20000, cast=int)
+SQLITE_MMAP_SIZE = config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int)
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory by default. Point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (e.g. file-based) when running several worker processes so that
+# invalidations reach all of them.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='projects-tech-foring'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int),
+        },
+    },
+    # Serialized list/detail responses, kept apart so large entries cannot
+    # evict the small role and version entries in 'default'.
+    'responses': {
+        'BACKEND': config('RESPONSE_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('RESPONSE_CACHE_LOCATION', default='projects-tech-foring-responses'),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('RESPONSE_CACHE_MAX_ENTRIES', default=2000, cast=int),
+        },
+    },
 }
 
+# Seconds a resolved project role may be served from the cache. Writes to
+# ProjectMember invalidate it immediately; the timeout bounds staleness for
+# other processes when the cache is not shared.
+PROJECT_ROLE_CACHE_TIMEOUT = config('PROJECT_ROLE_CACHE_TIMEOUT', default=300, cast=int)
+
+# Response cache for task, comment and member reads, versioned per project.
+# RESPONSE_CACHE_WAIT is how long (seconds) a request waits for a concurrent
+# request computing the same response before computing it itself.
+RESPONSE_CACHE_ENABLED = config('RESPONSE_CACHE_ENABLED', default=True, cast=bool)
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=60, cast=int)
+RESPONSE_CACHE_WAIT = config('RESPONSE_CACHE_WAIT', default=5, cast=float)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -5,6 +5,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from app.metrics import metrics_view
+
 # Configure Swagger Schema
 schema_view = get_schema_view(
     openapi.Info(
@@ -23,6 +25,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('app.api.urls')),
     path('api/users/', include('authentication.api.urls')),
+    path('metrics', metrics_view, name='metrics'),
     
     
     re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema_view.without_ui(cache_timeout=0), name='schema-json'),